@@ -0,0 +1,237 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# K线列及其存储类型
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+_TS_FORMAT = '%Y%m%d%H%M%S'
+
+
+class BarStore:
+    """
+    列式K线存储，按 exchange/symbol/interval 分区
+
+    每个分区目录下是分片文件 part-{首根K线}-{末根K线}.{扩展名}，每次写入只把
+    已有数据之外的K线追加为新分片，只重写有新K线或数值有变化的分片。文件名记录了时间范围，读取时先按
+    文件名裁剪分片，再对剩余分片做日期谓词下推，文件通过内存映射读取。
+    """
+
+    def __init__(self, root_dir: str, fmt: str = "parquet"):
+        """
+        初始化K线存储
+        Args:
+            root_dir: 存储根目录
+            fmt: 文件格式，"parquet" 或 "feather"
+        """
+        if not PYARROW_AVAILABLE:
+            raise ImportError("BarStore 需要 pyarrow，请执行: pip install pyarrow")
+        if fmt not in ("parquet", "feather"):
+            raise ValueError(f"不支持的存储格式: {fmt}")
+
+        self.root_dir = Path(root_dir)
+        self.fmt = fmt
+        self._ext = "parquet" if fmt == "parquet" else "arrow"
+        self._filesystem = pafs.LocalFileSystem(use_mmap=True)
+
+    def _partition(self, exchange: str, symbol: str, interval: str) -> Path:
+        return self.root_dir / f"exchange={exchange}" / f"symbol={symbol}" / f"interval={interval}"
+
+    def _parts(self, exchange: str, symbol: str, interval: str) -> List[Tuple[datetime, datetime, Path]]:
+        """
+        列出分区内的分片，按首根K线时间排序
+        """
+        partition = self._partition(exchange, symbol, interval)
+        if not partition.exists():
+            return []
+
+        parts = []
+        for path in partition.glob(f"part-*.{self._ext}"):
+            try:
+                _, first, last = path.stem.split('-')
+                parts.append((datetime.strptime(first, _TS_FORMAT), datetime.strptime(last, _TS_FORMAT), path))
+            except ValueError:
+                logger.warning(f"忽略无法识别的分片文件: {path}")
+        return sorted(parts)
+
+    def _write_part(self, df: pd.DataFrame, partition: Path) -> Path:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        first, last = df.index[0], df.index[-1]
+        path = partition / f"part-{first.strftime(_TS_FORMAT)}-{last.strftime(_TS_FORMAT)}.{self._ext}"
+        tmp_path = path.with_suffix(".tmp")
+
+        if self.fmt == "parquet":
+            pq.write_table(table, tmp_path)
+        else:
+            # 不压缩，读取时可直接内存映射
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        统一索引名称和列类型，并按时间排序去重
+        """
+        df = df[[col for col in BAR_COLUMNS if col in df.columns]].astype('float64')
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df.index = pd.to_datetime(df.index)
+        df.index.name = 'date'
+        df = df[~df.index.duplicated(keep='last')]
+        return df.sort_index()
+
+    def last_timestamp(self, exchange: str, symbol: str, interval: str) -> Optional[datetime]:
+        """
+        返回已存储的最后一根K线时间，只读取文件名
+        """
+        parts = self._parts(exchange, symbol, interval)
+        if not parts:
+            return None
+        return max(last for _, last, _ in parts)
+
+    def last_modified(self, exchange: str, symbol: str, interval: str) -> Optional[datetime]:
+        """
+        返回分区最近一次写入的时间
+        """
+        parts = self._parts(exchange, symbol, interval)
+        if not parts:
+            return None
+        return datetime.fromtimestamp(max(path.stat().st_mtime for _, _, path in parts))
+
+    def write(self, df: pd.DataFrame, exchange: str, symbol: str, interval: str) -> int:
+        """
+        写入K线数据，已有分片不会被整体重写
+        
+        落在已有分片时间范围内的K线与分片合并，只重写有新K线或数值有变化（如写入时
+        尚未收盘的K线）的分片，相同时间保留新写入的值；不在任何分片范围内的K线（比已
+        存储数据更早、更新或落在分片之间的空缺中）按所在空缺分别写入新的分片。
+        Args:
+            df: K线数据，索引为时间，包含 Open/High/Low/Close/Volume 列
+            exchange: 交易所
+            symbol: 交易品种代码
+            interval: 时间间隔
+        Returns:
+            新写入或更新的K线数量
+        """
+        df = self._normalize(df)
+        partition = self._partition(exchange, symbol, interval)
+        parts = self._parts(exchange, symbol, interval)
+        if not parts:
+            if df.empty:
+                return 0
+            partition.mkdir(parents=True, exist_ok=True)
+            self._write_part(df, partition)
+            return len(df)
+
+        written = 0
+        covered = np.zeros(len(df), dtype=bool)
+        for part_first, part_last, path in parts:
+            inside = (df.index >= part_first) & (df.index <= part_last)
+            if not inside.any():
+                continue
+            covered |= inside
+
+            incoming = df[inside]
+            stored = self._read_paths([path])
+            aligned = stored.reindex(incoming.index)
+            same = (aligned.eq(incoming) | (aligned.isna() & incoming.isna())).all(axis=1)
+            changed = ~same | ~incoming.index.isin(stored.index)
+            if changed.any():
+                merged = pd.concat([stored, incoming[changed]])
+                merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+                if self._write_part(merged, partition) != path:
+                    path.unlink()
+                written += int(changed.sum())
+
+        # 其余K线按所在的空缺分组，第 n 组位于第 n 个分片之前（n 为分片数量时在最后一个分片之后）
+        outside = df[~covered]
+        if not outside.empty:
+            gaps = np.searchsorted(np.array([first for first, _, _ in parts], dtype='datetime64[ns]'),
+                                   outside.index.values.astype('datetime64[ns]'))
+            for gap in np.unique(gaps):
+                self._write_part(outside[gaps == gap], partition)
+            written += len(outside)
+
+        if written == 0:
+            # 没有新K线时更新最新分片的修改时间，表示数据已检查过
+            os.utime(self._parts(exchange, symbol, interval)[-1][2])
+        return written
+
+    def _read_paths(self, paths: List[Path], condition=None) -> pd.DataFrame:
+        dataset = ds.dataset([str(path) for path in paths], format=self.fmt if self.fmt == "parquet" else "ipc",
+                             filesystem=self._filesystem)
+        # pandas 元数据会恢复 date 索引
+        return dataset.to_table(filter=condition).to_pandas().sort_index()
+
+    def read(self,
+             exchange: str,
+             symbol: str,
+             interval: str,
+             start: Optional[datetime] = None,
+             end: Optional[datetime] = None,
+             n_bars: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        读取K线数据
+        Args:
+            exchange: 交易所
+            symbol: 交易品种代码
+            interval: 时间间隔
+            start: 起始时间（含）
+            end: 结束时间（含）
+            n_bars: 只返回最后 n_bars 根K线
+        Returns:
+            以 date 为索引的K线数据，无数据时返回 None
+        """
+        parts = [path for first, last, path in self._parts(exchange, symbol, interval)
+                 if (start is None or last >= start) and (end is None or first <= end)]
+        if n_bars is not None and start is None:
+            # 每个分片至少一根K线，最后 n_bars 个分片一定足够
+            parts = parts[-n_bars:]
+        if not parts:
+            return None
+
+        condition = None
+        if start is not None:
+            condition = ds.field('date') >= pd.Timestamp(start)
+        if end is not None:
+            upper = ds.field('date') <= pd.Timestamp(end)
+            condition = upper if condition is None else condition & upper
+
+        df = self._read_paths(parts, condition)
+        if df.empty:
+            return None
+        if n_bars is not None:
+            df = df.iloc[-n_bars:]
+        return df
+
+    def compact(self, exchange: str, symbol: str, interval: str) -> int:
+        """
+        将分区内的分片合并为一个文件，减少长期每日追加产生的小文件
+        Returns:
+            合并前的分片数量
+        """
+        parts = self._parts(exchange, symbol, interval)
+        if len(parts) < 2:
+            return len(parts)
+
+        df = self.read(exchange, symbol, interval)
+        merged = self._write_part(df, self._partition(exchange, symbol, interval))
+        for _, _, path in parts:
+            if path != merged:
+                path.unlink()
+        return len(parts)
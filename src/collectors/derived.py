@@ -0,0 +1,209 @@
+import ast
+import logging
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+from ..config import DERIVED_SERIES
+from src.models.database import Database
+
+logger = logging.getLogger(__name__)
+
+# 衍生系列在 economic_data 中的系列ID前缀，避免与 FRED 系列重名
+DERIVED_PREFIX = 'derived:'
+
+
+def _shift(x: np.ndarray, periods: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+# 表达式中可用的函数，_PERIOD_FUNCTIONS 中的函数第二个参数为期数
+_FUNCTIONS: Dict[str, Callable] = {
+    'shift': lambda x, periods: _shift(x, periods),
+    'diff': lambda x, periods=1: x - _shift(x, periods),
+    'pct_change': lambda x, periods=1: x / _shift(x, periods) - 1,
+    'log': lambda x: np.log(x),
+}
+_PERIOD_FUNCTIONS = {'shift', 'diff', 'pct_change'}
+
+_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+}
+
+
+class DerivedSeries:
+    """
+    由 FRED 系列的表达式定义的衍生系列
+
+    表达式支持 + - * /、数字常量、系列ID，以及 shift(x, n)、diff(x, n)、
+    pct_change(x, n)、log(x)，其中 n 为按 freq 计的期数。例如
+    "100 * pct_change(CPIAUCSL, 12)" 为按月计算的 CPI 同比（%）。
+    """
+
+    def __init__(self, name: str, expression: str, freq: str,
+                 title: Optional[str] = None, units: Optional[str] = None):
+        """
+        Args:
+            name: 衍生系列名称，保存为系列ID DERIVED_PREFIX + name
+            expression: 计算表达式
+            freq: 对齐各输入系列的日期频率，如 'B'、'MS'
+            title: 元数据标题
+            units: 元数据单位
+        """
+        self.name = name
+        self.series_id = DERIVED_PREFIX + name
+        self.expression = expression
+        self.freq = freq
+        self.title = title or name
+        self.units = units
+
+        self._tree = ast.parse(expression, mode='eval').body
+        self.inputs: List[str] = []
+        self.lookback = self._check(self._tree)
+
+    def __repr__(self):
+        return f"DerivedSeries({self.name!r}, {self.expression!r}, freq={self.freq!r})"
+
+    def _check(self, node) -> int:
+        """
+        校验表达式并收集输入系列，返回计算一个日期需要的历史期数
+        """
+        if isinstance(node, ast.Name):
+            if node.id not in self.inputs:
+                self.inputs.append(node.id)
+            return 0
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return 0
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return self._check(node.operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return max(self._check(node.left), self._check(node.right))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS \
+                and not node.keywords and node.args:
+            lookback = self._check(node.args[0])
+            if node.func.id in _PERIOD_FUNCTIONS:
+                periods = 1
+                if len(node.args) > 1:
+                    periods = node.args[1].value if isinstance(node.args[1], ast.Constant) else None
+                if not isinstance(periods, int) or periods < 0 or len(node.args) > 2:
+                    raise ValueError(f"{node.func.id} 的期数必须是非负整数: {self.expression}")
+                lookback += periods
+            elif len(node.args) > 1:
+                raise ValueError(f"{node.func.id} 只接受一个参数: {self.expression}")
+            return lookback
+        raise ValueError(f"不支持的表达式: {ast.unparse(node)}")
+
+    def evaluate(self, panel: pd.DataFrame) -> pd.Series:
+        """
+        在对齐的面板上计算衍生系列
+        Args:
+            panel: 以日期为索引、包含所有输入系列列的宽表
+        Returns:
+            与面板索引相同的衍生系列
+        """
+        columns = {series_id: panel[series_id].to_numpy(dtype=np.float64, copy=True) for series_id in self.inputs}
+
+        def evaluate(node):
+            if isinstance(node, ast.Name):
+                return columns[node.id]
+            if isinstance(node, ast.Constant):
+                return node.value
+            if isinstance(node, ast.UnaryOp):
+                return -evaluate(node.operand)
+            if isinstance(node, ast.BinOp):
+                return _OPERATORS[type(node.op)](evaluate(node.left), evaluate(node.right))
+            return _FUNCTIONS[node.func.id](evaluate(node.args[0]), *[arg.value for arg in node.args[1:]])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.broadcast_to(evaluate(self._tree), (len(panel),)).astype(np.float64)
+        values[~np.isfinite(values)] = np.nan
+        return pd.Series(values, index=panel.index, name=self.series_id)
+
+
+class DerivedSeriesEngine:
+    """
+    计算衍生系列并保存到 economic_data
+
+    每个衍生系列的输入在一次查询中按 freq 对齐为面板后向量化计算。更新时根据写入
+    日志只重新计算输入系列上次计算后有变化的日期之后的部分，已保存的更早数据不会重算。
+    """
+
+    def __init__(self, db: Database, definitions: Optional[Dict[str, dict]] = None):
+        """
+        Args:
+            db: 数据库
+            definitions: 名称 -> {"expression", "freq", "title", "units"}，默认使用配置中的 DERIVED_SERIES
+        """
+        if definitions is None:
+            definitions = DERIVED_SERIES
+        self.db = db
+        self.series = {name: DerivedSeries(name, **definition) for name, definition in definitions.items()}
+
+    def compute(self, name: str, start_date: str = None, end_date: str = None) -> pd.Series:
+        """
+        计算衍生系列但不保存
+        Args:
+            name: 衍生系列名称
+            start_date: 开始日期（含）
+            end_date: 结束日期（含）
+        Returns:
+            以日期为索引的衍生系列，去掉无法计算的日期
+        """
+        derived = self.series[name]
+        history_start = None
+        if start_date is not None:
+            # 多读取 lookback 期用于计算开始日期的值
+            history_start = pd.Timestamp(start_date) - derived.lookback * pd.tseries.frequencies.to_offset(derived.freq)
+        panel = self.db.get_panel(derived.inputs, history_start, end_date, freq=derived.freq)
+        result = derived.evaluate(panel).dropna()
+        if start_date is not None:
+            result = result[result.index >= pd.Timestamp(start_date)]
+        return result
+
+    def _changed_since(self, derived: DerivedSeries) -> Optional[pd.Timestamp]:
+        """
+        返回输入系列在上次计算后写入的最早日期，None 表示需要全量计算，NaT 表示没有变化
+        """
+        log = self.db.get_load_log(derived.series_id)
+        if log.empty:
+            return None
+
+        computed_at = log['loaded_at'].max()
+        changed = pd.NaT
+        for series_id in derived.inputs:
+            loads = self.db.get_load_log(series_id)
+            loads = loads[(loads['loaded_at'] > computed_at) & loads['first_date'].notna()]
+            if not loads.empty:
+                first = loads['first_date'].min()
+                changed = first if pd.isna(changed) else min(changed, first)
+        return changed
+
+    def update(self, names: Optional[List[str]] = None, full: bool = False) -> Dict[str, int]:
+        """
+        更新衍生系列并保存
+        Args:
+            names: 要更新的衍生系列名称，None 时更新全部
+            full: 是否全量重新计算
+        Returns:
+            名称 -> 写入的行数
+        """
+        results = {}
+        for name in (names if names is not None else list(self.series)):
+            derived = self.series[name]
+            start = None if full else self._changed_since(derived)
+            if start is not None and pd.isna(start):
+                results[name] = 0
+                continue
+
+            values = self.compute(name, start_date=start)
+            metadata = {'title': derived.title, 'units': derived.units, 'frequency': derived.freq}
+            results[name] = self.db.save_series_data(derived.series_id, values.to_frame('value'), metadata)
+            logger.info(f"Updated {results[name]} rows of derived series {name}"
+                        + ("" if start is None else f" from {start:%Y-%m-%d}"))
+        return results
@@ -3,18 +3,39 @@ import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
 import logging
-from .utils import cache_data, load_cached_data
-from ..config import FRED_API_KEY, FRED_SERIES, CACHE_DIR
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .utils import cache_data, load_cached_data, RateLimiter
+from .derived import DerivedSeriesEngine
+from ..config import FRED_API_KEY, FRED_SERIES, CACHE_DIR, FRED_MAX_REQUESTS_PER_MINUTE, FRED_MAX_WORKERS, FRED_SYNC_MAX_AGE_HOURS, FRED_FRAME_CACHE_BYTES
 from src.models.database import Database
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class FedDataCollector:
-    def __init__(self, db: Database = None):
-        """初始化FRED数据采集器"""
-        self.fred = Fred(api_key=FRED_API_KEY)
-        self.db = db if db is not None else Database()
+    def __init__(self, db: Database = None, max_requests_per_minute: int = FRED_MAX_REQUESTS_PER_MINUTE,
+                 sync_max_age_hours: Optional[float] = FRED_SYNC_MAX_AGE_HOURS, fred=None):
+        """初始化FRED数据采集器
+        
+        Args:
+            db: 数据库，默认使用 data/fred_data.db，并启用 FRED_FRAME_CACHE_BYTES 大小的内存缓存
+            max_requests_per_minute: FRED API 每分钟最多请求次数，所有线程共享
+            sync_max_age_hours: 数据库中的系列超过该时间未检查更新时先增量同步，None 表示不检查
+            fred: 与 fredapi.Fred 接口相同的客户端，如 FredRecorder、FredReplay，默认连接 FRED API
+        """
+        self.fred = fred if fred is not None else Fred(api_key=FRED_API_KEY)
+        self.db = db if db is not None else Database(frame_cache_bytes=FRED_FRAME_CACHE_BYTES)
+        self.rate_limiter = RateLimiter(max_requests_per_minute, 60.0)
+        self.fetch_stats = {}  # 系列ID -> 最近一次 get_multiple_series 的耗时、行数和错误
+        self.sync_max_age = None if sync_max_age_hours is None else timedelta(hours=sync_max_age_hours)
+        self._last_checked = {}  # 系列ID -> 本进程最近一次检查更新的时间，避免每次读取都查询元数据
+        self.derived = DerivedSeriesEngine(self.db)
+        
+    def _fred_call(self, func, *args, **kwargs):
+        """经过限流器调用 FRED API"""
+        self.rate_limiter.acquire()
+        return func(*args, **kwargs)
         
     def get_series_data(self, series_id: str, start_date: str = None, end_date: str = None, use_cache: bool = True) -> pd.DataFrame:
         """获取单个系列的数据
@@ -32,24 +53,38 @@ class FedDataCollector:
             # 尝试从数据库获取数据
             df = self.db.get_series_data(series_id, start_date, end_date)
             if not df.empty:
+                if self._is_stale(series_id):
+                    try:
+                        if self.sync_series(series_id):
+                            df = self.db.get_series_data(series_id, start_date, end_date)
+                    except Exception as e:
+                        logger.warning(f"Error syncing {series_id}, using cached data: {str(e)}")
                 df.index.name = 'date'
                 logger.info(f"Using cached data for {series_id}")
                 return df
         
+        if start_date is None and end_date is None:
+            # 获取全部历史时记录同步状态，之后只需增量同步
+            self.sync_series(series_id)
+            return self.db.get_series_data(series_id)
+        
         # 如果缓存中没有数据，从FRED获取
         try:
-            df = self.fred.get_series(series_id, start_date, end_date)
+            df = self._fred_call(self.fred.get_series, series_id, start_date, end_date)
             df = pd.DataFrame(df, columns=['value'])
             df.index.name = 'date'
             
-            # 获取元数据
-            metadata = self.fred.get_series_info(series_id)
-            metadata_dict = {
-                'series_id': series_id,
-                'title': metadata.title,
-                'units': metadata.units,
-                'frequency': metadata.frequency
-            }
+            # 获取元数据，已保存过的系列不再请求
+            metadata_dict = None
+            stored_metadata = self.db.get_series_metadata(series_id)
+            if stored_metadata is None:
+                metadata = self._fred_call(self.fred.get_series_info, series_id)
+                metadata_dict = {
+                    'series_id': series_id,
+                    'title': metadata.title,
+                    'units': metadata.units,
+                    'frequency': metadata.frequency
+                }
             
             # 保存到数据库
             self.db.save_series_data(series_id, df, metadata_dict)
@@ -60,26 +95,172 @@ class FedDataCollector:
             logger.error(f"Error fetching data for {series_id}: {str(e)}")
             raise
     
-    def get_multiple_series(self, series_ids: list = None) -> dict:
+    def _is_stale(self, series_id: str) -> bool:
+        """数据库中的系列是否超过 sync_max_age 未检查更新"""
+        if self.sync_max_age is None:
+            return False
+        if series_id not in self._last_checked:
+            metadata = self.db.get_series_metadata(series_id)
+            if not metadata or not metadata.get('last_checked'):
+                return True
+            self._last_checked[series_id] = datetime.fromisoformat(metadata['last_checked'])
+        return datetime.now() - self._last_checked[series_id] > self.sync_max_age
+    
+    def sync_series(self, series_id: str, revisions: bool = False) -> int:
+        """增量同步单个系列到数据库
+        
+        先请求系列信息，FRED 的 last_updated 与上次同步时相同则不再请求数据；否则只请求
+        已保存的最后一个观测日期之后的数据。数据库中没有该系列时获取全部历史。
+        
+        Args:
+            series_id: FRED系列ID
+            revisions: 是否同时获取上次同步后 FRED 发布的历史数据修订值
+            
+        Returns:
+            int: 写入数据库的行数
+        """
+        stored = self.db.get_series_metadata(series_id) or {}
+        last_observation = stored.get('last_observation') or self.db.get_last_observation(series_id)
+        
+        info = self._fred_call(self.fred.get_series_info, series_id)
+        checked = datetime.now()
+        now = checked.isoformat()
+        state = {
+            'title': info.title,
+            'units': info.units,
+            'frequency': info.frequency,
+            'fred_last_updated': str(info.last_updated),
+            'last_checked': now
+        }
+        
+        if last_observation is not None and stored.get('fred_last_updated') == state['fred_last_updated']:
+            self.db.save_series_metadata(series_id, {'last_checked': now})
+            self._last_checked[series_id] = checked
+            logger.info(f"{series_id} is up to date")
+            return 0
+        
+        if last_observation is None:
+            delta = self._fred_call(self.fred.get_series, series_id)
+        else:
+            last_observation = pd.Timestamp(last_observation)
+            delta = self._fred_call(self.fred.get_series, series_id, last_observation + timedelta(days=1))
+        delta = pd.DataFrame(delta, columns=['value'])
+        
+        if revisions and last_observation is not None and stored.get('fred_last_updated'):
+            # FRED 的 last_updated 形如 "2024-03-28 07:51:02-05"，取日期部分
+            revised = self._get_revisions(series_id, pd.Timestamp(stored['fred_last_updated'][:10]))
+            delta = pd.concat([revised, delta])
+            delta = delta[~delta.index.duplicated(keep='last')].sort_index()
+        
+        if not delta.empty:
+            newest = delta.index.max()
+            if last_observation is not None:
+                newest = max(newest, last_observation)
+            state['last_observation'] = newest.strftime('%Y-%m-%d')
+        
+        rows = self.db.save_series_data(series_id, delta, state)
+        self._last_checked[series_id] = checked
+        logger.info(f"Synced {rows} rows for {series_id}")
+        return rows
+    
+    def _get_revisions(self, series_id: str, since: pd.Timestamp) -> pd.DataFrame:
+        """获取 since 之后发布的数据，同一日期只保留最新一次发布的值"""
+        releases = self._fred_call(self.fred.get_series_all_releases, series_id, since.strftime('%Y-%m-%d'))
+        # 早于 since 的发布，FRED 返回的 realtime_start 是请求的起始日期
+        releases = releases[pd.to_datetime(releases['realtime_start']) > since]
+        releases = releases.sort_values('realtime_start').drop_duplicates('date', keep='last')
+        return releases.set_index('date')[['value']].sort_index()
+    
+    def sync_multiple_series(self, series_ids: list = None, revisions: bool = False,
+                             max_workers: int = FRED_MAX_WORKERS) -> dict:
+        """并发增量同步多个系列，适合每日定时更新
+        
+        Args:
+            series_ids: FRED系列ID列表，如果为None则使用配置中的所有系列
+            revisions: 是否同时获取历史数据修订值
+            max_workers: 并发线程数
+            
+        Returns:
+            dict: 系列ID -> 写入的行数，同步失败的系列不在结果中
+        """
+        if series_ids is None:
+            series_ids = list(FRED_SERIES.values())
+        series_ids = list(dict.fromkeys(series_ids))
+        
+        def sync(series_id):
+            try:
+                return self.sync_series(series_id, revisions), None
+            except Exception as e:
+                return None, e
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for series_id, (rows, error) in zip(series_ids, executor.map(sync, series_ids)):
+                if error is not None:
+                    logger.error(f"Error syncing {series_id}: {str(error)}")
+                    continue
+                results[series_id] = rows
+        return results
+    
+    def update_derived_series(self, names: list = None, sync: bool = False, full: bool = False) -> dict:
+        """更新配置中的衍生系列，结果以 derived:名称 保存到数据库
+        
+        Args:
+            names: 衍生系列名称列表，如果为None则更新 DERIVED_SERIES 中的所有衍生系列
+            sync: 是否先增量同步衍生系列用到的 FRED 系列
+            full: 是否全量重新计算，否则只重算输入系列有新数据之后的部分
+            
+        Returns:
+            dict: 衍生系列名称 -> 写入的行数
+        """
+        if names is None:
+            names = list(self.derived.series)
+        if sync:
+            inputs = [series_id for name in names for series_id in self.derived.series[name].inputs]
+            self.sync_multiple_series(inputs)
+        return self.derived.update(names, full=full)
+    
+    def get_multiple_series(self, series_ids: list = None, max_workers: int = FRED_MAX_WORKERS) -> dict:
         """获取多个系列的数据
         
+        各系列在线程池中并发获取，FRED 请求经过共享的限流器。每个系列的耗时、
+        行数和错误记录在 self.fetch_stats 中。
+        
         Args:
             series_ids: FRED系列ID列表，如果为None则使用配置中的所有系列
+            max_workers: 并发线程数，为 1 时逐个获取
             
         Returns:
             dict: 包含所有系列数据的字典
         """
         if series_ids is None:
             series_ids = list(FRED_SERIES.values())
-            
-        results = {}
-        for series_id in series_ids:
+        series_ids = list(dict.fromkeys(series_ids))
+        
+        def fetch(series_id):
+            started = time.perf_counter()
             try:
-                results[series_id] = self.get_series_data(series_id)
+                df, error = self.get_series_data(series_id), None
             except Exception as e:
-                logger.error(f"Error fetching {series_id}: {str(e)}")
-                continue
+                df, error = None, e
+            return df, error, time.perf_counter() - started
+        
+        started = time.perf_counter()
+        results = {}
+        self.fetch_stats = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for series_id, (df, error, seconds) in zip(series_ids, executor.map(fetch, series_ids)):
+                self.fetch_stats[series_id] = {
+                    'seconds': seconds,
+                    'rows': 0 if df is None else len(df),
+                    'error': None if error is None else str(error)
+                }
+                if error is not None:
+                    logger.error(f"Error fetching {series_id}: {str(error)}")
+                    continue
+                results[series_id] = df
                 
+        logger.info(f"Fetched {len(results)}/{len(series_ids)} series in {time.perf_counter() - started:.2f}s")
         return results
     
     def get_latest_data_summary(self) -> pd.DataFrame:
@@ -88,43 +269,8 @@ class FedDataCollector:
         Returns:
             pd.DataFrame: 包含所有系列最新数据的摘要
         """
-        summary_data = []
-        
-        for series_id in FRED_SERIES.values():
-            try:
-                # 获取最新数据
-                latest_df = self.db.get_latest_data(series_id)
-                if latest_df.empty:
-                    continue
-                latest_value = latest_df['value'].iloc[0]
-                latest_date = latest_df.index[0]
-                # 获取上一个数据点（比最新日期小的最大日期）
-                with self.db._get_connection() as conn:
-                    query = """
-                        SELECT date, value FROM economic_data
-                        WHERE series_id = ? AND date < ?
-                        ORDER BY date DESC LIMIT 1
-                    """
-                    prev_df = pd.read_sql_query(query, conn, params=[series_id, latest_date.strftime('%Y-%m-%d')])
-                if not prev_df.empty:
-                    prev_value = prev_df['value'].iloc[0]
-                    change = latest_value - prev_value
-                    pct_change = (change / prev_value) * 100
-                else:
-                    change = None
-                    pct_change = None
-                # 获取元数据
-                metadata = self.db.get_series_metadata(series_id)
-                title = metadata['title'] if metadata else series_id
-                summary_data.append({
-                    'series_id': series_id,
-                    'title': title,
-                    'latest_date': latest_date,
-                    'latest_value': latest_value,
-                    'change': change,
-                    'pct_change': pct_change
-                })
-            except Exception as e:
-                logger.error(f"Error getting summary for {series_id}: {str(e)}")
-                continue
-        return pd.DataFrame(summary_data)
+        try:
+            return self.db.get_latest_summary(list(FRED_SERIES.values()))
+        except Exception as e:
+            logger.error(f"Error getting latest data summary: {str(e)}")
+            return pd.DataFrame()
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+import pandas as pd
+
+from ..config import FRED_FIXTURE_DIR
+
+
+def _fixture_paths(fixture_dir: Path, series_id: str) -> dict:
+    name = series_id.replace('/', '_').replace(':', '_')
+    return {
+        'observations': fixture_dir / f"{name}.csv",
+        'info': fixture_dir / f"{name}.info.json",
+        'releases': fixture_dir / f"{name}.releases.csv",
+    }
+
+
+class FredRecorder:
+    """
+    包装 fredapi.Fred，把 get_series、get_series_info、get_series_all_releases
+    的响应记录到夹具目录，供 FredReplay 离线回放
+
+    同一系列多次请求的观测值合并保存（日期相同时保留最新的值），因此只要录制时
+    请求过某个日期范围，回放时该范围内的任意请求都能得到与录制时相同的结果。
+    """
+
+    def __init__(self, fred, fixture_dir: str = FRED_FIXTURE_DIR):
+        """
+        Args:
+            fred: 真实的 fredapi.Fred 客户端
+            fixture_dir: 夹具目录
+        """
+        self.fred = fred
+        self.fixture_dir = Path(fixture_dir)
+        self._lock = threading.Lock()
+        os.makedirs(self.fixture_dir, exist_ok=True)
+
+    def get_series(self, series_id: str, observation_start=None, observation_end=None, **kwargs) -> pd.Series:
+        data = self.fred.get_series(series_id, observation_start, observation_end, **kwargs)
+        path = _fixture_paths(self.fixture_dir, series_id)['observations']
+        with self._lock:
+            recorded = data.rename('value').rename_axis('date').to_frame()
+            if path.exists():
+                stored = pd.read_csv(path, index_col='date', parse_dates=['date'])
+                recorded = pd.concat([stored, recorded])
+                recorded = recorded[~recorded.index.duplicated(keep='last')].sort_index()
+            recorded.to_csv(path)
+        return data
+
+    def get_series_info(self, series_id: str) -> pd.Series:
+        info = self.fred.get_series_info(series_id)
+        path = _fixture_paths(self.fixture_dir, series_id)['info']
+        with self._lock:
+            with open(path, 'w') as f:
+                json.dump({key: str(value) for key, value in info.items()}, f, indent=2)
+        return info
+
+    def get_series_all_releases(self, series_id: str, realtime_start: str = None, realtime_end: str = None) -> pd.DataFrame:
+        releases = self.fred.get_series_all_releases(series_id, realtime_start, realtime_end)
+        path = _fixture_paths(self.fixture_dir, series_id)['releases']
+        with self._lock:
+            recorded = releases[['date', 'realtime_start', 'value']]
+            if path.exists():
+                stored = pd.read_csv(path, parse_dates=['date', 'realtime_start'])
+                recorded = pd.concat([stored, recorded]).drop_duplicates(['date', 'realtime_start'], keep='last')
+            recorded.sort_values(['date', 'realtime_start']).to_csv(path, index=False)
+        return releases
+
+
+class FredReplay:
+    """
+    从 FredRecorder 录制的夹具离线回放 FRED API，接口与 fredapi.Fred 相同
+
+    可以作为 FedDataCollector 的 fred 参数，在无网络的机器上确定性地测试和
+    基准测试采集器。latency 模拟每次请求的网络往返耗时。
+    """
+
+    def __init__(self, fixture_dir: str = FRED_FIXTURE_DIR, latency: float = 0.0):
+        """
+        Args:
+            fixture_dir: 夹具目录
+            latency: 每次请求的模拟耗时（秒）
+        """
+        self.fixture_dir = Path(fixture_dir)
+        self.latency = latency
+        self.calls = Counter()  # 方法名 -> 请求次数
+        self._frames = {}  # 夹具路径 -> 已读取的数据，避免每次请求都解析 CSV
+        self._lock = threading.Lock()
+
+    def _load(self, method: str, series_id: str, kind: str):
+        """记录请求并读取夹具，夹具不存在时与 FRED 一样抛出 ValueError"""
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = _fixture_paths(self.fixture_dir, series_id)[kind]
+        with self._lock:
+            if path not in self._frames:
+                if not path.exists():
+                    raise ValueError(f"Bad Request.  The series does not exist. (no fixture {path.name})")
+                if kind == 'info':
+                    with open(path) as f:
+                        self._frames[path] = pd.Series(json.load(f))
+                elif kind == 'observations':
+                    self._frames[path] = pd.read_csv(path, index_col='date', parse_dates=['date'])['value']
+                else:
+                    self._frames[path] = pd.read_csv(path, parse_dates=['date', 'realtime_start'])
+            return self._frames[path].copy()
+
+    def get_series(self, series_id: str, observation_start=None, observation_end=None, **kwargs) -> pd.Series:
+        data = self._load('get_series', series_id, 'observations')
+        if observation_start is not None:
+            data = data[data.index >= pd.Timestamp(observation_start)]
+        if observation_end is not None:
+            data = data[data.index <= pd.Timestamp(observation_end)]
+        return data.rename_axis(None).rename(None)
+
+    def get_series_info(self, series_id: str) -> pd.Series:
+        return self._load('get_series_info', series_id, 'info')
+
+    def get_series_all_releases(self, series_id: str, realtime_start: str = None, realtime_end: str = None) -> pd.DataFrame:
+        releases = self._load('get_series_all_releases', series_id, 'releases')
+        if realtime_end is not None:
+            releases = releases[releases['realtime_start'] <= pd.Timestamp(realtime_end)]
+        if realtime_start is not None:
+            # 与 FRED 相同，早于请求起始日期的发布返回请求的起始日期
+            releases['realtime_start'] = releases['realtime_start'].clip(lower=pd.Timestamp(realtime_start))
+        return releases.reset_index(drop=True)
+
+    def stats(self) -> dict:
+        """
+        返回各方法的请求次数
+        """
+        with self._lock:
+            return dict(self.calls)
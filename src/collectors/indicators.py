@@ -0,0 +1,331 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple, Union
+
+DEFAULT_INDICATORS = ['SMA20', 'SMA50', 'RSI']
+
+# 指标名称格式：类型 + 周期，如 SMA20、EMA12、RSI14、ATR14、BB20，MACD 和 VWAP 不带周期
+_INDICATOR_PATTERN = re.compile(r'^(SMA|EMA|RSI|ATR|BB|MACD|VWAP)(\d*)$')
+_DEFAULT_PERIODS = {'RSI': 14, 'ATR': 14, 'BB': 20}
+
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BB_STD = 2.0
+
+# 面板数据字段 -> K线列名
+_FIELDS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+
+def _window_sums(x: np.ndarray, windows: List[int]) -> Dict[int, np.ndarray]:
+    """
+    基于同一次累积和计算多个窗口的滑动求和，窗口内有缺失值时为 NaN
+    """
+    valid = ~np.isnan(x)
+    sums = np.zeros((len(x) + 1,) + x.shape[1:])
+    counts = np.zeros((len(x) + 1,) + x.shape[1:])
+    np.cumsum(np.where(valid, x, 0.0), axis=0, out=sums[1:])
+    np.cumsum(valid, axis=0, out=counts[1:])
+
+    result = {}
+    for window in windows:
+        out = np.full(x.shape, np.nan)
+        if len(x) >= window:
+            total = sums[window:] - sums[:-window]
+            full = (counts[window:] - counts[:-window]) == window
+            out[window - 1:] = np.where(full, total, np.nan)
+        result[window] = out
+    return result
+
+
+def _ewm(x: np.ndarray, alpha: float, prev: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    指数加权均值，prev 为上一根K线的均值时从该状态继续计算
+    """
+    if prev is not None:
+        x = np.vstack([prev[None, :], x])
+    out = pd.DataFrame(x).ewm(alpha=alpha, adjust=False, ignore_na=True).mean().to_numpy(copy=True)
+    return out if prev is None else out[1:]
+
+
+def _rma(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    Wilder 平滑：前 period 个有效值的简单均值作为初值，之后按 1/period 指数平滑
+    """
+    valid = ~np.isnan(x)
+    counts = np.cumsum(valid, axis=0)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=0)
+
+    seeded = np.where(counts < period, np.nan, x)
+    seed = valid & (counts == period)
+    seeded[seed] = sums[seed] / period
+    return _ewm(seeded, 1.0 / period)
+
+
+def _rma_continue(x: np.ndarray, period: int, prev: Optional[np.ndarray], n_new: int) -> np.ndarray:
+    """
+    对最后 n_new 行做 Wilder 平滑，x 包含之前保留的K线，尚未得到初值的品种在 x 上重新计算
+    """
+    if prev is None:
+        return _rma(x, period)[-n_new:]
+
+    out = _ewm(x[-n_new:], 1.0 / period, prev)
+    unseeded = np.isnan(prev)
+    if unseeded.any():
+        out[:, unseeded] = _rma(x[:, unseeded], period)[-n_new:]
+    return out
+
+
+class IndicatorEngine:
+    """
+    向量化技术指标计算
+
+    支持 SMA/EMA/RSI(Wilder)/MACD/BB(布林带)/ATR/VWAP，多品种面板数据按时间对齐后
+    以 (时间, 品种) 二维数组一次计算：同类滑动窗口指标共用一次累积和，递推类指标
+    对所有品种同时递推。计算后保留最后若干根K线和递推状态，新K线可通过 update()
+    增量计算，结果与对完整历史重新计算一致。
+    """
+
+    def __init__(self, indicators: List[str] = None):
+        """
+        初始化指标引擎
+        Args:
+            indicators: 指标列表，如 ['SMA20', 'EMA12', 'RSI', 'MACD', 'BB20', 'ATR14', 'VWAP']
+        """
+        self.indicators = list(indicators) if indicators is not None else list(DEFAULT_INDICATORS)
+        self._specs = [self._parse(name) for name in self.indicators]
+
+        lookback = [period for kind, period, _ in self._specs if kind in ('SMA', 'BB')]
+        lookback += [period + 1 for kind, period, _ in self._specs if kind in ('RSI', 'ATR')]
+        self._lookback = max(lookback + [2])
+
+        self._symbols = None
+        self._state = None
+
+    @staticmethod
+    def _parse(name: str) -> Tuple[str, Optional[int], str]:
+        match = _INDICATOR_PATTERN.match(name)
+        if match is None:
+            raise ValueError(f"不支持的指标: {name}")
+
+        kind, digits = match.groups()
+        if kind in ('MACD', 'VWAP'):
+            if digits:
+                raise ValueError(f"{kind} 不需要指定周期: {name}")
+            return kind, None, name
+
+        if digits:
+            period = int(digits)
+        elif kind in _DEFAULT_PERIODS:
+            period = _DEFAULT_PERIODS[kind]
+        else:
+            raise ValueError(f"{name} 需要指定周期，如 {kind}20")
+        if period < 1:
+            raise ValueError(f"指标周期必须大于 0: {name}")
+        return kind, period, name
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        输出的指标列名
+        """
+        columns = []
+        for kind, _, name in self._specs:
+            if kind == 'MACD':
+                columns += [name, f"{name}_signal", f"{name}_hist"]
+            elif kind == 'BB':
+                columns += [f"{name}_upper", f"{name}_mid", f"{name}_lower"]
+            else:
+                columns.append(name)
+        return columns
+
+    def compute(self, data: Union[pd.DataFrame, Dict[str, pd.DataFrame]]) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """
+        对完整历史计算指标，并重置增量计算状态
+        Args:
+            data: 单个品种的K线数据，或 品种 -> K线数据 的面板
+        Returns:
+            与输入对应的指标数据，索引与输入K线相同
+        """
+        frames = {None: data} if isinstance(data, pd.DataFrame) else data
+        self._symbols = list(frames)
+        self._state = None
+        return self._apply(data, frames)
+
+    def update(self, data: Union[pd.DataFrame, Dict[str, pd.DataFrame]]) -> Union[pd.DataFrame, Dict[str, pd.DataFrame]]:
+        """
+        增量计算新K线的指标，只使用保留的K线和递推状态
+        Args:
+            data: 每个品种比该品种已计算数据更新的K线，格式与 compute() 的输入相同，面板可只包含部分品种
+        Returns:
+            新K线的指标数据
+        """
+        if self._state is None:
+            return self.compute(data)
+
+        frames = {None: data} if isinstance(data, pd.DataFrame) else data
+        unknown = set(frames) - set(self._symbols)
+        if unknown:
+            raise ValueError(f"未计算过的品种需要重新调用 compute(): {sorted(unknown)}")
+        return self._apply(data, frames)
+
+    def _apply(self, data, frames: Dict[Optional[str], pd.DataFrame]):
+        index = None
+        for frame in frames.values():
+            index = frame.index if index is None else index.union(frame.index)
+        # 每个品种只需比自己已计算的最后一根K线更新，面板中各品种的K线可以先后到达
+        last = dict(self._state['last']) if self._state is not None else {}
+        for symbol, frame in frames.items():
+            if len(frame) and symbol in last and frame.index.min() <= last[symbol]:
+                raise ValueError(f"update() 只接受比已计算数据更新的K线: {symbol}")
+        last.update({symbol: frame.index.max() for symbol, frame in frames.items() if len(frame)})
+
+        # 每个品种的K线在对齐后时间索引中的位置
+        positions = {symbol: index.get_indexer(frame.index) for symbol, frame in frames.items()}
+
+        fields = {}
+        for field, column in _FIELDS.items():
+            values = np.full((len(index), len(self._symbols)), np.nan)
+            for position, symbol in enumerate(self._symbols):
+                frame = frames.get(symbol)
+                if frame is None:
+                    continue
+                name = column if column in frame.columns else field
+                if name in frame.columns:
+                    values[positions[symbol], position] = frame[name].to_numpy(dtype='float64')
+            fields[field] = values
+
+        columns = self.columns
+        values = {}
+        if len(index):
+            values = self._run(index, fields)
+            self._state['last'] = last
+        # (时间, 指标, 品种)
+        block = np.stack([values[column] for column in columns], axis=1) if values \
+            else np.empty((0, len(columns), len(self._symbols)))
+
+        results = {}
+        for position, symbol in enumerate(self._symbols):
+            if symbol in frames:
+                results[symbol] = pd.DataFrame(block[positions[symbol], :, position],
+                                               index=frames[symbol].index, columns=columns)
+
+        return results[None] if isinstance(data, pd.DataFrame) else results
+
+    def _run(self, index: pd.DatetimeIndex, fields: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        计算新K线的全部指标并更新状态，fields 为 (时间, 品种) 数组
+        """
+        state = self._state or {}
+        n_new = len(index)
+        tail = state.get('tail')
+        ext = {field: np.vstack([tail[field], values]) if tail else values for field, values in fields.items()}
+        new_state = {}
+        out = {}
+
+        # 窗口类指标按每个品种自己的K线计算：稳定排序把每列的有效K线移到前部，
+        # 计算后再放回原来的时间位置，品种之间时间索引不同也不会互相影响
+        order = np.argsort(np.isnan(ext['close']), axis=0, kind='stable')
+        bars = {field: np.take_along_axis(values, order, axis=0) for field, values in ext.items()}
+        n_bars = (~np.isnan(ext['close'])).sum(axis=0)
+
+        def scatter(values):
+            result = np.empty_like(values)
+            np.put_along_axis(result, order, values, axis=0)
+            return result
+
+        close = bars['close']
+        # 以每个品种的首个收盘价为基准，减小累积和的数值误差
+        shift = state.get('shift')
+        if shift is None:
+            shift = np.nan_to_num(close[0])
+        new_state['shift'] = shift
+        centered = close - shift
+
+        windows = sorted({period for kind, period, _ in self._specs if kind in ('SMA', 'BB')})
+        sums = _window_sums(centered, windows) if windows else {}
+        square_windows = sorted({period for kind, period, _ in self._specs if kind == 'BB'})
+        squares = _window_sums(centered ** 2, square_windows) if square_windows else {}
+
+        change = np.diff(close, axis=0, prepend=np.nan)
+        prev_close = np.vstack([np.full((1, close.shape[1]), np.nan), close[:-1]])
+
+        for kind, period, name in self._specs:
+            if kind == 'SMA':
+                out[name] = scatter(sums[period] / period + shift)[-n_new:]
+
+            elif kind == 'BB':
+                mean = sums[period] / period
+                std = np.sqrt(np.maximum(squares[period] / period - mean ** 2, 0.0))
+                mid = scatter(mean + shift)[-n_new:]
+                std = scatter(std)[-n_new:]
+                out[f"{name}_upper"] = mid + BB_STD * std
+                out[f"{name}_mid"] = mid
+                out[f"{name}_lower"] = mid - BB_STD * std
+
+            elif kind == 'EMA':
+                ema = _ewm(fields['close'], 2.0 / (period + 1), state.get(('EMA', period)))
+                new_state[('EMA', period)] = ema[-1]
+                out[name] = ema
+
+            elif kind == 'MACD':
+                fast = _ewm(fields['close'], 2.0 / (MACD_FAST + 1), state.get('MACD_fast'))
+                slow = _ewm(fields['close'], 2.0 / (MACD_SLOW + 1), state.get('MACD_slow'))
+                # 没有K线的时间点不参与信号线计算
+                macd = np.where(np.isnan(fields['close']), np.nan, fast - slow)
+                signal = _ewm(macd, 2.0 / (MACD_SIGNAL + 1), state.get('MACD_signal'))
+                new_state.update({'MACD_fast': fast[-1], 'MACD_slow': slow[-1], 'MACD_signal': signal[-1]})
+                out[name] = macd
+                out[f"{name}_signal"] = signal
+                out[f"{name}_hist"] = macd - signal
+
+            elif kind == 'RSI':
+                gain = scatter(np.where(np.isnan(change), np.nan, np.maximum(change, 0.0)))
+                loss = scatter(np.where(np.isnan(change), np.nan, np.maximum(-change, 0.0)))
+                avg_gain = _rma_continue(gain, period, state.get(('RSI_gain', period)), n_new)
+                avg_loss = _rma_continue(loss, period, state.get(('RSI_loss', period)), n_new)
+                new_state[('RSI_gain', period)] = avg_gain[-1]
+                new_state[('RSI_loss', period)] = avg_loss[-1]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+                out[name] = np.where(avg_loss == 0, 100.0, rsi)
+
+            elif kind == 'ATR':
+                high, low = bars['high'], bars['low']
+                true_range = scatter(np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close))))
+                atr = _rma_continue(true_range, period, state.get(('ATR', period)), n_new)
+                new_state[('ATR', period)] = atr[-1]
+                out[name] = atr
+
+            elif kind == 'VWAP':
+                # 按自然日重置的成交量加权均价，状态为每个品种最后一根K线的日期和当日累计值
+                typical = (fields['high'] + fields['low'] + fields['close']) / 3.0
+                volume = fields['volume']
+                valid = ~np.isnan(typical) & ~np.isnan(volume)
+                days = index.normalize()
+                cum_pv = pd.DataFrame(np.where(valid, typical * volume, 0.0)).groupby(days.values).cumsum().to_numpy(copy=True)
+                cum_volume = pd.DataFrame(np.where(valid, volume, 0.0)).groupby(days.values).cumsum().to_numpy(copy=True)
+                if 'VWAP' in state:
+                    prev_days, prev_pv, prev_volume = state['VWAP']
+                    same_day = days.values[:, None] == prev_days[None, :]
+                    cum_pv += np.where(same_day, prev_pv, 0.0)
+                    cum_volume += np.where(same_day, prev_volume, 0.0)
+                else:
+                    prev_days = np.full(len(self._symbols), np.datetime64('NaT'), dtype=days.values.dtype)
+                    prev_pv = prev_volume = np.zeros(len(self._symbols))
+                has_bar = valid.any(axis=0)
+                last_row = len(index) - 1 - np.argmax(valid[::-1], axis=0)
+                symbol_positions = np.arange(len(self._symbols))
+                new_state['VWAP'] = (np.where(has_bar, days.values[last_row], prev_days),
+                                     np.where(has_bar, cum_pv[last_row, symbol_positions], prev_pv),
+                                     np.where(has_bar, cum_volume[last_row, symbol_positions], prev_volume))
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    out[name] = np.where(valid & (cum_volume > 0), cum_pv / cum_volume, np.nan)
+
+        # 保留每个品种最后 lookback 根K线，不足时在前面补 NaN
+        rows = n_bars[None, :] - self._lookback + np.arange(self._lookback)[:, None]
+        new_state['tail'] = {field: np.where(rows >= 0, np.take_along_axis(values, np.maximum(rows, 0), axis=0), np.nan)
+                             for field, values in bars.items()}
+        self._state = new_state
+        return out
@@ -3,22 +3,49 @@ import pandas as pd
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 import logging
+import os
 from pathlib import Path
 from .utils import cache_data, load_cached_data
-from ..config import CACHE_DIR
+from .bar_store import BarStore, PYARROW_AVAILABLE
+from .indicators import IndicatorEngine
+from ..config import CACHE_DIR, CACHE_KEEP_LAST, DATA_DIR
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 增量获取时与已存储数据重叠的K线数量，用于更新未收盘的K线并确认数据衔接
+DELTA_OVERLAP_BARS = 2
+# 未安装 pyarrow 时，增量获取可使用的 CSV 缓存最大天数
+STORED_MAX_AGE_DAYS = 365
+
+def interval_timedelta(interval: Interval) -> timedelta:
+    """
+    返回K线间隔对应的时长，月线按 28 天计，宁可多估算K线数量
+    """
+    value = interval.value
+    if value.isdigit():
+        return timedelta(minutes=int(value))
+    count, unit = int(value[:-1]), value[-1]
+    return {
+        'H': timedelta(hours=count),
+        'D': timedelta(days=count),
+        'W': timedelta(weeks=count),
+        'M': timedelta(days=28 * count),
+    }[unit]
+
 class TvDataCollector:
-    def __init__(self, username: str = None, password: str = None):
+    def __init__(self, username: str = None, password: str = None, store_dir: str = None,
+                 tv: TvDatafeed = None):
         """
         初始化 TradingView 数据采集器
         Args:
             username: TradingView 用户名
             password: TradingView 密码
+            store_dir: 列式K线存储目录，默认为 data/bars；未安装 pyarrow 时使用 CSV 缓存
+            tv: 已创建的 TvDatafeed，如连接本地 TvReplayServer 的实例，默认用 username、password 登录创建
         """
-        self.tv = TvDatafeed(username=username, password=password)
+        self.tv = tv if tv is not None else TvDatafeed(username=username, password=password)
+        self.store = BarStore(store_dir or os.path.join(DATA_DIR, 'bars')) if PYARROW_AVAILABLE else None
         
     def get_symbol_data(self,
                        symbol: str,
@@ -35,30 +62,38 @@ class TvDataCollector:
             n_bars: 获取的K线数量
             use_cache: 是否使用缓存
         """
-        cache_key = f"{exchange}_{symbol}_{interval.value}"
-        
+        stored = None
         # 检查缓存
         if use_cache:
-            cached_data = load_cached_data(cache_key, CACHE_DIR)
+            cached_data = self._load_cached(symbol, exchange, interval, n_bars)
             if cached_data is not None:
-                logger.info(f"Using cached data for {cache_key}")
+                logger.info(f"Using cached data for {exchange}_{symbol}_{interval.value}")
                 return cached_data
+            stored = self._load_stored(symbol, exchange, interval, n_bars)
                 
         try:
             df = self.tv.get_hist(
                 symbol=symbol,
                 exchange=exchange,
                 interval=interval,
-                n_bars=n_bars
+                n_bars=self._delta_bars(stored, interval, n_bars)
             )
             
             if df is not None and not df.empty:
                 # 处理数据
                 df = self._process_dataframe(df)
                 
-                # 缓存数据
+                # 与已存储数据合并后缓存
                 if use_cache:
-                    cache_data(df, cache_key, CACHE_DIR)
+                    merged = self._merge_delta(stored, df, n_bars)
+                    if merged is None:
+                        logger.info(f"Delta for {exchange}_{symbol}_{interval.value} has a gap, fetching {n_bars} bars")
+                        df = self.tv.get_hist(symbol=symbol, exchange=exchange, interval=interval, n_bars=n_bars)
+                        if df is None or df.empty:
+                            return None
+                        merged = self._process_dataframe(df)
+                    df = merged
+                    self._save_cache(df, symbol, exchange, interval)
                 
                 return df
                 
@@ -69,31 +104,139 @@ class TvDataCollector:
     def get_multiple_symbols(self,
                            symbols: List[Dict[str, str]],
                            interval: Interval = Interval.in_daily,
-                           n_bars: int = 1000) -> Dict[str, pd.DataFrame]:
+                           n_bars: int = 1000,
+                           use_cache: bool = True) -> Dict[str, pd.DataFrame]:
         """
-        获取多个交易品种的数据
+        获取多个交易品种的数据，未命中缓存的品种按需获取的K线数量分批，每批通过同一个连接获取
         Args:
             symbols: 交易品种列表，格式为 [{"symbol": "AAPL", "exchange": "NASDAQ"}, ...]
             interval: 时间间隔
             n_bars: 获取的K线数量
+            use_cache: 是否使用缓存
         """
         results = {}
+        pending = {}  # EXCHANGE:SYMBOL -> (交易品种代码, 交易所, 已存储数据)
         for symbol_info in symbols:
             symbol = symbol_info["symbol"]
             exchange = symbol_info.get("exchange", "NASDAQ")
             
-            df = self.get_symbol_data(
-                symbol=symbol,
-                exchange=exchange,
-                interval=interval,
-                n_bars=n_bars
-            )
+            if use_cache:
+                cached_data = self._load_cached(symbol, exchange, interval, n_bars)
+                if cached_data is not None:
+                    logger.info(f"Using cached data for {exchange}_{symbol}_{interval.value}")
+                    results[f"{exchange}_{symbol}"] = cached_data
+                    continue
+                    
+            stored = self._load_stored(symbol, exchange, interval, n_bars) if use_cache else None
+            pending[f"{exchange}:{symbol}"] = (symbol, exchange, stored)
+            
+        # 需要获取的K线数量 -> EXCHANGE:SYMBOL 列表
+        batches = {}
+        for tv_symbol, (_, _, stored) in pending.items():
+            batches.setdefault(self._delta_bars(stored, interval, n_bars), []).append(tv_symbol)
             
-            if df is not None:
+        while batches:
+            count, tv_symbols = batches.popitem()
+            try:
+                fetched = self.tv.get_hist_many(
+                    symbols=tv_symbols,
+                    interval=interval,
+                    n_bars=count
+                )
+            except Exception as e:
+                logger.error(f"Error fetching data for {len(tv_symbols)} symbols: {str(e)}")
+                continue
+                
+            for tv_symbol, df in fetched.items():
+                if df is None or df.empty:
+                    continue
+                symbol, exchange, stored = pending[tv_symbol]
+                df = self._process_dataframe(df)
+                
+                if use_cache:
+                    merged = self._merge_delta(stored, df, n_bars)
+                    if merged is None:
+                        # 增量数据与已存储数据不衔接，重新获取完整数据
+                        pending[tv_symbol] = (symbol, exchange, None)
+                        batches.setdefault(n_bars, []).append(tv_symbol)
+                        continue
+                    df = merged
+                    self._save_cache(df, symbol, exchange, interval)
+                    
                 results[f"{exchange}_{symbol}"] = df
                 
         return results
         
+    def _load_cached(self,
+                     symbol: str,
+                     exchange: str,
+                     interval: Interval,
+                     n_bars: int,
+                     max_age_days: int = 1) -> Optional[pd.DataFrame]:
+        """
+        从K线存储读取最后 n_bars 根K线，数据超过 max_age_days 天未更新时返回 None
+        """
+        if self.store is None:
+            return load_cached_data(f"{exchange}_{symbol}_{interval.value}", CACHE_DIR, max_age_days)
+            
+        modified = self.store.last_modified(exchange, symbol, interval.value)
+        if modified is None or (datetime.now() - modified).days > max_age_days:
+            return None
+            
+        return self._load_stored(symbol, exchange, interval, n_bars)
+        
+    def _load_stored(self,
+                     symbol: str,
+                     exchange: str,
+                     interval: Interval,
+                     n_bars: int) -> Optional[pd.DataFrame]:
+        """
+        读取已存储的最后 n_bars 根K线，不检查数据是否过期，作为增量获取的基础
+        """
+        if self.store is None:
+            df = load_cached_data(f"{exchange}_{symbol}_{interval.value}", CACHE_DIR, STORED_MAX_AGE_DAYS)
+            return None if df is None else df.iloc[-n_bars:]
+            
+        df = self.store.read(exchange, symbol, interval.value, n_bars=n_bars)
+        if df is not None:
+            df.insert(0, 'symbol', f"{exchange}:{symbol}")
+        return df
+        
+    @staticmethod
+    def _delta_bars(stored: Optional[pd.DataFrame], interval: Interval, n_bars: int) -> int:
+        """
+        根据已存储的最后一根K线估算需要获取的K线数量
+        """
+        if stored is None or len(stored) < n_bars:
+            return n_bars
+            
+        missing = int((datetime.now() - stored.index[-1]) / interval_timedelta(interval))
+        return min(n_bars, missing + DELTA_OVERLAP_BARS)
+        
+    @staticmethod
+    def _merge_delta(stored: Optional[pd.DataFrame], delta: pd.DataFrame, n_bars: int) -> Optional[pd.DataFrame]:
+        """
+        将增量K线合并到已存储数据，按时间索引去重并保留最新的值
+        Returns:
+            最后 n_bars 根K线，增量数据与已存储数据之间有缺口时返回 None
+        """
+        if stored is None:
+            return delta
+        if delta.index[0] > stored.index[-1]:
+            return None
+            
+        merged = pd.concat([stored, delta])
+        return merged[~merged.index.duplicated(keep='last')].sort_index().iloc[-n_bars:]
+        
+    def _save_cache(self, df: pd.DataFrame, symbol: str, exchange: str, interval: Interval) -> None:
+        """
+        将K线追加到K线存储
+        """
+        if self.store is None:
+            cache_data(df, f"{exchange}_{symbol}_{interval.value}", CACHE_DIR, keep_last=CACHE_KEEP_LAST)
+        else:
+            self.store.write(df, exchange, symbol, interval.value)
+        
     def _process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         处理数据框架
@@ -102,14 +245,14 @@ class TvDataCollector:
         if not isinstance(df.index, pd.DatetimeIndex):
             df.index = pd.to_datetime(df.index)
             
-        # 重命名列
+        # 重命名列，索引与K线存储、CSV 缓存一致命名为 date
         df = df.rename(columns={
             'open': 'Open',
             'high': 'High',
             'low': 'Low',
             'close': 'Close',
             'volume': 'Volume'
-        })
+        }).rename_axis('date')
         
         return df
         
@@ -120,22 +263,19 @@ class TvDataCollector:
         计算技术指标
         Args:
             df: 价格数据
-            indicators: 需要计算的指标列表
+            indicators: 需要计算的指标列表，支持 SMA/EMA/RSI/MACD/BB/ATR/VWAP，
+                如 ['SMA20', 'EMA12', 'RSI', 'MACD', 'BB20', 'ATR14', 'VWAP']
         """
-        if indicators is None:
-            indicators = ['SMA20', 'SMA50', 'RSI']
-            
-        result = df.copy()
+        return df.join(IndicatorEngine(indicators).compute(df))
         
-        for indicator in indicators:
-            if indicator.startswith('SMA'):
-                period = int(indicator[3:])
-                result[indicator] = result['Close'].rolling(window=period).mean()
-            elif indicator == 'RSI':
-                delta = result['Close'].diff()
-                gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                rs = gain / loss
-                result['RSI'] = 100 - (100 / (1 + rs))
-                
-        return result 
\ No newline at end of file
+    def get_panel_indicators(self,
+                             data: Dict[str, pd.DataFrame],
+                             indicators: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        对多个品种按时间对齐后一次计算技术指标
+        Args:
+            data: 品种 -> 价格数据，如 get_multiple_symbols() 的结果
+            indicators: 需要计算的指标列表，同 get_technical_indicators()
+        """
+        results = IndicatorEngine(indicators).compute(data)
+        return {key: df.join(results[key]) for key, df in data.items()}
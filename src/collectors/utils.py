@@ -1,61 +1,340 @@
 import pandas as pd
 import os
+import threading
+import time
 from datetime import datetime
 import json
-from typing import Optional, Union
+from typing import Optional, Union, Dict, List
 from pathlib import Path
+from contextlib import contextmanager
 
-def cache_data(data: pd.DataFrame, 
-               cache_name: str, 
-               cache_dir: str) -> None:
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_LOCK_NAME = 'manifest.lock'
+
+@contextmanager
+def _file_lock(path: Path):
+    """
+    跨进程的排他文件锁
+    """
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 重试 10 秒后仍未获得锁
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class CacheManifest:
+    """
+    缓存清单，记录每个缓存键对应的缓存文件、大小和修改时间
+
+    清单保存在缓存目录下的 manifest.json 中，查找最新缓存文件不再需要
+    遍历目录和逐个 stat 文件。清单文件不存在时扫描一次目录生成。
+
+    多个进程可以同时写入同一缓存目录：修改清单时持有 manifest.lock 文件锁，
+    先重新读取清单再写回，写回通过临时文件原子替换。清理前如果目录在本进程
+    上次写入清单后被修改过（如其他进程写入的文件未记入清单），重新扫描目录。
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.path = self.cache_dir / MANIFEST_NAME
+        self.lock_path = self.cache_dir / MANIFEST_LOCK_NAME
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = {}  # 缓存键 -> 按修改时间排序的 {"file", "size", "mtime"}
+        self._loaded = None  # 已读取的清单文件的 (inode, 修改时间)
+        self._dir_mtime = None  # 本进程上次写入清单后缓存目录的修改时间
+
+    def _load(self) -> None:
+        """
+        清单文件被其他进程更新过时重新读取，清单文件不存在时扫描目录生成
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._scan()
+            return
+
+        if (stat.st_ino, stat.st_mtime_ns) == self._loaded:
+            return
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)['entries']
+            self._loaded = (stat.st_ino, stat.st_mtime_ns)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading cache manifest, rebuilding: {e}")
+            self._scan()
+
+    def _scan(self) -> None:
+        self._entries = {}
+        if self.cache_dir.exists():
+            for file in self.cache_dir.glob("*_*.csv"):
+                stat = file.stat()
+                self._entries.setdefault(file.stem.rsplit('_', 1)[0], []).append(
+                    {"file": file.name, "size": stat.st_size, "mtime": stat.st_mtime})
+            for files in self._entries.values():
+                files.sort(key=lambda entry: entry["mtime"])
+        self._save()
+
+    def _save(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.path.with_name(f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": 1, "entries": self._entries}, f)
+        os.replace(tmp_path, self.path)
+        stat = self.path.stat()
+        self._loaded = (stat.st_ino, stat.st_mtime_ns)
+        self._dir_mtime = self.cache_dir.stat().st_mtime_ns
+
+    @contextmanager
+    def _modify(self):
+        """
+        持有线程锁和文件锁，读取其他进程写入的最新清单后再修改
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock, _file_lock(self.lock_path):
+            self._load()
+            yield
+
+    def latest(self, cache_name: str) -> Optional[dict]:
+        """
+        返回缓存键对应的最新缓存文件记录
+        """
+        with self._lock:
+            self._load()
+            files = self._entries.get(cache_name)
+            return dict(files[-1]) if files else None
+
+    def add(self, cache_name: str, file: Path) -> None:
+        """
+        记录新写入的缓存文件，同名文件覆盖原记录
+        """
+        stat = file.stat()
+        with self._modify():
+            files = [entry for entry in self._entries.get(cache_name, []) if entry["file"] != file.name]
+            files.append({"file": file.name, "size": stat.st_size, "mtime": stat.st_mtime})
+            self._entries[cache_name] = files
+            self._save()
+
+    def evict(self,
+              cache_name: Optional[str] = None,
+              max_age_days: Optional[int] = None,
+              max_total_bytes: Optional[int] = None,
+              keep_last: Optional[int] = None) -> int:
+        """
+        删除过期的缓存文件
+        Args:
+            cache_name: 只清理该缓存键，None 时清理所有缓存键
+            max_age_days: 删除超过该天数的文件
+            max_total_bytes: 缓存总大小超过该值时从最旧的文件开始删除
+            keep_last: 每个缓存键最多保留的文件数量
+        Returns:
+            删除的文件数量
+        """
+        now = datetime.now().timestamp()
+        with self._modify():
+            if self.cache_dir.stat().st_mtime_ns != self._dir_mtime:
+                # 目录中可能有未记入清单的文件，重新扫描以免遗留无法清理的文件
+                self._scan()
+            names = list(self._entries) if cache_name is None else [cache_name]
+            removed = []
+            for name in names:
+                files = self._entries.get(name, [])
+                if keep_last is not None:
+                    split = max(len(files) - keep_last, 0)
+                    removed.extend(files[:split])
+                    files = files[split:]
+                if max_age_days is not None:
+                    removed.extend(entry for entry in files if (now - entry["mtime"]) / 86400 > max_age_days)
+                    files = [entry for entry in files if (now - entry["mtime"]) / 86400 <= max_age_days]
+                self._entries[name] = files
+
+            if max_total_bytes is not None:
+                remaining = sorted(((entry, name) for name in names for entry in self._entries[name]),
+                                   key=lambda item: item[0]["mtime"])
+                total = sum(entry["size"] for entry, _ in remaining)
+                for entry, name in remaining:
+                    if total <= max_total_bytes:
+                        break
+                    self._entries[name].remove(entry)
+                    removed.append(entry)
+                    total -= entry["size"]
+
+            for entry in removed:
+                try:
+                    (self.cache_dir / entry["file"]).unlink()
+                except FileNotFoundError:
+                    pass
+            self._entries = {name: files for name, files in self._entries.items() if files}
+            if removed:
+                self._save()
+            return len(removed)
+
+    def discard(self, cache_name: str, file_name: str) -> None:
+        """
+        移除已不存在的缓存文件记录
+        """
+        with self._modify():
+            files = [entry for entry in self._entries.get(cache_name, []) if entry["file"] != file_name]
+            if files:
+                self._entries[cache_name] = files
+            else:
+                self._entries.pop(cache_name, None)
+            self._save()
+
+class RateLimiter:
+    """
+    令牌桶限流器，多个线程共享同一配额
+
+    允许最多 max_calls 次突发请求，之后按 max_calls / period 的速率补充。
+    """
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        """
+        Args:
+            max_calls: 每个周期允许的请求次数
+            period: 周期长度（秒）
+        """
+        if max_calls < 1:
+            raise ValueError("max_calls 必须大于 0")
+        self.capacity = max_calls
+        self.rate = max_calls / period
+        self._tokens = float(max_calls)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        获取一次请求配额，配额不足时阻塞等待
+        Returns:
+            等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+_manifests: Dict[str, CacheManifest] = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(cache_dir: str) -> CacheManifest:
+    """
+    返回缓存目录对应的缓存清单，同一目录共享一个实例
+    """
+    key = os.path.abspath(cache_dir)
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = CacheManifest(cache_dir)
+        return _manifests[key]
+
+def cache_data(data: pd.DataFrame,
+               cache_name: str,
+               cache_dir: str,
+               keep_last: Optional[int] = None) -> None:
     """
     缓存数据到本地
+
+    Args:
+        keep_last: 写入后该缓存键最多保留的文件数量，None 时不清理
     """
     os.makedirs(cache_dir, exist_ok=True)
     cache_path = Path(cache_dir) / f"{cache_name}_{datetime.now().strftime('%Y%m%d')}.csv"
-    
+
     # 确保索引名称为 'date'
     data.index.name = 'date'
     data.to_csv(cache_path)
 
-def load_cached_data(cache_name: str, 
-                    cache_dir: str, 
+    manifest = get_manifest(cache_dir)
+    manifest.add(cache_name, cache_path)
+    if keep_last is not None:
+        manifest.evict(cache_name, keep_last=keep_last)
+
+def evict_cache(cache_dir: str,
+                max_age_days: Optional[int] = None,
+                max_total_bytes: Optional[int] = None,
+                keep_last: Optional[int] = None) -> int:
+    """
+    按策略清理缓存目录中的旧文件
+
+    Args:
+        max_age_days: 删除超过该天数的文件
+        max_total_bytes: 缓存总大小超过该值时从最旧的文件开始删除
+        keep_last: 每个缓存键最多保留的文件数量
+    Returns:
+        删除的文件数量
+    """
+    return get_manifest(cache_dir).evict(max_age_days=max_age_days,
+                                         max_total_bytes=max_total_bytes,
+                                         keep_last=keep_last)
+
+def load_cached_data(cache_name: str,
+                    cache_dir: str,
                     max_age_days: int = 1) -> Optional[pd.DataFrame]:
     """
     从缓存加载数据
     """
     try:
-        cache_path = Path(cache_dir)
-        if not cache_path.exists():
+        if not Path(cache_dir).exists():
             return None
-            
-        files = list(cache_path.glob(f"{cache_name}_*.csv"))
-        if not files:
+
+        manifest = get_manifest(cache_dir)
+        entry = manifest.latest(cache_name)
+        if entry is None:
             return None
-            
-        latest_file = max(files, key=lambda x: x.stat().st_mtime)
-        file_age = (datetime.now() - datetime.fromtimestamp(latest_file.stat().st_mtime)).days
-        
+
+        file_age = (datetime.now() - datetime.fromtimestamp(entry["mtime"])).days
         if file_age > max_age_days:
             return None
-            
+
+        latest_file = Path(cache_dir) / entry["file"]
+        if not latest_file.exists():
+            # 文件已被外部删除
+            manifest.discard(cache_name, entry["file"])
+            return None
+
         # 先尝试读取文件头，检查列名
         df = pd.read_csv(latest_file)
-        
+
         # 如果 'date' 不在列中，可能是索引
         if 'date' not in df.columns and df.index.name != 'date':
             # 重置索引，确保日期列存在
             df = df.reset_index()
             if 'index' in df.columns:
                 df = df.rename(columns={'index': 'date'})
-                
+
         # 设置日期索引
         if 'date' in df.columns:
             df['date'] = pd.to_datetime(df['date'])
             df.set_index('date', inplace=True)
-        
+
         return df
-        
+
     except Exception as e:
         print(f"Error loading cached data: {e}")
         return None
@@ -21,9 +21,45 @@ FRED_SERIES = {
     'PCEPI': 'PCEPI',               # 个人消费支出价格指数
 }
 
+# 衍生系列：名称 -> 表达式和对齐频率，结果以 derived:名称 保存到数据库
+DERIVED_SERIES = {
+    'T10Y3M_SPREAD': {
+        'expression': 'DGS10 - DGS3MO',
+        'freq': 'B',
+        'title': '10年期与3个月期国债利差',
+        'units': 'Percentage Points',
+    },
+    'CPI_YOY': {
+        'expression': '100 * pct_change(CPIAUCSL, 12)',
+        'freq': 'MS',
+        'title': 'CPI 同比',
+        'units': 'Percent',
+    },
+    'REAL_FEDFUNDS': {
+        'expression': 'FEDFUNDS - 100 * pct_change(CPIAUCSL, 12)',
+        'freq': 'MS',
+        'title': '实际联邦基金利率',
+        'units': 'Percent',
+    },
+    'M2_YOY': {
+        'expression': '100 * pct_change(M2, 12)',
+        'freq': 'MS',
+        'title': 'M2 同比增速',
+        'units': 'Percent',
+    },
+}
+
+# FRED API 限制每分钟 120 次请求
+FRED_MAX_REQUESTS_PER_MINUTE = 120
+FRED_MAX_WORKERS = 8               # 并发获取 FRED 数据的线程数
+FRED_SYNC_MAX_AGE_HOURS = 24       # 数据库中的系列超过该时间未检查更新时先增量同步
+FRED_FRAME_CACHE_BYTES = 256 * 1024 * 1024  # FedDataCollector 读取数据的内存缓存大小
+
 # 数据存储配置
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+CACHE_KEEP_LAST = 3                 # 每个缓存键保留的缓存文件数量
+FRED_FIXTURE_DIR = os.path.join(DATA_DIR, 'fixtures', 'fred')  # FredRecorder 录制、FredReplay 回放的夹具目录
 
 # LLM 配置
 LLM_MODEL = "gpt-3.5-turbo"
@@ -1,71 +1,289 @@
 import sqlite3
+import logging
+import threading
+import time
 from datetime import datetime
+from itertools import repeat
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
+from .frame_cache import FrameCache
+
+logger = logging.getLogger(__name__)
+
+# economic_data 中的日期保存为 1970-01-01 起的天数（epoch day）
+
+# series_metadata 中除 series_id 外的列
+# last_updated: 本地写入时间；last_observation: 已保存的最后一个观测日期；
+# fred_last_updated: FRED 返回的系列更新时间；last_checked: 最近一次向 FRED 检查更新的时间
+METADATA_COLUMNS = ['title', 'units', 'frequency', 'last_updated',
+                    'last_observation', 'fred_last_updated', 'last_checked']
+
+# 每个系列的最新值和前一个值，{source} 为 economic_data 或其子查询
+_SUMMARY_QUERY = '''
+    SELECT series_id, latest_date, latest_value, prev_value
+    FROM (
+        SELECT series_id,
+               date AS latest_date,
+               value AS latest_value,
+               LAG(value) OVER (PARTITION BY series_id ORDER BY date) AS prev_value,
+               ROW_NUMBER() OVER (PARTITION BY series_id ORDER BY date DESC) AS row_number
+        FROM {source}
+    )
+    WHERE row_number = 1
+'''
+
+def to_epoch_days(dates) -> np.ndarray:
+    """将日期转换为 epoch day 整数数组"""
+    return pd.DatetimeIndex(pd.to_datetime(dates)).values.astype('datetime64[D]').astype('int64')
+
+def from_epoch_days(days) -> pd.DatetimeIndex:
+    """将 epoch day 整数转换为日期索引，不需要解析字符串"""
+    return pd.DatetimeIndex(pd.to_datetime(np.asarray(days, dtype='int64'), unit='D'), name='date')
+
+def _epoch_day(date) -> int:
+    return int(to_epoch_days([date])[0])
+
+# 连接参数
+CACHE_SIZE_KB = 64 * 1024          # 每个连接的页缓存大小
+MMAP_SIZE = 256 * 1024 * 1024      # 内存映射读取的最大字节数
+BUSY_TIMEOUT = 30                  # 等待其他连接释放写锁的秒数
 
 class Database:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, cache_size_kb: int = CACHE_SIZE_KB, mmap_size: int = MMAP_SIZE,
+                 materialize_summary: bool = False, frame_cache_bytes: int = 0):
+        """
+        Args:
+            db_path: 数据库文件路径，默认使用 data/fred_data.db
+            cache_size_kb: 每个连接的页缓存大小（KB）
+            mmap_size: 内存映射读取的最大字节数，0 表示不使用内存映射
+            materialize_summary: 读取摘要时是否使用 series_summary 表而不扫描 economic_data。
+                该表在每次写入时更新该系列的最新值，与此选项无关
+            frame_cache_bytes: get_series_data 结果的内存缓存大小（字节），0 表示不缓存。
+                缓存只在本进程的 save_series_data 时失效，其他进程写入的数据不会反映到缓存中
+        """
         if db_path is None:
             # 默认在data目录下创建数据库文件
             db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'fred_data.db')
         
         self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.materialize_summary = materialize_summary
+        self.frame_cache = FrameCache(frame_cache_bytes) if frame_cache_bytes > 0 else None
+        self.write_stats = {}  # 最近一次 save_series_data 的行数、耗时和每秒写入行数
+        self._local = threading.local()
+        self._connections = {}  # 线程 -> 该线程的连接，用于关闭
+        self._connections_lock = threading.Lock()
         self._init_db()
     
     def _init_db(self):
         """初始化数据库，创建必要的表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            # 创建经济数据表
+            # 创建经济数据表，按 (series_id, date) 聚簇存储
+            migrate = self._needs_migration(cursor)
+            if migrate:
+                # 迁移在一个事务中完成，中途失败时保留旧表
+                cursor.execute("BEGIN")
+                cursor.execute("ALTER TABLE economic_data RENAME TO economic_data_old")
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS economic_data (
                     series_id TEXT,
-                    date TEXT,
+                    date INTEGER,
                     value REAL,
-                    last_updated TEXT,
                     PRIMARY KEY (series_id, date)
-                )
+                ) WITHOUT ROWID
             ''')
             
-            # 创建元数据表
+            # 创建写入日志表，每次写入记录一行，不再在每个数据行重复写入时间
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS series_metadata (
-                    series_id TEXT PRIMARY KEY,
-                    title TEXT,
-                    units TEXT,
-                    frequency TEXT,
-                    last_updated TEXT
+                CREATE TABLE IF NOT EXISTS load_log (
+                    series_id TEXT,
+                    loaded_at TEXT,
+                    rows INTEGER,
+                    first_date INTEGER,
+                    last_date INTEGER
                 )
             ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS load_log_series ON load_log (series_id, loaded_at)")
+            if migrate:
+                self._migrate_economic_data(cursor)
+            
+            # 创建元数据表
+            self._create_metadata_table(cursor)
+            self._migrate_metadata(cursor)
+            
+            # 摘要表只在缺失时从已有数据构建一次，之后每次 save_series_data 都增量更新，
+            # 无论是否启用 materialize_summary，共用数据库的实例读到的摘要始终是最新的
+            if not self._table_exists(cursor, 'series_summary'):
+                cursor.execute('''
+                    CREATE TABLE series_summary (
+                        series_id TEXT PRIMARY KEY,
+                        latest_date INTEGER,
+                        latest_value REAL,
+                        prev_value REAL
+                    )
+                ''')
+                cursor.execute("INSERT INTO series_summary " + _SUMMARY_QUERY.format(source="economic_data"))
             
             conn.commit()
+        
+        if migrate:
+            # 回收旧表占用的空间
+            conn.execute("VACUUM")
+    
+    @staticmethod
+    def _table_exists(cursor, name: str) -> bool:
+        """表是否已存在"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+        return cursor.fetchone() is not None
+    
+    @staticmethod
+    def _needs_migration(cursor) -> bool:
+        """economic_data 是否为旧版本以文本保存日期的表"""
+        cursor.execute("PRAGMA table_info(economic_data)")
+        columns = {row[1]: row[2] for row in cursor.fetchall()}  # 列名 -> 类型
+        return columns.get('date', 'INTEGER').upper() == 'TEXT'
+    
+    def _migrate_economic_data(self, cursor):
+        """将旧表的文本日期转换为 epoch day，每个系列的写入时间转入 load_log"""
+        logger.info(f"Migrating economic_data in {self.db_path} to epoch day dates")
+        epoch_day = "CAST(julianday(date(date)) - 2440587.5 AS INTEGER)"
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO economic_data (series_id, date, value)
+            SELECT series_id, {epoch_day}, value FROM economic_data_old
+        ''')
+        cursor.execute(f'''
+            INSERT INTO load_log (series_id, loaded_at, rows, first_date, last_date)
+            SELECT series_id, MAX(last_updated), COUNT(*), MIN({epoch_day}), MAX({epoch_day})
+            FROM economic_data_old
+            GROUP BY series_id
+        ''')
+        cursor.execute("DROP TABLE economic_data_old")
+    
+    @staticmethod
+    def _create_metadata_table(cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS series_metadata (
+                series_id TEXT PRIMARY KEY,
+                title TEXT,
+                units TEXT,
+                frequency TEXT,
+                last_updated TEXT,
+                last_observation TEXT,
+                fred_last_updated TEXT,
+                last_checked TEXT
+            )
+        ''')
+    
+    def _migrate_metadata(self, cursor):
+        """升级旧版本的元数据表，补齐同步状态列"""
+        cursor.execute("PRAGMA table_info(series_metadata)")
+        columns = {row[1]: row[5] for row in cursor.fetchall()}  # 列名 -> 是否主键
+        
+        if not columns.get('series_id'):
+            # 旧版本用 to_sql(if_exists='replace') 写元数据，表没有主键，需要重建
+            kept = ', '.join(column for column in ['series_id'] + METADATA_COLUMNS if column in columns)
+            cursor.execute("ALTER TABLE series_metadata RENAME TO series_metadata_old")
+            self._create_metadata_table(cursor)
+            cursor.execute(f"INSERT OR REPLACE INTO series_metadata ({kept}) SELECT {kept} FROM series_metadata_old")
+            cursor.execute("DROP TABLE series_metadata_old")
+            return
+        
+        for column in METADATA_COLUMNS:
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE series_metadata ADD COLUMN {column} TEXT")
     
-    def save_series_data(self, series_id: str, df: pd.DataFrame, metadata: dict = None):
-        """保存系列数据到数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            # 准备数据
-            df = df.copy()
-            df['series_id'] = series_id
-            df['last_updated'] = datetime.now().isoformat()
-            df = df.reset_index()  # 将日期索引转换为列
-            df = df.rename(columns={'index': 'date'})
+    def save_series_data(self, series_id: str, df: pd.DataFrame, metadata: dict = None) -> int:
+        """保存系列数据到数据库，已存在的日期覆盖原值
+        
+        数据和元数据在同一事务中写入，写入速度记录在 self.write_stats 中。
+        
+        Args:
+            series_id: FRED系列ID
+            df: 以日期为索引、包含 value 列的数据
+            metadata: 元数据或同步状态，只更新给出的列
             
-            # 保存数据
-            df.to_sql('economic_data', conn, if_exists='append', index=False, 
-                     method='multi', chunksize=1000)
+        Returns:
+            int: 写入的行数
+        """
+        started = time.perf_counter()
+        now = datetime.now().isoformat()
+        dates = to_epoch_days(df.index)
+        values = pd.to_numeric(df['value'], errors='coerce').astype('float64').tolist()  # NaN 由 SQLite 存为 NULL
+        
+        # with 块结束时提交，整个写入只有一个事务
+        with self._get_connection() as conn:
+            conn.executemany('''
+                INSERT INTO economic_data (series_id, date, value)
+                VALUES (?, ?, ?)
+                ON CONFLICT(series_id, date) DO UPDATE SET value = excluded.value
+            ''', zip(repeat(series_id), dates.tolist(), values))
+            conn.execute(
+                "INSERT INTO load_log (series_id, loaded_at, rows, first_date, last_date) VALUES (?, ?, ?, ?, ?)",
+                [series_id, now, len(values),
+                 int(dates.min()) if len(dates) else None, int(dates.max()) if len(dates) else None]
+            )
             
             # 保存元数据
             if metadata:
-                metadata['last_updated'] = datetime.now().isoformat()
-                metadata_df = pd.DataFrame([metadata])
-                metadata_df.to_sql('series_metadata', conn, if_exists='replace', 
-                                 index=False)
+                self._upsert_metadata(conn, series_id, dict(metadata, last_updated=now))
+            
+            # 更新摘要表，只需最后两个观测值
+            latest = "(SELECT * FROM economic_data WHERE series_id = ? ORDER BY date DESC LIMIT 2)"
+            conn.execute("INSERT OR REPLACE INTO series_summary " + _SUMMARY_QUERY.format(source=latest),
+                         [series_id])
+        
+        if self.frame_cache is not None:
+            self.frame_cache.invalidate(series_id)
+        
+        seconds = time.perf_counter() - started
+        self.write_stats = {
+            'rows': len(values),
+            'seconds': seconds,
+            'rows_per_second': len(values) / seconds if seconds > 0 else None
+        }
+        logger.debug(f"Saved {len(values)} rows for {series_id} in {seconds:.3f}s")
+        return len(values)
+    
+    def _upsert_metadata(self, conn, series_id: str, metadata: dict):
+        """插入或更新一行元数据，只修改 metadata 中给出的列"""
+        fields = {column: metadata[column] for column in METADATA_COLUMNS if column in metadata}
+        columns = ['series_id'] + list(fields)
+        if fields:
+            conflict = "DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in fields)
+        else:
+            conflict = "DO NOTHING"
+        conn.execute(
+            f"INSERT INTO series_metadata ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(series_id) {conflict}",
+            [series_id] + list(fields.values())
+        )
+    
+    def save_series_metadata(self, series_id: str, metadata: dict):
+        """保存系列元数据，只更新给出的列"""
+        with self._get_connection() as conn:
+            self._upsert_metadata(conn, series_id, metadata)
+    
+    def get_last_observation(self, series_id: str):
+        """返回已保存的最后一个观测日期，没有数据时返回 None"""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT MAX(date) FROM economic_data WHERE series_id = ?", [series_id]).fetchone()
+        return from_epoch_days([row[0]])[0] if row[0] is not None else None
     
     def get_series_data(self, series_id: str, start_date: str = None, end_date: str = None) -> pd.DataFrame:
-        """从数据库获取系列数据"""
-        with sqlite3.connect(self.db_path) as conn:
+        """从数据库获取系列数据，启用内存缓存时先查缓存"""
+        if self.frame_cache is not None:
+            df = self.frame_cache.get(series_id, start_date, end_date)
+            if df is not None:
+                return df
+            # 在读取之前记下代数，读取期间其他线程写入该系列时不缓存旧数据
+            generation = self.frame_cache.generation(series_id)
+        
+        with self._get_connection() as conn:
             query = f"""
                 SELECT date, value 
                 FROM economic_data 
@@ -75,30 +293,110 @@ class Database:
             
             if start_date:
                 query += " AND date >= ?"
-                params.append(start_date)
+                params.append(_epoch_day(start_date))
             if end_date:
                 query += " AND date <= ?"
-                params.append(end_date)
+                params.append(_epoch_day(end_date))
             
             query += " ORDER BY date"
             
             df = pd.read_sql_query(query, conn, params=params)
             if not df.empty:
-                df['date'] = pd.to_datetime(df['date'])
-                df.set_index('date', inplace=True)
-                df.index.name = 'date'
-            return df
+                df.index = from_epoch_days(df.pop('date'))
+        
+        if self.frame_cache is not None:
+            self.frame_cache.put(series_id, start_date, end_date, df, generation)
+        return df
+    
+    def get_panel(self, series_ids: list, start_date: str = None, end_date: str = None,
+                  freq: str = None) -> pd.DataFrame:
+        """一次查询获取多个系列，返回日期 × 系列的宽表
+        
+        Args:
+            series_ids: 系列ID列表，决定列的顺序，没有数据的系列为全 NaN 列
+            start_date: 开始日期（含）
+            end_date: 结束日期（含）
+            freq: 统一的日期频率，如 'D'、'B'、'MS'。给出时每个日期取各系列在该日期及之前的
+                最新值（前向填充），用于对齐季度 GDP 和日度利率等不同频率的系列
+                
+        Returns:
+            pd.DataFrame: 以 date 为索引、每个系列一列的数据
+        """
+        series_ids = list(dict.fromkeys(series_ids))
+        if not series_ids:
+            return pd.DataFrame(index=from_epoch_days([]))
+        
+        # 查询直接返回列位置，结果全部为数值，可以一次转换为数组
+        requested = ", ".join("(?, ?)" for _ in series_ids)
+        params = [param for position, series_id in enumerate(series_ids) for param in (series_id, position)]
+        conditions = ""
+        if start_date:
+            conditions += " AND e.date >= ?"
+            params.append(_epoch_day(start_date))
+        if end_date:
+            conditions += " AND e.date <= ?"
+            params.append(_epoch_day(end_date))
+        query = f"""
+            WITH requested(series_id, position) AS (VALUES {requested})
+            SELECT r.position, e.date, e.value
+            FROM requested AS r
+            JOIN economic_data AS e ON e.series_id = r.series_id{conditions}
+        """
+        if start_date and freq:
+            # 前向填充还需要每个系列在开始日期之前的最后一个值，只多读取这一行
+            query += """
+            UNION ALL
+            SELECT r.position, e.date, e.value
+            FROM requested AS r
+            JOIN economic_data AS e ON e.series_id = r.series_id AND e.date = (
+                SELECT MAX(date) FROM economic_data
+                WHERE series_id = r.series_id AND date < ? AND value IS NOT NULL)
+            """
+            params.append(_epoch_day(start_date))
+        
+        with self._get_connection() as conn:
+            rows = np.array(conn.execute(query, params).fetchall(), dtype=np.float64).reshape(-1, 3)  # NULL 转为 NaN
+        columns = rows[:, 0].astype(np.intp)
+        days = rows[:, 1].astype(np.int64)
+        values = rows[:, 2]
+        
+        # 按日期和系列位置散布到二维数组
+        dates, date_rows = np.unique(days, return_inverse=True)
+        panel = np.full((len(dates), len(series_ids)), np.nan)
+        panel[date_rows, columns] = values
+        
+        if not freq:
+            return pd.DataFrame(panel, index=from_epoch_days(dates), columns=series_ids)
+        
+        # 每列前向填充
+        observed = np.where(~np.isnan(panel), np.arange(len(dates))[:, None], 0)
+        np.maximum.accumulate(observed, axis=0, out=observed)
+        panel = panel[observed, np.arange(len(series_ids))]
+        
+        # 每个日历日期取该日期及之前的最后一行
+        index = from_epoch_days(dates)
+        if len(index) == 0 and not (start_date and end_date):
+            return pd.DataFrame(columns=series_ids, index=index, dtype=float)
+        calendar = pd.date_range(start_date or index[0], end_date or index[-1], freq=freq, name='date')
+        positions = np.searchsorted(dates, to_epoch_days(calendar), side='right') - 1
+        result = np.full((len(calendar), len(series_ids)), np.nan)
+        result[positions >= 0] = panel[positions[positions >= 0]]
+        return pd.DataFrame(result, index=calendar, columns=series_ids)
     
     def get_series_metadata(self, series_id: str) -> dict:
         """获取系列元数据"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._get_connection() as conn:
             query = "SELECT * FROM series_metadata WHERE series_id = ?"
             df = pd.read_sql_query(query, conn, params=[series_id])
             return df.to_dict('records')[0] if not df.empty else None
     
+    def cache_stats(self) -> dict:
+        """返回内存缓存的命中次数、未命中次数、条目数和字节数，未启用缓存时返回空字典"""
+        return self.frame_cache.stats() if self.frame_cache is not None else {}
+    
     def get_latest_data(self, series_id: str) -> pd.DataFrame:
         """获取最新的数据点"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._get_connection() as conn:
             query = """
                 SELECT date, value 
                 FROM economic_data 
@@ -108,10 +406,88 @@ class Database:
             """
             df = pd.read_sql_query(query, conn, params=[series_id])
             if not df.empty:
-                df['date'] = pd.to_datetime(df['date'])
-                df.set_index('date', inplace=True)
-                df.index.name = 'date'
-            return df 
+                df.index = from_epoch_days(df.pop('date'))
+            return df
+    
+    def get_load_log(self, series_id: str) -> pd.DataFrame:
+        """获取系列的写入记录，按写入时间排序"""
+        with self._get_connection() as conn:
+            df = pd.read_sql_query(
+                "SELECT loaded_at, rows, first_date, last_date FROM load_log WHERE series_id = ? ORDER BY loaded_at",
+                conn, params=[series_id])
+        df['loaded_at'] = pd.to_datetime(df['loaded_at'])
+        for column in ['first_date', 'last_date']:
+            df[column] = pd.to_datetime(df[column], unit='D')
+        return df
 
-    def _get_connection(self):
-        return sqlite3.connect(self.db_path) 
\ No newline at end of file
+    def get_latest_summary(self, series_ids: list = None) -> pd.DataFrame:
+        """一次查询获取各系列的最新值、前一个值的变化和元数据标题
+        
+        Args:
+            series_ids: 系列ID列表，None 时返回所有系列
+            
+        Returns:
+            pd.DataFrame: series_id、title、latest_date、latest_value、change、pct_change 列，
+                按 series_ids 的顺序排列
+        """
+        where, params = "", []
+        if series_ids is not None:
+            series_ids = list(series_ids)
+            if not series_ids:
+                return pd.DataFrame(columns=['series_id', 'title', 'latest_date', 'latest_value', 'change', 'pct_change'])
+            where = f" WHERE series_id IN ({', '.join('?' * len(series_ids))})"
+            params = series_ids
+        
+        if self.materialize_summary:
+            source = "(SELECT * FROM series_summary" + where + ")"
+        else:
+            source = "(" + _SUMMARY_QUERY.format(source="economic_data" + where) + ")"
+        
+        query = f"""
+            SELECT s.series_id,
+                   COALESCE(m.title, s.series_id) AS title,
+                   s.latest_date,
+                   s.latest_value,
+                   s.latest_value - s.prev_value AS change,
+                   (s.latest_value - s.prev_value) * 100.0 / s.prev_value AS pct_change
+            FROM {source} AS s
+            LEFT JOIN series_metadata AS m ON m.series_id = s.series_id
+            ORDER BY s.series_id
+        """
+        with self._get_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        df['latest_date'] = pd.to_datetime(df['latest_date'], unit='D')
+        if series_ids is not None:
+            order = {series_id: n for n, series_id in enumerate(series_ids)}
+            df = df.sort_values('series_id', key=lambda ids: ids.map(order), kind='stable').reset_index(drop=True)
+        return df
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """返回当前线程的数据库连接，首次调用时创建
+        
+        每个线程复用自己的连接，连接使用 WAL 日志模式，读取不会阻塞写入。
+        用 with 块包裹时在块结束时提交事务，连接不会关闭。
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL 模式下断电最多丢失最后的事务，不会损坏数据库
+            conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+            conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+            self._local.conn = conn
+            
+            with self._connections_lock:
+                # 关闭已退出线程留下的连接
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+    
+    def close(self):
+        """关闭所有线程的连接，调用前应确保其他线程不再使用数据库"""
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections = {}
+        self._local = threading.local()
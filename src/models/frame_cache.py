@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import pandas as pd
+
+
+class FrameCache:
+    """
+    进程内的 DataFrame LRU 缓存，键为 (series_id, start, end)
+
+    请求的日期范围落在某个已缓存的更大范围内时，直接从缓存切片返回。缓存总大小
+    超过 max_bytes 时淘汰最久未使用的数据。
+
+    每次 invalidate 都会增加该系列的代数。读取数据前先调用 generation()，
+    把结果传给 put()；读取期间数据被其他线程修改并失效时，旧数据不会写入缓存。
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: 缓存的 DataFrame 总字节数上限
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: OrderedDict = OrderedDict()  # (series_id, start, end) -> (DataFrame, 字节数)
+        self._generations = {}  # series_id -> 该系列被失效的次数
+        self._generation = 0  # 整个缓存被清空的次数
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(series_id: str, start, end) -> Tuple[str, Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        return (series_id,
+                None if start is None else pd.Timestamp(start),
+                None if end is None else pd.Timestamp(end))
+
+    @staticmethod
+    def _contains(cached: tuple, key: tuple) -> bool:
+        """cached 的日期范围是否包含 key 的日期范围，None 表示不限"""
+        _, cached_start, cached_end = cached
+        _, start, end = key
+        return ((cached_start is None or (start is not None and cached_start <= start)) and
+                (cached_end is None or (end is not None and end <= cached_end)))
+
+    def get(self, series_id: str, start=None, end=None) -> Optional[pd.DataFrame]:
+        """
+        返回缓存的数据副本，未命中时返回 None
+        Args:
+            series_id: 系列ID
+            start: 起始日期（含），None 表示不限
+            end: 结束日期（含），None 表示不限
+        """
+        key = self._key(series_id, start, end)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0].copy()
+
+            for cached in reversed(self._entries):
+                if cached[0] == series_id and self._contains(cached, key):
+                    self._entries.move_to_end(cached)
+                    self.hits += 1
+                    df = self._entries[cached][0]
+                    if df.empty:
+                        return df.copy()
+                    return df.loc[key[1]:key[2]].copy()
+
+            self.misses += 1
+            return None
+
+    def generation(self, series_id: str) -> int:
+        """
+        返回系列当前的代数，系列或整个缓存每次失效后增大
+        """
+        with self._lock:
+            return self._generation + self._generations.get(series_id, 0)
+
+    def put(self, series_id: str, start, end, df: pd.DataFrame, generation: Optional[int] = None) -> None:
+        """
+        缓存数据，超过 max_bytes 时从最久未使用的数据开始淘汰
+        Args:
+            generation: 读取数据前 generation() 的返回值，之后系列已失效时不缓存；
+                None 表示不检查
+        """
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        key = self._key(series_id, start, end)
+        with self._lock:
+            if generation is not None and generation != self._generation + self._generations.get(series_id, 0):
+                return
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df.copy(), size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def invalidate(self, series_id: Optional[str] = None) -> None:
+        """
+        删除系列的所有缓存数据，series_id 为 None 时清空缓存
+        """
+        with self._lock:
+            if series_id is None:
+                self._generation += 1
+            else:
+                self._generations[series_id] = self._generations.get(series_id, 0) + 1
+            for key in [key for key in self._entries if series_id is None or key[0] == series_id]:
+                self.bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> dict:
+        """
+        返回命中次数、未命中次数、缓存条目数和缓存字节数
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.bytes
+            }
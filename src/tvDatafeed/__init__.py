@@ -2,5 +2,11 @@ from .main import TvDatafeed, Interval
 from .seis import Seis
 from .datafeed import TvDatafeedLive
 from .consumer import Consumer
+from .dispatcher import ConsumerPool, AsyncDispatcher
+from .session import TvSession
+from .symbol_cache import SymbolCache
+from .indicators import StreamingIndicator, RollingMean, RollingVariance, EMA, RSI, ATR
+from .async_datafeed import AsyncTvDatafeed
+from .replay import TvReplayServer
 
 __version__ = "2.1.0"
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import logging
+from . import protocol
+from .main import TvDatafeed, Interval
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncConnection(object):
+    # Internal asyncio websocket with its own chart session, serving
+    # many concurrent series requests keyed by series id
+    def __init__(self, token, url, origin):
+        self._token = token
+        self._url = url
+        self._origin = origin
+
+        self.chart_session = protocol.generate_session("cs_")
+        self.quote_session = protocol.generate_session("qs_")
+        self.closed = False
+        self.assigned = 0  # requests handed to this connection and not yet done
+
+        self._ws = None
+        self._reader = None
+        self._requests = {}  # series id -> (SeriesBuffer, future)
+        self._symbol_ids = {}  # symbol id -> series id
+        self._counter = 0
+
+    async def open(self):
+        self._ws = await websockets.connect(self._url, origin=self._origin, max_size=None)
+
+        for func, args in protocol.handshake_messages(
+                self._token, self.chart_session, self.quote_session):
+            await self._send(func, args)
+        await self._send("switch_timezone", [self.chart_session, "exchange"])
+
+        self._reader = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def close(self):
+        self.closed = True
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def fetch(self, symbol, interval, n_bars, extended_session=False):
+        self._counter += 1
+        symbol_id = "symbol_" + str(self._counter)
+        series_id = "s" + str(self._counter)
+
+        future = asyncio.get_running_loop().create_future()
+        self._requests[series_id] = (protocol.SeriesBuffer(n_bars), future)
+        self._symbol_ids[symbol_id] = series_id
+
+        try:
+            await self._send(*protocol.resolve_symbol_message(
+                self.chart_session, symbol_id, symbol, extended_session))
+            await self._send(*protocol.create_series_message(
+                self.chart_session, series_id, symbol_id, interval, n_bars))
+            return await future
+        finally:
+            self._requests.pop(series_id, None)
+            self._symbol_ids.pop(symbol_id, None)
+            if not self.closed:
+                asyncio.get_running_loop().create_task(
+                    self._send_quietly("remove_series", [self.chart_session, series_id]))
+
+    async def _send(self, func, args):
+        await self._ws.send(protocol.create_message(func, args))
+
+    async def _send_quietly(self, func, args):
+        try:
+            await self._send(func, args)
+        except Exception as e:
+            logger.debug(e)
+
+    async def _read_loop(self):
+        decoder = protocol.FrameDecoder()
+        try:
+            while True:
+                for payload in decoder.feed(await self._ws.recv()):
+                    await self._dispatch(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not self.closed:
+                logger.warning(f"websocket connection lost: {e}")
+        finally:
+            self.closed = True
+            self._fail_all(ConnectionError("websocket connection lost"))
+
+    async def _dispatch(self, payload):
+        if protocol.is_heartbeat(payload):
+            await self._ws.send(protocol.prepend_header(payload))
+            return
+
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.debug(f"unable to decode frame {payload[:100]}")
+            return
+
+        func = message.get("m")
+        params = message.get("p", [])
+
+        if func == "timescale_update":
+            for series_id, update in params[1].items():
+                if (request := self._requests.get(series_id)) is not None:
+                    request[0].extend(update.get("s", []))
+
+        elif func == "series_completed":
+            self._finish(params[1])
+
+        elif func == "series_error":
+            self._finish(params[1], RuntimeError(str(params[2:])))
+
+        elif func == "symbol_error":
+            self._finish(self._symbol_ids.get(params[1]), RuntimeError(str(params[2:])))
+
+        elif func in ("critical_error", "protocol_error"):
+            logger.error(f"{func}: {params}")
+            self._fail_all(RuntimeError(str(params)))
+
+    def _finish(self, series_id, error=None):
+        if (request := self._requests.get(series_id)) is None:
+            return
+        bars, future = request
+        if future.done():
+            return
+        if error is None:
+            future.set_result(bars)
+        else:
+            future.set_exception(error)
+
+    def _fail_all(self, error):
+        for series_id in list(self._requests):
+            self._finish(series_id, error)
+
+
+class AsyncTvDatafeed(object):
+    """
+    Asyncio TradingView historic data client
+
+    Same Interval enum and DataFrame output as TvDatafeed, but
+    get_hist is a coroutine and many calls run concurrently from
+    one event loop. Requests are spread over at most
+    max_connections websockets, a new connection is only opened
+    when all existing ones are busy. A semaphore caps the number
+    of requests in flight and each request has its own timeout.
+
+    Requires the websockets package.
+
+    Parameters
+    ----------
+    username : str, optional
+        TradingView username (default None)
+    password : str, optional
+        TradingView password (default None)
+    max_connections : int, optional
+        max number of websockets, defaults to 4
+    max_concurrency : int, optional
+        max number of requests in flight, defaults to 64
+    timeout : float, optional
+        default per request timeout in seconds, defaults to 30
+    ws_url : str, optional
+        websocket url to connect to instead of TradingView, e.g. a
+        local TvReplayServer, defaults to None
+
+    Methods
+    -------
+    get_hist(symbol, exchange, interval, n_bars, fut_contract, extended_session, timeout)
+        Get historic ticker data
+    get_hist_many(symbols, exchange, interval, n_bars, extended_session, timeout)
+        Get historic ticker data for many symbols concurrently
+    close()
+        Close all websockets
+    """
+    __ws_url = "wss://data.tradingview.com/socket.io/websocket"
+    __ws_origin = "https://data.tradingview.com"
+
+    def __init__(self, username=None, password=None, max_connections=4,
+                 max_concurrency=64, timeout=30, ws_url=None):
+        if not WEBSOCKETS_AVAILABLE:
+            raise ImportError("AsyncTvDatafeed requires websockets, install with: pip install websockets")
+
+        if ws_url is not None:
+            self.__ws_url = ws_url
+
+        self.token = TvDatafeed.sign_in(username, password)
+        if self.token is None:
+            self.token = "unauthorized_user_token"
+            logger.warning(
+                "you are using nologin method, data you access may be limited"
+            )
+
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._connect_lock = asyncio.Lock()
+        self._connections = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _get_connection(self):
+        # least loaded open connection, opening a new one while all are busy
+        async with self._connect_lock:
+            self._connections = [conn for conn in self._connections if not conn.closed]
+            if len(self._connections) < self._max_connections \
+                    and all(conn.assigned for conn in self._connections):
+                conn = _AsyncConnection(self.token, self.__ws_url, self.__ws_origin)
+                await conn.open()
+                self._connections.append(conn)
+
+            conn = min(self._connections, key=lambda conn: conn.assigned)
+            conn.assigned += 1
+            return conn
+
+    async def get_hist(
+        self,
+        symbol,
+        exchange="NSE",
+        interval=Interval.in_daily,
+        n_bars=10,
+        fut_contract=None,
+        extended_session=False,
+        timeout=None,
+    ):
+        '''
+        Get historical data
+
+        Parameters
+        ----------
+        symbol : str
+            symbol name
+        exchange : str, optional
+            exchange, not required if symbol is in format
+            EXCHANGE:SYMBOL. Defaults to "NSE".
+        interval : tvDatafeed.Interval, optional
+            chart interval. Defaults to Interval.in_daily
+        n_bars : int, optional
+            no of bars to download, max 5000. Defaults to 10.
+        fut_contract : int, optional
+            None for cash, 1 for continuous current contract in front,
+            2 for continuous next contract in front. Defaults to None.
+        extended_session : bool, optional
+            regular session if False, extended session if True,
+            Defaults to False.
+        timeout : float, optional
+            max seconds to wait, defaults to the value given
+            to the constructor
+
+        Returns
+        -------
+        pd.Dataframe
+            dataframe with sohlcv as columns, None if no data
+            or timed out
+        '''
+        symbol = protocol.format_symbol(symbol, exchange, fut_contract)
+        timeout = self._timeout if timeout is None else timeout
+
+        async with self._semaphore:
+            conn = None
+            try:
+                conn = await self._get_connection()
+                bars = await asyncio.wait_for(
+                    conn.fetch(symbol, interval.value, n_bars, extended_session), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"no data for {symbol} in {timeout} seconds")
+                return None
+            except Exception as e:
+                logger.error(f"error getting data for {symbol}: {e}")
+                return None
+            finally:
+                if conn is not None:
+                    conn.assigned -= 1
+
+        data = protocol.bars_to_df(bars, symbol)
+        if data is None:
+            logger.error("no data, please check the exchange and symbol")
+        return data
+
+    async def get_hist_many(
+        self,
+        symbols,
+        exchange="NSE",
+        interval=Interval.in_daily,
+        n_bars=10,
+        extended_session=False,
+        timeout=None,
+    ):
+        '''
+        Get historical data for many symbols concurrently
+
+        Parameters
+        ----------
+        symbols : list
+            symbol names, either plain or in format EXCHANGE:SYMBOL
+        See get_hist() for the other parameters.
+
+        Returns
+        -------
+        dict
+            EXCHANGE:SYMBOL -> pd.Dataframe, symbols without data
+            are left out
+        '''
+        symbols = list(dict.fromkeys(
+            protocol.format_symbol(symbol, exchange) for symbol in symbols))
+        frames = await asyncio.gather(*[
+            self.get_hist(symbol, interval=interval, n_bars=n_bars,
+                          extended_session=extended_session, timeout=timeout)
+            for symbol in symbols])
+
+        return {symbol: data for symbol, data in zip(symbols, frames) if data is not None}
+
+    async def close(self):
+        '''
+        Close all websockets
+        '''
+        connections, self._connections = self._connections, []
+        for conn in connections:
+            await conn.close()
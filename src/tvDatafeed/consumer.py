@@ -1,4 +1,6 @@
-import threading, queue, traceback
+import threading, collections, time, logging
+
+logger = logging.getLogger(__name__)
 
 class Consumer(threading.Thread):
     '''
@@ -8,7 +10,19 @@ class Consumer(threading.Thread):
     which will be called when new data bar becomes available for
     that Seis. Data reception and calling callback function is 
     done in a separate thread which the user must start by calling
-    start() method.
+    start() method. If a dispatcher (ConsumerPool or AsyncDispatcher)
+    is given then no thread of its own is created, the callback is 
+    run by the shared dispatcher instead, one data item at a time 
+    so the order of data is kept.
+    
+    Data waiting for the callback is buffered according to the 
+    queue policy, so a stalled callback does not grow memory
+    without bound:
+    
+    - UNBOUNDED: keep everything (default)
+    - DROP_OLDEST: keep at most maxsize items, discard the oldest
+    - COALESCE: keep only the latest bar, discard older pending ones
+    - BLOCK: keep at most maxsize items, put() waits for free space
     
     Parameters
     ----------
@@ -17,6 +31,27 @@ class Consumer(threading.Thread):
     callback : func
         reference to a function to be called when new data available,
         function protoype must be func_name(seis, data)
+    policy : str, optional
+        queue policy, one of the class constants above (default
+        UNBOUNDED)
+    maxsize : int, optional
+        buffer size for DROP_OLDEST and BLOCK policies (default 100)
+    dispatcher : ConsumerPool or AsyncDispatcher, optional
+        shared dispatcher to run the callback on instead of a
+        dedicated thread (default None)
+    
+    Attributes
+    ----------
+    queued : int
+        number of data items accepted into buffer
+    dropped : int
+        number of data items discarded by the queue policy
+    processed : int
+        number of callback calls completed
+    latency_last : float
+        duration of the last callback call in seconds
+    latency_max : float
+        longest callback call in seconds
     
     Methods
     -------
@@ -28,14 +63,40 @@ class Consumer(threading.Thread):
         start data processing and callback thread
     stop()
         Stop the data processing and callback thread
+    stats()
+        Return queue and callback counters
     '''
-    def __init__(self, seis, callback):
+    UNBOUNDED="unbounded"
+    DROP_OLDEST="drop_oldest"
+    COALESCE="coalesce"
+    BLOCK="block"
+    
+    def __init__(self, seis, callback, policy=UNBOUNDED, maxsize=100, dispatcher=None):
         super().__init__()
-
-        self._buffer=queue.Queue()               
+        
+        if policy not in (self.UNBOUNDED, self.DROP_OLDEST, self.COALESCE, self.BLOCK):
+            raise ValueError(f"Unknown queue policy {policy}")
+        if policy in (self.DROP_OLDEST, self.BLOCK) and maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        
+        self._buffer=collections.deque()
+        self._cond=threading.Condition()
+        self._stopping=False
+        self._dispatcher=dispatcher
+        self._scheduled=False # dispatcher mode: consumer is queued on the dispatcher
+        self._closed=threading.Event()
+        self.policy=policy
+        self.maxsize=maxsize
         self.seis=seis
         self.callback=callback
         self.name=self.callback.__name__+"_"+self.seis.symbol+"_"+seis.exchange+"_"+seis.interval.value
+        
+        self.queued=0
+        self.dropped=0
+        self.processed=0
+        self.latency_last=0.0
+        self.latency_max=0.0
+        self._latency_total=0.0
     
     def __repr__(self):
         return f'Consumer({repr(self.seis)},{self.callback.__name__})'
@@ -46,33 +107,143 @@ class Consumer(threading.Thread):
     def run(self):
         # callback thread tasks
         while True:
-            data=self._buffer.get()
-            if data is None:
-                break
+            with self._cond:
+                while not self._buffer and not self._stopping:
+                    self._cond.wait()
+                if not self._buffer: # stopping and everything queued before stop() processed
+                    break
+                data=self._buffer.popleft()
+                self._cond.notify_all() # wake up a producer blocked on full buffer
 
             try: # in case user provided function throws an exception
+                started=time.perf_counter()
                 self.callback(self.seis, data)
             except Exception as e: # remove the consumer from Seis and close down gracefully
-                self.del_consumer()
-                self.seis=None # delete references
-                self.callback=None
-                self._buffer=None
+                self._fail()
                 raise e from None
+            
+            self._record(time.perf_counter()-started)
+        
+        self._close()
+    
+    def start(self):
+        '''
+        Start data processing and callback thread
         
+        Does nothing when a dispatcher is used, the dispatcher runs
+        the callback as soon as data is put.
+        '''
+        if self._dispatcher is None:
+            super().start()
+    
+    def join(self, timeout=None):
+        '''
+        Wait until the consumer has been stopped and all its data
+        processed
+        '''
+        if self._dispatcher is None:
+            super().join(timeout)
+        else:
+            self._closed.wait(timeout)
+    
+    def _next(self):
+        # Dispatcher mode: take next data item to process
+        #
+        # Returns (True, data) or (False, None) if the buffer is empty,
+        # in which case the consumer is no longer scheduled and, if it 
+        # was stopped, references are deleted.
+        with self._cond:
+            if not self._buffer:
+                self._scheduled=False
+                if self._stopping:
+                    self._close()
+                return False, None
+            data=self._buffer.popleft()
+            self._cond.notify_all() # wake up a producer blocked on full buffer
+        
+        return True, data
+    
+    def _schedule(self):
+        # Dispatcher mode: hand the consumer to the dispatcher unless
+        # already queued there, caller holds self._cond
+        if self._dispatcher is not None and not self._scheduled:
+            self._scheduled=True
+            self._dispatcher.schedule(self)
+    
+    def _fail(self):
+        # callback raised an exception, remove the consumer from Seis 
+        self.del_consumer()
+        with self._cond:
+            self._buffer.clear()
+        self._close()
+    
+    def _close(self):
         self.seis=None # delete references
         self.callback=None
-        self._buffer=None
+        self._closed.set()
+    
+    def _record(self, latency):
+        # update callback counters
+        self.processed+=1
+        self.latency_last=latency
+        self.latency_max=max(self.latency_max, latency)
+        self._latency_total+=latency
     
     def put(self, data):
         '''
         Put new data into buffer to be processed
         
+        Depending on the queue policy older data may be discarded
+        or, with BLOCK policy, this call waits until the callback
+        thread has made room. Data put after stop() is ignored.
+        
         Parameters
         ----------
         data : pandas.DataFrame
-            contains single bar data retrieved from TradingView
+            contains single bar data retrieved from TradingView,
+            None stops the callback thread
+        '''
+        if data is None:
+            self.stop()
+            return
+        
+        with self._cond:
+            if self._stopping:
+                return
+            
+            if self.policy == self.COALESCE:
+                self.dropped+=len(self._buffer)
+                self._buffer.clear()
+            elif self.policy == self.DROP_OLDEST and len(self._buffer) >= self.maxsize:
+                self._buffer.popleft()
+                self.dropped+=1
+            elif self.policy == self.BLOCK:
+                while len(self._buffer) >= self.maxsize and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            
+            self._buffer.append(data)
+            self.queued+=1
+            self._cond.notify_all()
+            self._schedule()
+    
+    def stats(self):
+        '''
+        Return queue and callback counters
+        
+        Returns
+        -------
+        dict
+            queued, dropped, processed and pending item counts,
+            last, max and mean callback latency in seconds
         '''
-        self._buffer.put(data)
+        with self._cond:
+            pending=len(self._buffer)
+        
+        return {"queued": self.queued, "dropped": self.dropped, "processed": self.processed,
+                "pending": pending, "latency_last": self.latency_last, "latency_max": self.latency_max,
+                "latency_mean": self._latency_total/self.processed if self.processed else 0.0}
     
     def del_consumer(self, timeout=-1):
         '''
@@ -94,6 +265,11 @@ class Consumer(threading.Thread):
     def stop(self):
         '''
         Stop the data processing and callback thread
+        
+        Data already in buffer is still processed.
         '''
-        self._buffer.put(None)
+        with self._cond:
+            self._stopping=True
+            self._cond.notify_all()
+            self._schedule() # let the dispatcher close it down
         
\ No newline at end of file
@@ -1,11 +1,13 @@
-import threading, queue, time, logging
+import threading, queue, time, logging, functools, heapq, inspect
 import tvDatafeed 
 from datetime import datetime as dt
 from dateutil.relativedelta import relativedelta as rd
 
 logger = logging.getLogger(__name__)
 
-RETRY_LIMIT=50 # max number of retries to get valid data from tvDatafeed; TODO: think about creating a conf file for such parameters
+RETRY_TIMEOUT=5 # max seconds one retrieval attempt of an interval group waits for all its symbols
+RETRY_BUDGET=0.5 # max share of the interval spent re-trying an interval group before giving up
+RETRY_BUDGET_MAX=300 # max seconds spent re-trying an interval group, caps the budget of long intervals
 
 class TvDatafeedLive(tvDatafeed.TvDatafeed):
     """                 
@@ -26,14 +28,30 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         TradingView username (default None)
     password : str, optional
         TradingView password (default None)
+    streaming : bool, optional
+        keep every Seis subscribed on one websocket and push bars to
+        consumers as soon as the server reports them closed, instead
+        of polling at each interval expiry (default False)
+    consumer_workers : int, optional
+        number of threads in the shared pool running callbacks of
+        consumers created with dispatch="pool" (default 4)
+    symbol_cache : SymbolCache or str, optional
+        cache of symbol search results used to validate new Seises,
+        or path of the JSON file to keep one in. In memory cache is
+        used if None (default None)
+    ws_url : str, optional
+        websocket url to connect to instead of TradingView, e.g. a
+        local TvReplayServer (default None)
     
     Methods
     -------
     new_seis(symbol, exchange, interval, timeout)
         Create and add new Seis to live feed
+    new_seis_many(seises, timeout)
+        Create and add many new Seises to live feed at once
     del_seis(seis, timeout)
         Remove Seis from live feed
-    new_consumer(seis, callback, timeout)
+    new_consumer(seis, callback, timeout, policy, maxsize, dispatch)
         Create a new consumer for Seis with provided callback
     del_consumer(consumer, timeout)
         Remove the consumer from Seis consumers list
@@ -41,17 +59,32 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         Get historic ticker data
     del_tvdatafeed
         Stop and delete this object
+    
+    Attributes
+    ----------
+    cycle_stats : dict
+        per interval group stats of the last refresh: datetime when
+        delivered, seconds taken, number of Seises and retries
     """
     
     class _SeisesAndTrigger(dict):
         # Internal class to contain an array of Seis objects
         # and to manage/track their interval update times
+        #
+        # Interval groups are stored as interval -> [{key: Seis}, expiry dt],
+        # with key being (symbol, exchange, interval value). An index dict
+        # over all keys makes lookups and membership O(1) and a min-heap of
+        # (expiry dt, interval) gives the next trigger in O(log n). Heap
+        # entries are not removed when a group expires or is deleted, they
+        # are skipped as stale once they no longer match the group expiry.
         def __init__(self):
             super().__init__()
             
             self._trigger_quit=False
             self._trigger_dt=None
             self._trigger_interrupt=threading.Event()
+            self._index={} # (symbol, exchange, interval value) -> Seis
+            self._heap=[] # (expiry dt, interval value), may contain stale entries
             
             # time periods available in TradingView 
             self._timeframes={"1":rd(minutes=1), "3":rd(minutes=3), "5":rd(minutes=5), \
@@ -59,28 +92,30 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
                              "1H":rd(hours=1), "2H":rd(hours=2), "3H":rd(hours=3), "4H":rd(hours=4), \
                              "1D":rd(days=1), "1W":rd(weeks=1), "1M":rd(months=1)}
         
+        @staticmethod
+        def _key(seis):
+            return (seis.symbol, seis.exchange, seis.interval.value)
+        
+        def _is_stale(self, entry):
+            # heap entry no longer matches the expiry of an existing group
+            expiry_dt, interval=entry
+            return interval not in self.keys() or super().__getitem__(interval)[1] != expiry_dt
+        
         def _next_trigger_dt(self):
             # Get the next closest expiry datetime
-            if not self.values(): # if Seis list is empty
-                return None
+            while self._heap and self._is_stale(self._heap[0]): # drop entries of expired or removed groups
+                heapq.heappop(self._heap)
             
-            interval_dt_list=[]
-            for values in self.values():
-                interval_dt_list.append(values[1])
+            if not self._heap: # if Seis list is empty
+                return None
             
-            interval_dt_list.sort()
-
-            return interval_dt_list[0]
+            return self._heap[0][0]
 
         def get_seis(self, symbol, exchange, interval):
             # Returns Seis object listed in SAT based on
             # symbol, exchange and interval. If not listed then 
             # None is returned
-            for seis in self:
-                if seis.symbol==symbol and seis.exchange==exchange and seis.interval==interval:
-                    return seis
-            
-            return None
+            return self._index.get((symbol, exchange, interval.value))
             
         def wait(self):
             # Wait until next interval(s) expire
@@ -105,10 +140,17 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         def get_expired(self):
             # return expired intervals in a list, update expiry values
             expired_intervals=[]
-            for interval, values in self.items():
-                if dt.now() >= values[1]:
-                    expired_intervals.append(interval)
-                    values[1]= values[1] + self._timeframes[interval] # add interval to get new expiry dt in future
+            now=dt.now()
+            while self._heap and self._heap[0][0] <= now:
+                entry=heapq.heappop(self._heap)
+                if self._is_stale(entry):
+                    continue
+                
+                interval=entry[1]
+                values=super().__getitem__(interval)
+                expired_intervals.append(interval)
+                values[1]= values[1] + self._timeframes[interval] # add interval to get new expiry dt in future
+                heapq.heappush(self._heap, (values[1], interval))
             
             return expired_intervals
         
@@ -126,15 +168,19 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
             if self: # if empty then reset flags
                 self._trigger_quit=False
                 self._trigger_interrupt.clear()
-                
+            
+            key=self._key(seis)
             if seis.interval.value in self.keys(): # interval group already exists
-                super().__getitem__(seis.interval.value)[0].append(seis)
+                super().__getitem__(seis.interval.value)[0][key]=seis
+                self._index[key]=seis
             else: # new interval group needs to be created
                 if update_dt is None:
                     raise ValueError("Missing update datetime for new interval group")
                 else:
                     update_dt= update_dt + self._timeframes[seis.interval.value] # change the time to next update datetime (result will be datetime object)
-                    self.__setitem__(seis.interval.value, [[seis], update_dt]) 
+                    self.__setitem__(seis.interval.value, [{key: seis}, update_dt]) 
+                    self._index[key]=seis
+                    heapq.heappush(self._heap, (update_dt, seis.interval.value))
                     
                     if (trigger_dt := self._next_trigger_dt()) != self._trigger_dt: # if new interval group expiry is sooner than current expiry being waited on
                         self._trigger_dt=trigger_dt
@@ -145,9 +191,11 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
             if seis not in self:
                 raise KeyError("No such Seis in the list")
             else:
-                super().__getitem__(seis.interval.value)[0].remove(seis)
+                key=self._key(seis)
+                del self._index[key]
+                del super().__getitem__(seis.interval.value)[0][key]
                 if not super().__getitem__(seis.interval.value)[0]: # if interval group now empty then remove it
-                    self.pop(seis.interval.value)    
+                    self.pop(seis.interval.value) # its heap entry becomes stale
                     
                     if ((trigger_dt := self._next_trigger_dt()) != self._trigger_dt) and (self._trigger_quit is False): # if interval group expiry dt was being waited on and havent quit
                         self._trigger_dt=trigger_dt
@@ -158,45 +206,72 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
             return self.keys()
         
         def __getitem__(self, interval_key):
-            return super().__getitem__(interval_key)[0]
+            return list(super().__getitem__(interval_key)[0].values())
         
         def __iter__(self):
-            seises_list=[]
-            
-            for seis_list in super().values():
-                seises_list+=seis_list[0]
-            
-            return seises_list.__iter__()
+            return list(self._index.values()).__iter__() # copy, callers discard while iterating
         
         def __contains__(self, seis):
-            for seis_list in super().values():
-                if seis in seis_list[0]:
-                    return True
-            
-            return False
+            return self._index.get(self._key(seis)) == seis
     
-    def __init__(self, username=None, password=None):
-        super().__init__(username, password)
+    def __init__(self, username=None, password=None, streaming=False, consumer_workers=4, symbol_cache=None, ws_url=None):
+        super().__init__(username, password, persistent=streaming, ws_url=ws_url)
         
         self._lock=threading.Lock()
         self._main_thread = None  
         self._sat = self._SeisesAndTrigger() 
+        self._streaming=streaming
+        self._subscriptions={} # (symbol, exchange, interval value) -> session subscription, streaming mode only
+        self.cycle_stats={} # interval value -> stats of the last refresh of that interval group
+        self._consumer_workers=consumer_workers
+        self._dispatchers={} # dispatch mode -> shared ConsumerPool or AsyncDispatcher, created on first use
+        
+        if not isinstance(symbol_cache, tvDatafeed.SymbolCache):
+            symbol_cache=tvDatafeed.SymbolCache(symbol_cache)
+        self.symbol_cache=symbol_cache
     
     def _args_invalid(self, symbol, exchange):
         # check if provided arguemnts are valid and that such
-        # symbol, exchange and interval set exists in TradingView
+        # symbol, exchange and interval set exists in TradingView,
+        # symbol search results are kept in the symbol cache
         # 
         # returns True if does not exist, False otherwise
-        result_list=self.search_symbol(symbol, exchange)
+        return self.symbol_cache.lookup(self, symbol, exchange) is None
+    
+    def _add_seis(self, new_seis):
+        # Add Seis into SAT, caller must hold the lock
+        #
+        # In streaming mode the Seis is subscribed on the session,
+        # otherwise if its interval group does not exist yet then the
+        # last bar update datetime is retrieved to create the group.
+        # Returns the listed Seis, which is the existing one if such
+        # Seis was already listed.
+        if listed := self._sat.get_seis(new_seis.symbol, new_seis.exchange, new_seis.interval):
+            return listed
         
-        if not result_list: # if does not exists then empty
-            return True
+        new_seis.tvdatafeed=self
         
-        for item in result_list:
-            if item['symbol']==symbol and item['exchange']==exchange:
-                return False
+        # add to interval group - if interval group does not exists then create one
+        interval_key=new_seis.interval.value
+        if self._streaming: # bars are pushed by the server, no polling trigger needed
+            self._sat.append(new_seis, None if interval_key in self._sat.intervals() else dt.now())
+            self._subscriptions[(new_seis.symbol, new_seis.exchange, interval_key)]=self._tv_session.subscribe(
+                f"{new_seis.exchange}:{new_seis.symbol}", interval_key, functools.partial(self._push_streamed, new_seis))
+        elif interval_key not in self._sat.intervals():
+            # get last bar update datetime value for the Seis
+            ticker_data=super().get_hist(new_seis.symbol, new_seis.exchange, new_seis.interval, n_bars=2) # get ticker data bar for this symbol from TradingView
+            update_dt=ticker_data.index.to_pydatetime()[0] # extract datetime of when this bar was produced/released
+            # append this seis into SAT
+            self._sat.append(new_seis, update_dt)
+        else:
+            self._sat.append(new_seis)
         
-        return True
+        return new_seis
+    
+    def _start_main_loop(self):
+        if self._main_thread is None and not self._streaming: # if main thread is not running then start 
+            self._main_thread = threading.Thread(name="main_loop", target=self._main_loop)
+            self._main_thread.start() 
     
     def new_seis(self, symbol, exchange, interval, timeout=-1): 
         '''
@@ -241,35 +316,65 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         if seis := self._sat.get_seis(symbol, exchange, interval): # if Seis with such parameters already exists then simply return that
             return seis
         
-        new_seis=tvDatafeed.Seis(symbol, exchange, interval)
-        
         if self._lock.acquire(timeout=timeout) is False:
             return False
         
-        new_seis.tvdatafeed=self
+        try:
+            seis=self._add_seis(tvDatafeed.Seis(symbol, exchange, interval))
+        finally:
+            self._lock.release()
         
-        # if this seis is already in list 
-        if new_seis in self._sat:
-            return self._sat.get_seis(symbol, exchange, interval)
+        self._start_main_loop()
         
-        # add to interval group - if interval group does not exists then create one
-        interval_key=new_seis.interval.value
-        if interval_key not in self._sat.intervals():
-            # get last bar update datetime value for the Seis
-            ticker_data=super().get_hist(new_seis.symbol, new_seis.exchange, new_seis.interval, n_bars=2) # get ticker data bar for this symbol from TradingView
-            update_dt=ticker_data.index.to_pydatetime()[0] # extract datetime of when this bar was produced/released
-            # append this seis into SAT
-            self._sat.append(new_seis, update_dt)
-        else:
-            self._sat.append(new_seis)
+        return seis
+    
+    def new_seis_many(self, seises, timeout=-1):
+        '''
+        Create and add many new Seises to live feed at once
         
-        self._lock.release()
+        All symbol and exchange combinations missing from the 
+        symbol cache are validated with concurrent searches, then 
+        every Seis is added under a single lock acquisition. Only
+        one bar request is made per new interval group.
         
-        if self._main_thread is None: # if main thread is not running then start 
-            self._main_thread = threading.Thread(name="main_loop", target=self._main_loop)
-            self._main_thread.start() 
+        Parameters
+        ----------
+        seises : list
+            (symbol, exchange, interval) tuples
+        timeout : int, optional
+            maximum time to wait in seconds for return, default
+            is -1 (blocking)
         
-        return new_seis
+        Returns
+        ----------
+        list
+            Seis for each provided tuple, in the same order. Already
+            listed Seises are returned as is. If timeout was 
+            specified and expired then False will be returned.
+        
+        Raises
+        ----------
+        ValueError
+            If any of provided symbol and exchange combinations
+            is not listed on TradingView, no Seis is added then
+        '''
+        self.symbol_cache.warm(self, [(symbol, exchange) for symbol, exchange, _ in seises])
+        
+        invalid=[f"{exchange}:{symbol}" for symbol, exchange, _ in seises if self._args_invalid(symbol, exchange)]
+        if invalid:
+            raise ValueError(f"Provided symbol and exchange combinations are not listed in TradingView: {', '.join(invalid)}")
+        
+        if self._lock.acquire(timeout=timeout) is False:
+            return False
+        
+        try:
+            added=[self._add_seis(tvDatafeed.Seis(symbol, exchange, interval)) for symbol, exchange, interval in seises]
+        finally:
+            self._lock.release()
+        
+        self._start_main_loop()
+        
+        return added
         
     def del_seis(self, seis, timeout=-1):
         '''
@@ -298,23 +403,28 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         
         if self._lock.acquire(timeout=timeout) is False:
             return False
-        # close all the callback threads for this Seis
-        for consumer in seis.get_consumers():
-            consumer.put(None) # None signals closing for the callback thread
+        consumers=list(seis.get_consumers())
                 
         # remove Seis from MAR list
         self._sat.discard(seis)
         del seis.tvdatafeed
         
+        if self._streaming:
+            self._tv_session.unsubscribe(self._subscriptions.pop((seis.symbol, seis.exchange, seis.interval.value)))
+        
         # if SAT list empty now then close down main loop
         if not self._sat:
             self._sat.quit()
         
         self._lock.release()
         
+        # close all the callback threads for this Seis, outside the lock
+        for consumer in consumers:
+            consumer.put(None) # None signals closing for the callback thread
+        
         return True
     
-    def new_consumer(self, seis, callback, timeout=-1):
+    def new_consumer(self, seis, callback, timeout=-1, policy="unbounded", maxsize=100, dispatch="thread"):
         '''
         Create a new Consumer for this Seis with provided callback
         
@@ -327,6 +437,16 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         timeout : int, optional
             maximum time to wait in seconds for return, default
             is -1 (blocking)
+        policy : str, optional
+            queue policy of the Consumer buffer, see Consumer 
+            (default "unbounded")
+        maxsize : int, optional
+            buffer size for bounded queue policies (default 100)
+        dispatch : str, optional
+            "thread" to run the callback in a thread of its own,
+            "pool" to run it on the shared worker pool or "async" to
+            await it on the shared event loop. async def callbacks 
+            always use "async" (default "thread")
         
         Returns
         ----------
@@ -339,20 +459,43 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         ----------
         ValueError
             If Seis does not exist in live feed (has not been added)
+            or if "block" policy is used in streaming mode
         '''
         if seis not in self._sat:
             raise ValueError("Seis is not listed")
         
-        # new consumer to hold callback related info
-        consumer=tvDatafeed.Consumer(seis, callback)
+        if self._streaming and policy == tvDatafeed.Consumer.BLOCK:
+            # data is pushed from the session reader thread, which must never wait for a callback
+            raise ValueError("block policy is not supported in streaming mode")
+        
+        if inspect.iscoroutinefunction(callback):
+            dispatch="async"
+        elif dispatch not in ("thread", "pool", "async"):
+            raise ValueError(f"Unknown dispatch mode {dispatch}")
+        
         if self._lock.acquire(timeout=timeout) is False:
             return False
+        # new consumer to hold callback related info
+        consumer=tvDatafeed.Consumer(seis, callback, policy, maxsize, self._get_dispatcher(dispatch))
         seis.add_consumer(consumer)     
         consumer.start()  
         self._lock.release()
         
         return consumer 
     
+    def _get_dispatcher(self, dispatch):
+        # Return shared dispatcher for the dispatch mode, None for "thread"
+        if dispatch == "thread":
+            return None
+        
+        if dispatch not in self._dispatchers:
+            if dispatch == "pool":
+                self._dispatchers[dispatch]=tvDatafeed.ConsumerPool(self._consumer_workers)
+            else:
+                self._dispatchers[dispatch]=tvDatafeed.AsyncDispatcher()
+        
+        return self._dispatchers[dispatch]
+    
     def del_consumer(self, consumer, timeout=-1): 
         '''
         Remove the consumer from Seis consumers list
@@ -389,38 +532,62 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         # case first all the consumer threads are closed and then this 
         # main thread is closed. Once wait() method returns then we
         # get a list of intervals which were under monitor and have 
-        # expired. We loop through every Seis which has that 
-        # interval and retrieve new data and push it into all the 
-        # consumer threads that are added for that particular Seis.
+        # expired. All the Seises of an expired interval group are 
+        # fetched together over a single websocket (get_hist_many) and 
+        # new data is pushed into all the consumer threads that are 
+        # added for that particular Seis. The lock is only held for 
+        # the SAT bookkeeping, not while waiting for data, so new_seis,
+        # del_seis and get_hist callers are not blocked by a refresh.
         #
-        # If fail to retrieve data then retry up to RETRY_LIMIT times 
-        # and if still fail then log the event (critical) and close
-        # down the consumer threads and the main loop itself.
+        # Seises which did not yet have a new bar are re-tried, each 
+        # attempt waiting at most RETRY_TIMEOUT seconds for the group, for
+        # up to RETRY_BUDGET of the interval (at most RETRY_BUDGET_MAX
+        # seconds) and if still fail then log the event (critical) and
+        # close down the consumer threads and the main loop itself. Time taken to deliver each interval group is 
+        # recorded in cycle_stats.
         
         while self._sat.wait(): # waits until soonest expiry and returns True; returns False if closed                     
             with self._lock:
-                for interval in self._sat.get_expired(): # returns a list of intervals that have expired
-                    for seis in self._sat[interval]: # go through all the seises in this interval group 
-                        for _ in range(0, RETRY_LIMIT): # re-try maximum of RETRY_LIMIT times
-                            data=super().get_hist(seis.symbol, seis.exchange, interval=seis.interval, n_bars=2) # get_hist returns bars starting with currently open so need to read 2 to get first closed
-                            if data is not None: # check that we did get any data
-                                if seis.is_new_data(data): # check that it is new data not old 
-                                    data=data.drop(labels=data.index[1]) # drop the row (last) which has yet un-closed bar data 
-                                    break
-                            
-                            time.sleep(0.1) # little time before retrying
-                        else: # limit reached, print an error into logs and gracefully shut down the main loop and consumer threads
-                            self._sat.quit()
-                            logger.critical("Failed to retrieve new data from TradingView")
-                        
-                        # push new data into all consumers that are expecting data for this Seis
-                        for consumer in seis.get_consumers():
-                            consumer.put(data)
+                expired={interval: list(self._sat[interval]) for interval in self._sat.get_expired()} # returns a list of intervals that have expired
+            
+            for interval, seises in expired.items():
+                started=time.monotonic()
+                pending={f"{seis.exchange}:{seis.symbol}": seis for seis in seises}
+                
+                now=dt.now()
+                budget=min(RETRY_BUDGET*((now+self._sat._timeframes[interval])-now).total_seconds(), RETRY_BUDGET_MAX)
+                deadline=started+budget
+                retries=0
+                while True:
+                    timeout=max(min(RETRY_TIMEOUT, deadline-time.monotonic()), 0.1) # an unresponsive symbol must not hold up the other interval groups
+                    results=super().get_hist_many(list(pending), interval=seises[0].interval, n_bars=2, timeout=timeout) # get_hist returns bars starting with currently open so need to read 2 to get first closed
+                    for symbol, data in results.items():
+                        seis=pending[symbol]
+                        if seis.is_new_data(data): # check that it is new data not old 
+                            data=data.drop(labels=data.index[1]) # drop the row (last) which has yet un-closed bar data 
+                            data=seis.update_indicators(data) # add values of indicators attached to this Seis
+                            del pending[symbol]
+                            self._push(seis, data)
+                    
+                    if not pending: # every Seis in this group got new data
+                        break
+                    
+                    if time.monotonic() >= deadline: # budget used up, print an error into logs and gracefully shut down the main loop and consumer threads
+                        self._sat.quit()
+                        logger.critical(f"Failed to retrieve new data from TradingView in {budget:.0f}s")
+                        break
+                    
+                    retries+=1
+                    time.sleep(0.1) # little time before retrying
+                
+                self.cycle_stats[interval]={"delivered_at": dt.now(), "seconds": time.monotonic()-started, 
+                                            "seises": len(seises), "retries": retries}
+                logger.debug(f"interval {interval}: delivered {len(seises)-len(pending)}/{len(seises)} Seises in {self.cycle_stats[interval]['seconds']:.3f}s")
         
         # send a shutdown signal to all the callback threads
         with self._lock:
             for seis in self._sat:
-                for consumer in seis.get_consumers():
+                for consumer in list(seis.get_consumers()):
                     seis.pop_consumer(consumer)
                     consumer.stop()
                 
@@ -428,6 +595,47 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
                 
             self._main_thread = None
     
+    def _push(self, seis, data):
+        # push new data into all consumers that are expecting data for this Seis,
+        # unless it was removed while its data was being retrieved
+        #
+        # put() is called without the lock held, a BLOCK consumer waits
+        # there for its callback which may itself need the lock (failing
+        # callbacks remove their consumer, callbacks may call get_hist)
+        with self._lock:
+            if seis not in self._sat:
+                return
+            consumers=list(seis.get_consumers())
+        
+        for consumer in consumers:
+            consumer.put(data)
+    
+    def _push_streamed(self, seis, bars):
+        # Streaming mode callback, runs on the session reader thread
+        #
+        # Called with the bar that the server has just reported closed.
+        # The lock is not taken here as get_hist may be holding it while
+        # waiting for this very thread to deliver its data.
+        data=bars.to_df(f"{seis.exchange}:{seis.symbol}")
+        if seis.is_new_data(data):
+            data=seis.update_indicators(data)
+            for consumer in list(seis.get_consumers()):
+                consumer.put(data)
+    
+    def _stop_streaming(self):
+        # Close the streaming session and shut down all the consumer threads
+        self._tv_session.close()
+        
+        with self._lock:
+            for seis in self._sat:
+                for consumer in list(seis.get_consumers()):
+                    seis.pop_consumer(consumer)
+                    consumer.stop()
+                
+                self._sat.discard(seis)
+                
+            self._subscriptions.clear()
+    
     def get_hist(self,  
         symbol: str,
         exchange: str = "NSE",
@@ -472,17 +680,27 @@ class TvDatafeedLive(tvDatafeed.TvDatafeed):
         return data
        
     def __del__(self):
+        if self._streaming:
+            self._stop_streaming()
+        
         with self._lock:
             self._sat.quit() #shutdown the main_loop
         
         # wait until all threads are closed down - they are closed in the main_loop
         if self._main_thread is not None:
             self._main_thread.join() 
+        
+        # consumers are stopped by now, shut down the shared dispatchers
+        dispatchers, self._dispatchers=self._dispatchers, {}
+        for dispatcher in dispatchers.values():
+            dispatcher.shutdown()
     
     def del_tvdatafeed(self): 
         '''
         Stop and delete this object
         '''
-        if self._main_thread is not None:
-            self.__del__()  
+        if self._main_thread is not None or self._streaming or self._dispatchers:
+            self.__del__()
+        
+        self.symbol_cache.close() # symbol searches are only kept in memory until then  
         
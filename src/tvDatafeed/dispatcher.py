@@ -0,0 +1,122 @@
+import threading, queue, asyncio, time, logging
+
+logger = logging.getLogger(__name__)
+
+class ConsumerPool(object):
+    '''
+    Fixed size thread pool running Consumer callbacks
+
+    Consumers created with this pool as their dispatcher do not
+    get a thread of their own. A consumer with buffered data is
+    queued on the pool once, a worker runs its callback for one
+    data item and queues it again if more data is waiting. So a
+    consumer is never run by two workers at the same time and its
+    data is processed in order, while the thread count stays the
+    same however many consumers are registered.
+
+    Parameters
+    ----------
+    workers : int, optional
+        number of worker threads (default 4)
+
+    Methods
+    -------
+    schedule(consumer)
+        Queue consumer to have its next data item processed
+    shutdown()
+        Stop the worker threads
+    '''
+    def __init__(self, workers=4):
+        self._ready=queue.SimpleQueue()
+        self._threads=[threading.Thread(name=f"consumer_pool_{n}", target=self._work, daemon=True)
+                       for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def schedule(self, consumer):
+        '''
+        Queue consumer to have its next data item processed
+        '''
+        self._ready.put(consumer)
+
+    def _work(self):
+        # worker thread, None signals closing
+        while (consumer := self._ready.get()) is not None:
+            has_data, data=consumer._next()
+            if not has_data:
+                continue
+
+            callback=consumer.callback
+            try: # in case user provided function throws an exception
+                started=time.perf_counter()
+                callback(consumer.seis, data)
+            except Exception: # remove the consumer from Seis, keep the worker running
+                logger.exception(f"callback {callback.__name__} failed, removing consumer")
+                consumer._fail()
+            else:
+                consumer._record(time.perf_counter()-started)
+
+            self._ready.put(consumer) # process next item, or unschedule if none
+
+    def shutdown(self):
+        '''
+        Stop the worker threads
+        '''
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+class AsyncDispatcher(object):
+    '''
+    Event loop running async def Consumer callbacks
+
+    Runs an asyncio event loop in one background thread. A consumer
+    with buffered data gets a task which awaits its callback for
+    each data item in order, so any number of async consumers
+    share a single thread.
+
+    Methods
+    -------
+    schedule(consumer)
+        Start processing buffered data of the consumer
+    shutdown()
+        Stop the event loop and its thread
+    '''
+    def __init__(self):
+        self._loop=asyncio.new_event_loop()
+        self._thread=threading.Thread(name="consumer_loop", target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def schedule(self, consumer):
+        '''
+        Start processing buffered data of the consumer
+        '''
+        asyncio.run_coroutine_threadsafe(self._drain(consumer), self._loop)
+
+    @staticmethod
+    async def _drain(consumer):
+        while True:
+            has_data, data=consumer._next()
+            if not has_data:
+                return
+
+            callback=consumer.callback
+            try: # in case user provided function throws an exception
+                started=time.perf_counter()
+                await callback(consumer.seis, data)
+            except Exception: # remove the consumer from Seis, keep the loop running
+                logger.exception(f"callback {callback.__name__} failed, removing consumer")
+                consumer._fail()
+            else:
+                consumer._record(time.perf_counter()-started)
+
+    def shutdown(self):
+        '''
+        Stop the event loop and its thread
+        '''
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+            self._loop.close()
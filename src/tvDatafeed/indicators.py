@@ -0,0 +1,250 @@
+import collections, math
+
+class StreamingIndicator(object):
+    '''
+    Base class of streaming indicators
+
+    A streaming indicator keeps only the state it needs to update
+    its value in constant time when a new closed bar arrives, so
+    nothing is recomputed from history. Value is NaN until enough
+    bars have been seen.
+
+    Parameters
+    ----------
+    source : str, optional
+        bar field used as input by single input indicators
+        (default "close")
+
+    Attributes
+    ----------
+    value : float
+        indicator value after the last update
+
+    Methods
+    -------
+    update(bar)
+        Update indicator with a new closed bar
+    '''
+    def __init__(self, source="close"):
+        self.source=source
+        self.value=math.nan
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(value={self.value})'
+
+    @staticmethod
+    def _check_period(period):
+        if period < 1:
+            raise ValueError("period must be at least 1")
+        return period
+
+    def update(self, bar):
+        '''
+        Update indicator with a new closed bar
+
+        Parameters
+        ----------
+        bar : dict
+            bar values with open, high, low, close and volume keys
+
+        Returns
+        -------
+        float
+            updated indicator value
+        '''
+        self.value=self._next(float(bar[self.source]))
+        return self.value
+
+    def _next(self, x):
+        raise NotImplementedError
+
+class RollingMean(StreamingIndicator):
+    '''
+    Simple moving average over a ring buffer
+
+    The running sum is recalculated from the buffer once per
+    window length of updates, so floating point error does not
+    accumulate while the cost per bar stays constant.
+
+    Parameters
+    ----------
+    window : int
+        number of bars in the average
+    source : str, optional
+        bar field to average (default "close")
+    '''
+    def __init__(self, window, source="close"):
+        super().__init__(source)
+        self.window=self._check_period(window)
+        self._buffer=collections.deque(maxlen=window)
+        self._sum=0.0
+        self._updates=0 # updates since the sum was recalculated
+
+    def _next(self, x):
+        if len(self._buffer) == self.window:
+            self._sum-=self._buffer[0]
+        self._buffer.append(x)
+        self._sum+=x
+
+        self._updates+=1
+        if self._updates >= self.window:
+            self._sum=math.fsum(self._buffer)
+            self._updates=0
+
+        return self._sum/self.window if len(self._buffer) == self.window else math.nan
+
+class RollingVariance(StreamingIndicator):
+    '''
+    Moving variance over a ring buffer
+
+    Uses Welford's update for adding a bar and replacing the oldest
+    one, which is numerically stable unlike sums of squares.
+
+    Parameters
+    ----------
+    window : int
+        number of bars in the variance
+    ddof : int, optional
+        delta degrees of freedom, 0 for population variance
+        (default 0)
+    source : str, optional
+        bar field to use (default "close")
+
+    Attributes
+    ----------
+    mean : float
+        moving average of the same window
+    std : float
+        square root of value
+    '''
+    def __init__(self, window, ddof=0, source="close"):
+        super().__init__(source)
+        self.window=self._check_period(window)
+        self.ddof=ddof
+        self._buffer=collections.deque(maxlen=window)
+        self._mean=0.0
+        self._m2=0.0 # sum of squared deviations from mean
+
+    @property
+    def mean(self):
+        return self._mean if len(self._buffer) == self.window else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.value)
+
+    def _next(self, x):
+        if len(self._buffer) < self.window: # filling up, plain Welford
+            self._buffer.append(x)
+            delta=x-self._mean
+            self._mean+=delta/len(self._buffer)
+            self._m2+=delta*(x-self._mean)
+        else: # replace oldest value
+            old=self._buffer[0]
+            self._buffer.append(x)
+            mean=self._mean+(x-old)/self.window
+            self._m2+=(x-old)*(x-mean+old-self._mean)
+            self._mean=mean
+
+        if len(self._buffer) < self.window or self.window-self.ddof <= 0:
+            return math.nan
+        return max(self._m2, 0.0)/(self.window-self.ddof)
+
+class EMA(StreamingIndicator):
+    '''
+    Exponential moving average
+
+    Starts from the first value, like pandas ewm(span=period,
+    adjust=False).
+
+    Parameters
+    ----------
+    period : int
+        span of the average, smoothing factor is 2/(period+1)
+    source : str, optional
+        bar field to average (default "close")
+    '''
+    def __init__(self, period, source="close"):
+        super().__init__(source)
+        self.period=self._check_period(period)
+        self._alpha=2.0/(period+1)
+
+    def _next(self, x):
+        if math.isnan(self.value):
+            return x
+        return self.value+self._alpha*(x-self.value)
+
+class _Wilder(object):
+    # Wilder smoothing, seeded with the simple average of the first period values
+    def __init__(self, period):
+        self.period=period
+        self.value=math.nan
+        self._count=0
+        self._sum=0.0
+
+    def update(self, x):
+        if self._count < self.period:
+            self._count+=1
+            self._sum+=x
+            if self._count == self.period:
+                self.value=self._sum/self.period
+        else:
+            self.value+=(x-self.value)/self.period
+        return self.value
+
+class RSI(StreamingIndicator):
+    '''
+    Relative strength index with Wilder smoothing
+
+    Parameters
+    ----------
+    period : int, optional
+        smoothing period (default 14)
+    source : str, optional
+        bar field to use (default "close")
+    '''
+    def __init__(self, period=14, source="close"):
+        super().__init__(source)
+        self.period=self._check_period(period)
+        self._gain=_Wilder(period)
+        self._loss=_Wilder(period)
+        self._prev=None
+
+    def _next(self, x):
+        prev, self._prev=self._prev, x
+        if prev is None:
+            return math.nan
+
+        change=x-prev
+        gain=self._gain.update(max(change, 0.0))
+        loss=self._loss.update(max(-change, 0.0))
+        if math.isnan(loss):
+            return math.nan
+        if loss == 0:
+            return 100.0
+        return 100.0-100.0/(1.0+gain/loss)
+
+class ATR(StreamingIndicator):
+    '''
+    Average true range with Wilder smoothing
+
+    Parameters
+    ----------
+    period : int, optional
+        smoothing period (default 14)
+    '''
+    def __init__(self, period=14):
+        super().__init__()
+        self.period=self._check_period(period)
+        self._range=_Wilder(period)
+        self._prev_close=None
+
+    def update(self, bar):
+        high, low, close=float(bar["high"]), float(bar["low"]), float(bar["close"])
+        true_range=high-low
+        if self._prev_close is not None:
+            true_range=max(true_range, abs(high-self._prev_close), abs(low-self._prev_close))
+        self._prev_close=close
+
+        self.value=self._range.update(true_range)
+        return self.value
@@ -1,14 +1,13 @@
-import datetime
+import collections
 import enum
 import json
 import logging
-import random
-import re
-import string
+import time
 import pandas as pd
 from websocket import create_connection
 import requests
-import json
+from . import protocol
+from .session import TvSession
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +31,7 @@ class Interval(enum.Enum):
 class TvDatafeed:
     __sign_in_url = 'https://www.tradingview.com/accounts/signin/'
     __search_url = 'https://symbol-search.tradingview.com/symbol_search/?text={}&hl=1&exchange={}&lang=en&type=&domain=production'
+    __ws_url = "wss://data.tradingview.com/socket.io/websocket"
     __ws_headers = json.dumps({"Origin": "https://data.tradingview.com"})
     __signin_headers = {'Referer': 'https://www.tradingview.com'}
     __ws_timeout = 5
@@ -40,17 +40,24 @@ class TvDatafeed:
         self,
         username: str = None,
         password: str = None,
+        persistent: bool = False,
+        ws_url: str = None,
     ) -> None:
         """Create TvDatafeed object
 
         Args:
             username (str, optional): tradingview username. Defaults to None.
             password (str, optional): tradingview password. Defaults to None.
+            persistent (bool, optional): keep one authenticated websocket open and serve every get_hist call over it instead of connecting per call. Defaults to False.
+            ws_url (str, optional): websocket url to connect to instead of tradingview, e.g. a local TvReplayServer. Defaults to None.
         """
 
         self.ws_debug = False
 
-        self.token = self.__auth(username, password)
+        if ws_url is not None:
+            self.__ws_url = ws_url
+
+        self.token = self.sign_in(username, password)
 
         if self.token is None:
             self.token = "unauthorized_user_token"
@@ -62,8 +69,22 @@ class TvDatafeed:
         self.session = self.__generate_session()
         self.chart_session = self.__generate_chart_session()
 
-    def __auth(self, username, password):
+        self._tv_session = None
+        if persistent:
+            self._tv_session = TvSession(
+                self.token, self.__ws_url, self.__ws_headers, timeout=self.__ws_timeout)
+
+    @classmethod
+    def sign_in(cls, username, password):
+        """sign in to tradingview
+
+        Args:
+            username (str): tradingview username
+            password (str): tradingview password
 
+        Returns:
+            str: auth token, None if username or password is missing or signin failed
+        """
         if (username is None or password is None):
             token = None
 
@@ -73,7 +94,7 @@ class TvDatafeed:
                     "remember": "on"}
             try:
                 response = requests.post(
-                    url=self.__sign_in_url, data=data, headers=self.__signin_headers)
+                    url=cls.__sign_in_url, data=data, headers=cls.__signin_headers)
                 token = response.json()['user']['auth_token']
             except Exception as e:
                 logger.error('error while signin')
@@ -84,45 +105,19 @@ class TvDatafeed:
     def __create_connection(self):
         logging.debug("creating websocket connection")
         self.ws = create_connection(
-            "wss://data.tradingview.com/socket.io/websocket", headers=self.__ws_headers, timeout=self.__ws_timeout
+            self.__ws_url, headers=self.__ws_headers, timeout=self.__ws_timeout
         )
 
-    @staticmethod
-    def __filter_raw_message(text):
-        try:
-            found = re.search('"m":"(.+?)",', text).group(1)
-            found2 = re.search('"p":(.+?"}"])}', text).group(1)
-
-            return found, found2
-        except AttributeError:
-            logger.error("error in filter_raw_message")
-
     @staticmethod
     def __generate_session():
-        stringLength = 12
-        letters = string.ascii_lowercase
-        random_string = "".join(random.choice(letters)
-                                for i in range(stringLength))
-        return "qs_" + random_string
+        return protocol.generate_session("qs_")
 
     @staticmethod
     def __generate_chart_session():
-        stringLength = 12
-        letters = string.ascii_lowercase
-        random_string = "".join(random.choice(letters)
-                                for i in range(stringLength))
-        return "cs_" + random_string
-
-    @staticmethod
-    def __prepend_header(st):
-        return "~m~" + str(len(st)) + "~m~" + st
-
-    @staticmethod
-    def __construct_message(func, param_list):
-        return json.dumps({"m": func, "p": param_list}, separators=(",", ":"))
+        return protocol.generate_session("cs_")
 
     def __create_message(self, func, paramList):
-        return self.__prepend_header(self.__construct_message(func, paramList))
+        return protocol.create_message(func, paramList)
 
     def __send_message(self, func, args):
         m = self.__create_message(func, args)
@@ -130,60 +125,9 @@ class TvDatafeed:
             print(m)
         self.ws.send(m)
 
-    @staticmethod
-    def __create_df(raw_data, symbol):
-        try:
-            out = re.search('"s":\[(.+?)\}\]', raw_data).group(1)
-            x = out.split(',{"')
-            data = list()
-            volume_data = True
-
-            for xi in x:
-                xi = re.split("\[|:|,|\]", xi)
-                ts = datetime.datetime.fromtimestamp(float(xi[4]))
-
-                row = [ts]
-
-                for i in range(5, 10):
-
-                    # skip converting volume data if does not exists
-                    if not volume_data and i == 9:
-                        row.append(0.0)
-                        continue
-                    try:
-                        row.append(float(xi[i]))
-
-                    except ValueError:
-                        volume_data = False
-                        row.append(0.0)
-                        logger.debug('no volume data')
-
-                data.append(row)
-
-            data = pd.DataFrame(
-                data, columns=["datetime", "open",
-                               "high", "low", "close", "volume"]
-            ).set_index("datetime")
-            data.insert(0, "symbol", value=symbol)
-            return data
-        except AttributeError:
-            logger.error("no data, please check the exchange and symbol")
-
     @staticmethod
     def __format_symbol(symbol, exchange, contract: int = None):
-
-        if ":" in symbol:
-            pass
-        elif contract is None:
-            symbol = f"{exchange}:{symbol}"
-
-        elif isinstance(contract, int):
-            symbol = f"{exchange}:{symbol}{contract}!"
-
-        else:
-            raise ValueError("not a valid contract")
-
-        return symbol
+        return protocol.format_symbol(symbol, exchange, contract)
 
     def get_hist(
         self,
@@ -213,40 +157,20 @@ class TvDatafeed:
 
         interval = interval.value
 
+        if self._tv_session is not None:
+            logger.debug(f"getting data for {symbol}...")
+            bars = self._tv_session.fetch(
+                symbol, interval, n_bars, extended_session, timeout=self.__ws_timeout)
+            data = protocol.bars_to_df(bars, symbol)
+            if data is None:
+                logger.error("no data, please check the exchange and symbol")
+            return data
+
         self.__create_connection()
 
-        self.__send_message("set_auth_token", [self.token])
-        self.__send_message("chart_create_session", [self.chart_session, ""])
-        self.__send_message("quote_create_session", [self.session])
-        self.__send_message(
-            "quote_set_fields",
-            [
-                self.session,
-                "ch",
-                "chp",
-                "current_session",
-                "description",
-                "local_description",
-                "language",
-                "exchange",
-                "fractional",
-                "is_tradable",
-                "lp",
-                "lp_time",
-                "minmov",
-                "minmove2",
-                "original_name",
-                "pricescale",
-                "pro_name",
-                "short_name",
-                "type",
-                "update_mode",
-                "volume",
-                "currency_code",
-                "rchp",
-                "rtc",
-            ],
-        )
+        for func, args in protocol.handshake_messages(
+                self.token, self.chart_session, self.session):
+            self.__send_message(func, args)
 
         self.__send_message(
             "quote_add_symbols", [self.session, symbol,
@@ -254,40 +178,108 @@ class TvDatafeed:
         )
         self.__send_message("quote_fast_symbols", [self.session, symbol])
 
-        self.__send_message(
-            "resolve_symbol",
-            [
-                self.chart_session,
-                "symbol_1",
-                '={"symbol":"'
-                + symbol
-                + '","adjustment":"splits","session":'
-                + ('"regular"' if not extended_session else '"extended"')
-                + "}",
-            ],
-        )
-        self.__send_message(
-            "create_series",
-            [self.chart_session, "s1", "s1", "symbol_1", interval, n_bars],
-        )
+        self.__send_message(*protocol.resolve_symbol_message(
+            self.chart_session, "symbol_1", symbol, extended_session))
+        self.__send_message(*protocol.create_series_message(
+            self.chart_session, "s1", "symbol_1", interval, n_bars))
         self.__send_message("switch_timezone", [
                             self.chart_session, "exchange"])
 
-        raw_data = ""
+        decoder = protocol.FrameDecoder()
+        bars = protocol.SeriesBuffer(n_bars)
+        completed = False
 
         logger.debug(f"getting data for {symbol}...")
-        while True:
+        while not completed:
             try:
                 result = self.ws.recv()
-                raw_data = raw_data + result + "\n"
             except Exception as e:
                 logger.error(e)
                 break
 
-            if "series_completed" in result:
-                break
+            for payload in decoder.feed(result):
+                if protocol.is_heartbeat(payload):
+                    continue
+                message = json.loads(payload)
+                func = message.get("m")
+                if func == "timescale_update":
+                    bars.extend(message["p"][1].get("s1", {}).get("s", []))
+                elif func == "series_completed":
+                    completed = True
+
+        self.ws.close()
+
+        data = bars.to_df(symbol)
+        if data is None:
+            logger.error("no data, please check the exchange and symbol")
+        return data
+
+    def get_hist_many(
+        self,
+        symbols: list,
+        exchange: str = "NSE",
+        interval: Interval = Interval.in_daily,
+        n_bars: int = 10,
+        extended_session: bool = False,
+        batch_size: int = 50,
+        timeout: float = 30,
+    ) -> dict:
+        """get historical data for many symbols over a single chart session
+
+        Series requests are pipelined over one websocket (the persistent session if
+        enabled, otherwise a temporary one), keeping up to batch_size requests in flight.
+
+        Args:
+            symbols (list): symbol names, either plain or in format EXCHANGE:SYMBOL
+            exchange (str, optional): exchange for symbols given without one. Defaults to 'NSE'.
+            interval (Interval, optional): chart interval. Defaults to Interval.in_daily.
+            n_bars (int, optional): no of bars to download per symbol, max 5000. Defaults to 10.
+            extended_session (bool, optional): regular session if False, extended session if True, Defaults to False.
+            batch_size (int, optional): max number of series requests in flight. Defaults to 50.
+            timeout (float, optional): max seconds to wait for all symbols, symbols without data by then are left out. Defaults to 30.
+
+        Returns:
+            dict: EXCHANGE:SYMBOL -> pd.Dataframe with sohlcv as columns, symbols without data are left out
+        """
+        symbols = list(dict.fromkeys(
+            self.__format_symbol(symbol=symbol, exchange=exchange) for symbol in symbols))
+
+        tv_session = self._tv_session
+        if tv_session is None:
+            tv_session = TvSession(
+                self.token, self.__ws_url, self.__ws_headers, timeout=self.__ws_timeout)
+
+        results = {}
+        in_flight = collections.deque()
+        deadline = time.monotonic() + timeout  # one deadline for the whole call, not per symbol
+        try:
+            for symbol in symbols:
+                if len(in_flight) >= batch_size:
+                    self.__collect_many(tv_session, in_flight.popleft(), deadline, results)
+                in_flight.append(tv_session.request(
+                    symbol, interval.value, n_bars, extended_session))
+
+            while in_flight:
+                self.__collect_many(tv_session, in_flight.popleft(), deadline, results)
+        finally:
+            if tv_session is not self._tv_session:
+                tv_session.close()
+
+        return results
+
+    @staticmethod
+    def __collect_many(tv_session, req, deadline, results):
+        data = protocol.bars_to_df(
+            tv_session.wait(req, max(deadline - time.monotonic(), 0)), req.symbol)
+        if data is None:
+            logger.error(f"no data for {req.symbol}, please check the exchange and symbol")
+        else:
+            results[req.symbol] = data
 
-        return self.__create_df(raw_data, symbol)
+    def close(self):
+        """close the persistent websocket session, if any"""
+        if self._tv_session is not None:
+            self._tv_session.close()
 
     def search_symbol(self, text: str, exchange: str = ''):
         url = self.__search_url.format(text, exchange)
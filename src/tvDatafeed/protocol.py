@@ -0,0 +1,264 @@
+import json
+import random
+import string
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+HEARTBEAT_PREFIX = "~h~"
+_FRAME_MARK = "~m~"
+
+QUOTE_FIELDS = [
+    "ch",
+    "chp",
+    "current_session",
+    "description",
+    "local_description",
+    "language",
+    "exchange",
+    "fractional",
+    "is_tradable",
+    "lp",
+    "lp_time",
+    "minmov",
+    "minmove2",
+    "original_name",
+    "pricescale",
+    "pro_name",
+    "short_name",
+    "type",
+    "update_mode",
+    "volume",
+    "currency_code",
+    "rchp",
+    "rtc",
+]
+
+
+def generate_session(prefix):
+    # random 12 letter session id with given prefix ("qs_" or "cs_")
+    random_string = "".join(random.choice(string.ascii_lowercase)
+                            for i in range(12))
+    return prefix + random_string
+
+
+def format_symbol(symbol, exchange, contract=None):
+    # EXCHANGE:SYMBOL, with contract suffix ("1!", "2!") for continuous futures
+    if ":" in symbol:
+        pass
+    elif contract is None:
+        symbol = f"{exchange}:{symbol}"
+
+    elif isinstance(contract, int):
+        symbol = f"{exchange}:{symbol}{contract}!"
+
+    else:
+        raise ValueError("not a valid contract")
+
+    return symbol
+
+
+def prepend_header(st):
+    return _FRAME_MARK + str(len(st)) + _FRAME_MARK + st
+
+
+def construct_message(func, param_list):
+    return json.dumps({"m": func, "p": param_list}, separators=(",", ":"))
+
+
+def create_message(func, param_list):
+    return prepend_header(construct_message(func, param_list))
+
+
+def handshake_messages(token, chart_session, quote_session):
+    # messages to authenticate and open chart and quote sessions,
+    # returned as a list of (func, param_list) tuples
+    return [
+        ("set_auth_token", [token]),
+        ("chart_create_session", [chart_session, ""]),
+        ("quote_create_session", [quote_session]),
+        ("quote_set_fields", [quote_session] + QUOTE_FIELDS),
+    ]
+
+
+def resolve_symbol_message(chart_session, symbol_id, symbol, extended_session=False):
+    return ("resolve_symbol", [
+        chart_session,
+        symbol_id,
+        '={"symbol":"'
+        + symbol
+        + '","adjustment":"splits","session":'
+        + ('"regular"' if not extended_session else '"extended"')
+        + "}",
+    ])
+
+
+def create_series_message(chart_session, series_id, symbol_id, interval, n_bars):
+    return ("create_series",
+            [chart_session, series_id, series_id, symbol_id, interval, n_bars])
+
+
+class FrameDecoder(object):
+    '''
+    Incremental ~m~<len>~m~ frame decoder
+
+    Websocket messages are fed in as they arrive and complete
+    payloads are returned. An incomplete trailing frame is kept
+    and completed by the next message, only that tail is ever
+    copied so decoding stays linear in the data received.
+
+    Methods
+    -------
+    feed(data)
+        Decode a websocket message, return complete payloads
+    '''
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, data):
+        '''
+        Decode a websocket message
+
+        Heartbeat payloads are returned as is ("~h~N"), all the
+        others are returned as undecoded JSON strings.
+
+        Parameters
+        ----------
+        data : str
+            websocket message as received
+
+        Returns
+        -------
+        list
+            complete payload strings in the order received
+        '''
+        buf = self._pending + data if self._pending else data
+        payloads = []
+        pos = 0
+        while buf.startswith(_FRAME_MARK, pos):
+            len_end = buf.find(_FRAME_MARK, pos + 3)
+            if len_end == -1:
+                break
+            start = len_end + 3
+            end = start + int(buf[pos + 3:len_end])
+            if end > len(buf):
+                break
+            payloads.append(buf[start:end])
+            pos = end
+
+        self._pending = buf[pos:]
+        return payloads
+
+
+def split_frames(raw):
+    # decode a single complete websocket message into payloads
+    return FrameDecoder().feed(raw)
+
+
+def is_heartbeat(payload):
+    return payload.startswith(HEARTBEAT_PREFIX)
+
+
+class SeriesBuffer(object):
+    '''
+    Preallocated columnar storage for the bars of one series
+
+    Rows of the "s" arrays ({"i": index, "v": [t, o, h, l, c, v]})
+    are copied straight into a float64 NumPy block as frames
+    arrive. The block is sized for the requested number of bars
+    and grows by doubling if the server sends more.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        expected number of bars, defaults to 16
+
+    Methods
+    -------
+    extend(bars)
+        Append the items of an "s" array
+    to_df(symbol)
+        Build sohlcv DataFrame from the stored bars
+    '''
+
+    def __init__(self, capacity=16):
+        self._data = np.empty((max(int(capacity), 1), 6), dtype=np.float64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, bars):
+        '''
+        Append the items of an "s" array
+
+        Parameters
+        ----------
+        bars : list
+            items of the "s" array, {"i": index, "v": [t, o, h, l, c, v]}
+        '''
+        if not bars:
+            return
+
+        rows = [bar["v"] for bar in bars]
+        try:
+            block = np.asarray(rows, dtype=np.float64)
+            if block.ndim != 2 or block.shape[1] not in (5, 6):
+                raise ValueError("unexpected bar shape")
+        except (TypeError, ValueError):  # ragged rows or null volume
+            block = np.zeros((len(rows), 6), dtype=np.float64)
+            for n, v in enumerate(rows):
+                block[n, :min(len(v), 6)] = [
+                    float(x) if x is not None else 0.0 for x in v[:6]]
+
+        end = self._size + len(block)
+        if end > len(self._data):
+            grown = np.empty((max(end, 2 * len(self._data)), 6), dtype=np.float64)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+        width = block.shape[1]
+        self._data[self._size:end, :width] = block
+        if width < 6:  # no volume data
+            self._data[self._size:end, width:] = 0.0
+        else:  # null volume
+            volume = self._data[self._size:end, 5]
+            volume[np.isnan(volume)] = 0.0
+        self._size = end
+
+    def to_df(self, symbol):
+        '''
+        Build sohlcv DataFrame from the stored bars
+
+        Parameters
+        ----------
+        symbol : str
+            symbol name to insert as the first column
+
+        Returns
+        -------
+        pd.DataFrame
+            dataframe with sohlcv as columns and local time
+            datetime index, None if no bars
+        '''
+        if not self._size:
+            return None
+
+        data = self._data[:self._size]
+        index = pd.to_datetime(data[:, 0], unit="s", utc=True) \
+            .tz_convert(tzlocal()).tz_localize(None)
+        index.name = "datetime"
+
+        df = pd.DataFrame(
+            data[:, 1:], index=index,
+            columns=["open", "high", "low", "close", "volume"])
+        df.insert(0, "symbol", value=symbol)
+        return df
+
+
+def bars_to_df(bars, symbol):
+    # build sohlcv DataFrame from a SeriesBuffer, None if no bars
+    if bars is None:
+        return None
+    return bars.to_df(symbol)
@@ -0,0 +1,223 @@
+import json
+import logging
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+from . import protocol
+
+try:
+    from websockets.sync.server import serve
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# bar length of each chart interval in seconds, months count as 30 days
+_INTERVAL_SECONDS = {"1": 60, "3": 180, "5": 300, "15": 900, "30": 1800, "45": 2700,
+                     "1H": 3600, "2H": 7200, "3H": 10800, "4H": 14400,
+                     "1D": 86400, "1W": 604800, "1M": 2592000}
+
+# close time of the last synthetic bar, fixed so that replays are reproducible
+_SYNTHETIC_END = 1700000000
+
+
+def _fixture_rows(df):
+    # sohlcv DataFrame as returned by get_hist -> float64 (t, o, h, l, c, v) block
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:  # get_hist returns local time
+        index = index.tz_localize(tzlocal())
+    seconds = (index - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)
+
+    rows = np.empty((len(df), 6), dtype=np.float64)
+    rows[:, 0] = np.asarray(seconds, dtype=np.float64)
+    rows[:, 1:] = df[["open", "high", "low", "close", "volume"]].to_numpy(dtype=np.float64)
+    return rows
+
+
+def _synthetic_rows(symbol, interval, n_bars):
+    # deterministic random walk seeded by the symbol name
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    step = _INTERVAL_SECONDS.get(interval, 86400)
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.005, n_bars)) * close
+
+    rows = np.empty((n_bars, 6), dtype=np.float64)
+    rows[:, 0] = _SYNTHETIC_END - step * np.arange(n_bars - 1, -1, -1)
+    rows[:, 1] = open_
+    rows[:, 2] = np.maximum(open_, close) + spread
+    rows[:, 3] = np.minimum(open_, close) - spread
+    rows[:, 4] = close
+    rows[:, 5] = rng.integers(1000, 100000, n_bars)
+    return rows
+
+
+class TvReplayServer(object):
+    '''
+    Local stand-in for the TradingView websocket
+
+    Speaks the ~m~<len>~m~ framed protocol on a local port so that
+    TvDatafeed, TvSession and AsyncTvDatafeed can be tested and
+    benchmarked without network access. Every create_series is
+    answered with one timescale_update holding the requested
+    number of bars followed by series_completed, heartbeats are
+    sent every heartbeat_interval seconds and must be echoed.
+
+    Bars are replayed from recorded get_hist results, or generated
+    as a reproducible random walk when no fixtures are given.
+
+    Parameters
+    ----------
+    bars : dict, optional
+        EXCHANGE:SYMBOL -> DataFrame as returned by get_hist, other
+        symbols get symbol_error. Defaults to None, synthetic bars for
+        every symbol
+    latency : float, optional
+        seconds to wait before answering each create_series, defaults to 0
+    heartbeat_interval : float, optional
+        seconds between heartbeats, defaults to None (no heartbeats)
+    host : str, optional
+        address to listen on, defaults to 127.0.0.1
+    port : int, optional
+        port to listen on, defaults to 0 (any free port)
+
+    Methods
+    -------
+    start()
+        Start serving in a background thread, return the websocket url
+    stop()
+        Stop serving and close all connections
+    '''
+
+    def __init__(self, bars=None, latency=0, heartbeat_interval=None,
+                 host="127.0.0.1", port=0):
+        if not WEBSOCKETS_AVAILABLE:
+            raise ImportError("TvReplayServer requires websockets, install with: pip install websockets")
+
+        self._bars = None
+        if bars is not None:
+            self._bars = {symbol: _fixture_rows(df) for symbol, df in bars.items()}
+        self.latency = latency
+        self.heartbeat_interval = heartbeat_interval
+        self._host = host
+        self._port = port
+
+        self.url = None
+        self.stats = {"connections": 0, "messages": 0, "heartbeats": 0, "series": 0, "bars": 0}
+        self._stats_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        '''
+        Start serving in a background thread
+
+        Returns
+        -------
+        str
+            websocket url to pass to TvDatafeed as ws_url
+        '''
+        if self._server is None:
+            self._server = serve(self._handle, self._host, self._port, max_size=None)
+            self._thread = threading.Thread(
+                name="tv_replay_server", target=self._server.serve_forever, daemon=True)
+            self._thread.start()
+            host, port = self._server.socket.getsockname()[:2]
+            self.url = f"ws://{host}:{port}"
+        return self.url
+
+    def stop(self):
+        '''
+        Stop serving and close all connections
+        '''
+        if self._server is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            for key, n in counts.items():
+                self.stats[key] += n
+
+    def _rows(self, symbol, interval, n_bars):
+        # last n_bars rows for the symbol, None if unknown
+        if self._bars is None:
+            return _synthetic_rows(symbol, interval, n_bars)
+        rows = self._bars.get(symbol)
+        return None if rows is None else rows[-n_bars:]
+
+    def _handle(self, ws):
+        # serve one client connection, runs in its own thread
+        self._count(connections=1)
+        ws.send(protocol.prepend_header(json.dumps(
+            {"session_id": protocol.generate_session("replay_"), "timestamp": int(time.time())})))
+
+        decoder = protocol.FrameDecoder()
+        symbols = {}  # symbol id -> symbol
+        heartbeats = 0
+        while True:
+            try:
+                message = ws.recv(timeout=self.heartbeat_interval)
+            except TimeoutError:
+                heartbeats += 1
+                ws.send(protocol.prepend_header(protocol.HEARTBEAT_PREFIX + str(heartbeats)))
+                continue
+            except Exception:  # client closed or server shutting down
+                return
+
+            for payload in decoder.feed(message):
+                if protocol.is_heartbeat(payload):  # echoed by the client
+                    self._count(heartbeats=1)
+                    continue
+                self._count(messages=1)
+                self._reply(ws, json.loads(payload), symbols)
+
+    def _reply(self, ws, message, symbols):
+        func = message.get("m")
+        params = message.get("p", [])
+
+        if func == "resolve_symbol":
+            chart_session, symbol_id = params[0], params[1]
+            symbol = json.loads(params[2][1:])["symbol"]
+            if self._bars is not None and symbol not in self._bars:
+                ws.send(protocol.create_message(
+                    "symbol_error", [chart_session, symbol_id, "invalid symbol"]))
+                return
+            symbols[symbol_id] = symbol
+            ws.send(protocol.create_message(
+                "symbol_resolved", [chart_session, symbol_id, {"name": symbol, "pro_name": symbol}]))
+
+        elif func == "create_series":
+            chart_session, series_id, symbol_id, interval, n_bars = \
+                params[0], params[1], params[3], params[4], params[5]
+            if self.latency:
+                time.sleep(self.latency)
+
+            rows = None
+            if symbol_id in symbols:
+                rows = self._rows(symbols[symbol_id], interval, n_bars)
+            if rows is None:
+                ws.send(protocol.create_message(
+                    "series_error", [chart_session, series_id, series_id, "resolve error"]))
+                return
+
+            s = [{"i": i, "v": v} for i, v in enumerate(rows.tolist())]
+            ws.send(protocol.create_message(
+                "timescale_update", [chart_session, {series_id: {"s": s}}])
+                + protocol.create_message(
+                "series_completed", [chart_session, series_id, "streaming", series_id]))
+            self._count(series=1, bars=len(s))
@@ -19,7 +19,7 @@ class Seis(object):
     
     Methods
     -------
-    new_consumer(callback)
+    new_consumer(callback, timeout, policy, maxsize, dispatch)
         Create a new consumer and add to Seis
     del_consumer(consumer)
         Remove consumer from Seis
@@ -30,6 +30,12 @@ class Seis(object):
         listed
     get_consumers()
         Return a list of consumers for this Seis
+    add_indicator(name, indicator, warmup)
+        Attach streaming indicator to Seis
+    del_indicator(name)
+        Remove streaming indicator from Seis
+    get_indicators()
+        Return current values of attached indicators
     """
 
     def __init__(self, symbol, exchange, interval):
@@ -39,6 +45,7 @@ class Seis(object):
         
         self._tvdatafeed=None 
         self._consumers=[]
+        self._indicators={} # name -> StreamingIndicator, updated with each new bar
         self._updated=None # datetime of the data bar that was last retrieved from TradingView
     
     def __eq__(self, other):
@@ -88,7 +95,7 @@ class Seis(object):
     def tvdatafeed(self):
         self._tvdatafeed=None
     
-    def new_consumer(self, callback, timeout=-1):
+    def new_consumer(self, callback, timeout=-1, policy="unbounded", maxsize=100, dispatch="thread"):
         '''
         Create a new consumer and add to Seis
         
@@ -99,6 +106,14 @@ class Seis(object):
         timeout : int, optional
             maximum time to wait in seconds for return, default
             is -1 (blocking)
+        policy : str, optional
+            queue policy of the consumer buffer, see 
+            tvDatafeed.Consumer (default "unbounded")
+        maxsize : int, optional
+            buffer size for bounded queue policies (default 100)
+        dispatch : str, optional
+            "thread", "pool" or "async", see 
+            TvDatafeedLive.new_consumer (default "thread")
         
         Returns
         -------
@@ -114,7 +129,7 @@ class Seis(object):
         if self._tvdatafeed is None:
             raise NameError("TvDatafeed not provided")
         
-        return self._tvdatafeed.new_consumer(self, callback, timeout) # methods go through tvdatafeed to acquire lock and make it thread safe
+        return self._tvdatafeed.new_consumer(self, callback, timeout, policy, maxsize, dispatch) # methods go through tvdatafeed to acquire lock and make it thread safe
     
     def del_consumer(self, consumer, timeout=-1):
         '''
@@ -253,4 +268,92 @@ class Seis(object):
             for this Seis
         '''
         return self._consumers
-    
\ No newline at end of file
+    
+    
+    def add_indicator(self, name, indicator, warmup=0):
+        '''
+        Attach streaming indicator to Seis
+        
+        The indicator is updated once with each new closed bar,
+        before the bar is put to consumers, and its value is added
+        into the bar data as a column with the given name. 
+        
+        Parameters
+        ----------
+        name : str
+            column name for the indicator value
+        indicator : tvDatafeed.StreamingIndicator
+            indicator instance, not shared with other Seises
+        warmup : int, optional
+            number of historic closed bars to feed into indicator
+            before it gets live bars, default is 0 (none)
+        
+        Raises
+        ------
+        NameError
+            if warmup is requested and no TvDatafeedLive reference
+            is added for this Seis
+        '''
+        if warmup > 0:
+            data=self.get_hist(n_bars=warmup+1)
+            if data is not None and data is not False:
+                # last bar has not closed yet
+                for bar in data.iloc[:-1].to_dict("records"):
+                    indicator.update(bar)
+        
+        self._indicators[name]=indicator
+    
+    def del_indicator(self, name):
+        '''
+        Remove streaming indicator from Seis
+        
+        Parameters
+        ----------
+        name : str
+            name given to the indicator when added
+        
+        Returns
+        -------
+        tvDatafeed.StreamingIndicator
+            removed indicator instance
+        '''
+        return self._indicators.pop(name)
+    
+    def get_indicators(self):
+        '''
+        Return current values of attached indicators
+        
+        Returns
+        -------
+        dict
+            indicator name -> value after the last bar
+        '''
+        return {name: indicator.value for name, indicator in list(self._indicators.items())}
+    
+    def update_indicators(self, data):
+        # Update indicators with new bar data, not for direct use
+        #
+        # This methods is not for direct calling by the
+        # user, but for TvDatafeedLive instance to 
+        # perform operations in the background. Each 
+        # indicator is updated in constant time.
+        #
+        # Parameters
+        # ----------
+        # data : pandas.DataFrame
+        #     closed bar data retrieved from TradingView
+        #
+        # Returns
+        # -------
+        # pandas.DataFrame
+        #     bar data with a column added for each indicator
+        if not self._indicators:
+            return data
+        
+        indicators=list(self._indicators.items())
+        values={name: [] for name, _ in indicators}
+        for bar in data.to_dict("records"):
+            for name, indicator in indicators:
+                values[name].append(indicator.update(bar))
+        
+        return data.assign(**values)
@@ -0,0 +1,497 @@
+import json
+import logging
+import threading
+import time
+from websocket import create_connection, WebSocketTimeoutException
+from . import protocol
+
+logger = logging.getLogger(__name__)
+
+
+class _SeriesRequest(object):
+    # Internal bookkeeping for a single resolve_symbol + create_series
+    # request served over the shared chart session
+    def __init__(self, symbol, interval, n_bars, extended_session, symbol_id, series_id):
+        self.symbol = symbol
+        self.interval = interval
+        self.n_bars = n_bars
+        self.extended_session = extended_session
+        self.symbol_id = symbol_id
+        self.series_id = series_id
+
+        self.bars = protocol.SeriesBuffer(n_bars)
+        self.error = None
+        self.done = threading.Event()
+
+
+class _Subscription(object):
+    # Internal state of a live series kept open on the chart session.
+    # Tracks the currently open bar and reports a bar as closed as soon
+    # as an update carries a bar with a later timestamp
+    def __init__(self, symbol, interval, extended_session, symbol_id, series_id, callback):
+        self.symbol = symbol
+        self.interval = interval
+        self.extended_session = extended_session
+        self.symbol_id = symbol_id
+        self.series_id = series_id
+        self.callback = callback
+
+        self.bar = None  # latest "s" item of the open bar
+
+    def seed(self, bars):
+        # feed the snapshot sent when the series is (re)created. On a new
+        # subscription nothing is reported, the bars in the snapshot closed
+        # before it existed. After a reconnect the bars that closed while
+        # the socket was down are returned with their final values
+        if not bars:
+            return []
+
+        latest = max(bars, key=lambda bar: bar["v"][0])
+        closed = []
+        if self.bar is not None:
+            closed = sorted((bar for bar in bars
+                             if self.bar["v"][0] <= bar["v"][0] < latest["v"][0]),
+                            key=lambda bar: bar["v"][0])
+        self.bar = latest
+        return closed
+
+    def update(self, bars):
+        # feed items of an "s" array, returns the bars that closed
+        closed = []
+        for bar in bars:
+            if self.bar is None or bar["v"][0] == self.bar["v"][0]:
+                self.bar = bar
+            elif bar["v"][0] > self.bar["v"][0]:
+                closed.append(self.bar)
+                self.bar = bar
+
+        return closed
+
+
+class TvSession(object):
+    """
+    Long-lived authenticated TradingView websocket session
+
+    Opens one websocket, authenticates and creates the chart and
+    quote sessions once, then serves any number of sequential or
+    concurrent series requests over it. Every request gets its own
+    symbol and series id within the chart session, so fetching a
+    symbol costs one resolve_symbol and create_series round trip.
+    A background reader thread answers ~h~ heartbeats, routes
+    incoming frames to the request they belong to and reconnects
+    (re-issuing the requests in flight) if the socket drops.
+
+    Parameters
+    ----------
+    token : str
+        TradingView auth token
+    url : str
+        websocket url
+    headers : str
+        websocket headers
+    timeout : int, optional
+        websocket timeout in seconds, defaults to 5
+    reconnect_limit : int, optional
+        max number of reconnect attempts in a row, defaults to 5
+
+    Methods
+    -------
+    connect()
+        Open the websocket and create the sessions
+    request(symbol, interval, n_bars, extended_session)
+        Send a series request without waiting for the result
+    fetch(symbol, interval, n_bars, extended_session, timeout)
+        Send a series request and wait for its bars
+    subscribe(symbol, interval, callback, extended_session)
+        Keep a live series open and report closed bars
+    unsubscribe(subscription)
+        Remove a live series
+    close()
+        Close the websocket and fail all pending requests
+    """
+
+    def __init__(self, token, url, headers, timeout=5, reconnect_limit=5):
+        self._token = token
+        self._url = url
+        self._headers = headers
+        self._timeout = timeout
+        self._reconnect_limit = reconnect_limit
+
+        self.ws_debug = False
+        self.chart_session = protocol.generate_session("cs_")
+        self.quote_session = protocol.generate_session("qs_")
+
+        self._ws = None
+        self._reader = None
+        self._closed = False
+        self._connect_lock = threading.Lock()  # serializes (re)connecting
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()  # guards the request maps and counter
+
+        self._requests = {}  # series id -> _SeriesRequest
+        self._symbol_ids = {}  # symbol id -> series id
+        self._subscriptions = {}  # series id -> _Subscription
+        self._counter = 0
+
+    @property
+    def connected(self):
+        return self._ws is not None
+
+    def connect(self):
+        '''
+        Open the websocket and create the chart and quote sessions
+
+        Does nothing if already connected.
+        '''
+        with self._connect_lock:
+            if self._ws is not None:
+                return
+
+            self._closed = False
+            try:
+                self._open()
+            except Exception:
+                self._drop()
+                raise
+            self._reader = threading.Thread(
+                name="tv_session_reader", target=self._read_loop, daemon=True)
+            self._reader.start()
+
+    def close(self):
+        '''
+        Close the websocket and fail all pending requests
+        '''
+        with self._connect_lock:
+            self._closed = True
+            self._drop()
+
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join()
+        self._reader = None
+
+        self._fail_all(ConnectionError("session closed"))
+
+    def request(self, symbol, interval, n_bars, extended_session=False):
+        '''
+        Send a series request without waiting for the result
+
+        Parameters
+        ----------
+        symbol : str
+            symbol in EXCHANGE:SYMBOL format
+        interval : str
+            interval value, e.g. "1D"
+        n_bars : int
+            number of bars to request
+        extended_session : bool, optional
+            regular session if False, extended session if True
+
+        Returns
+        -------
+        _SeriesRequest
+            request handle, its done event is set once the
+            series has completed or failed
+        '''
+        self.connect()
+
+        with self._state_lock:
+            self._counter += 1
+            req = _SeriesRequest(symbol, interval, n_bars, extended_session,
+                                 "symbol_" + str(self._counter), "s" + str(self._counter))
+            self._requests[req.series_id] = req
+            self._symbol_ids[req.symbol_id] = req.series_id
+
+        try:
+            self._send_request(req)
+        except Exception as e:  # reader thread takes care of reconnecting
+            logger.debug(f"send failed for {symbol}: {e}")
+
+        return req
+
+    def wait(self, req, timeout=None):
+        '''
+        Wait for a request to complete and return its bars
+
+        Parameters
+        ----------
+        req : _SeriesRequest
+            handle returned by request()
+        timeout : float, optional
+            max time to wait in seconds, None waits forever
+
+        Returns
+        -------
+        protocol.SeriesBuffer
+            bars of the series, None if the request failed or
+            timed out
+        '''
+        if not req.done.wait(timeout):
+            self._finish(req.series_id, TimeoutError(
+                f"no data for {req.symbol} in {timeout} seconds"))
+
+        if req.error is not None:
+            logger.error(f"error getting data for {req.symbol}: {req.error}")
+            return None
+
+        return req.bars
+
+    def fetch(self, symbol, interval, n_bars, extended_session=False, timeout=None):
+        '''
+        Send a series request and wait for its bars
+
+        See request() and wait() for the parameters.
+        '''
+        return self.wait(self.request(symbol, interval, n_bars, extended_session), timeout)
+
+    def subscribe(self, symbol, interval, callback, extended_session=False):
+        '''
+        Keep a live series open and report closed bars
+
+        The series stays subscribed on the chart session and the
+        server pushes du (data update) frames for it. Once an update
+        carries a bar newer than the open one, the open bar has
+        closed and callback is called with it from the reader
+        thread, so callback must return quickly. Subscriptions are
+        restored after a reconnect.
+
+        Parameters
+        ----------
+        symbol : str
+            symbol in EXCHANGE:SYMBOL format
+        interval : str
+            interval value, e.g. "1D"
+        callback : func
+            called as callback(bars) with a protocol.SeriesBuffer
+            holding the closed bar
+        extended_session : bool, optional
+            regular session if False, extended session if True
+
+        Returns
+        -------
+        _Subscription
+            handle to pass to unsubscribe()
+        '''
+        self.connect()
+
+        with self._state_lock:
+            self._counter += 1
+            sub = _Subscription(symbol, interval, extended_session,
+                                "symbol_" + str(self._counter), "s" + str(self._counter), callback)
+            self._subscriptions[sub.series_id] = sub
+
+        try:
+            self._send_subscription(sub)
+        except Exception as e:  # reader thread takes care of reconnecting
+            logger.debug(f"send failed for {symbol}: {e}")
+
+        return sub
+
+    def unsubscribe(self, sub):
+        '''
+        Remove a live series
+
+        Parameters
+        ----------
+        sub : _Subscription
+            handle returned by subscribe()
+        '''
+        with self._state_lock:
+            if self._subscriptions.pop(sub.series_id, None) is None:
+                return
+
+        try:
+            self._send("remove_series", [self.chart_session, sub.series_id])
+            self._send("quote_remove_symbols", [self.quote_session, sub.symbol])
+        except Exception as e:
+            logger.debug(e)
+
+    def _send(self, func, args):
+        m = protocol.create_message(func, args)
+        if self.ws_debug:
+            print(m)
+        with self._send_lock:
+            self._ws.send(m)
+
+    def _send_request(self, req):
+        self._send(*protocol.resolve_symbol_message(
+            self.chart_session, req.symbol_id, req.symbol, req.extended_session))
+        self._send(*protocol.create_series_message(
+            self.chart_session, req.series_id, req.symbol_id, req.interval, req.n_bars))
+
+    def _send_subscription(self, sub):
+        self._send("quote_add_symbols", [self.quote_session, sub.symbol])
+        self._send(*protocol.resolve_symbol_message(
+            self.chart_session, sub.symbol_id, sub.symbol, sub.extended_session))
+        self._send(*protocol.create_series_message(
+            self.chart_session, sub.series_id, sub.symbol_id, sub.interval, 2))
+
+    def _open(self):
+        # create the websocket and authenticate, caller holds _connect_lock
+        logger.debug("creating websocket connection")
+        self._ws = create_connection(
+            self._url, headers=self._headers, timeout=self._timeout)
+
+        for func, args in protocol.handshake_messages(
+                self._token, self.chart_session, self.quote_session):
+            self._send(func, args)
+        self._send("switch_timezone", [self.chart_session, "exchange"])
+
+        with self._state_lock:
+            subscriptions = list(self._subscriptions.values())
+        for sub in subscriptions:
+            self._send_subscription(sub)
+
+    def _reconnect(self):
+        # re-open the websocket, re-issue all requests in flight and
+        # restore subscriptions, returns False if reconnecting failed or session was closed
+        for attempt in range(self._reconnect_limit):
+            with self._connect_lock:
+                if self._closed:
+                    return False
+                try:
+                    self._open()
+                    with self._state_lock:
+                        pending = list(self._requests.values())
+                    for req in pending:
+                        req.bars = protocol.SeriesBuffer(req.n_bars)
+                        self._send_request(req)
+                    return True
+                except Exception as e:  # new socket dropped as well, try again
+                    self._drop()
+                    logger.warning(f"reconnect attempt {attempt + 1} failed: {e}")
+            time.sleep(min(2 ** attempt * 0.1, 5))
+
+        return False
+
+    def _drop(self):
+        # close the websocket and mark the session disconnected, caller holds _connect_lock
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception as e:
+                logger.debug(e)
+
+    def _read_loop(self):
+        # background thread reading and dispatching incoming frames. If it
+        # stops for any reason other than close() the session is marked
+        # disconnected and pending requests fail, the next request reconnects
+        try:
+            self._read_frames()
+        except Exception as e:
+            logger.error(f"session reader failed: {e}")
+        finally:
+            if not self._closed:
+                with self._connect_lock:
+                    self._drop()
+                self._fail_all(ConnectionError("websocket connection lost"))
+
+            if self._reader is threading.current_thread():
+                self._reader = None
+
+    def _read_frames(self):
+        decoder = protocol.FrameDecoder()
+        while not self._closed:
+            ws = self._ws
+            try:
+                if ws is None:
+                    raise ConnectionError("not connected")
+                result = ws.recv()
+            except WebSocketTimeoutException:
+                continue  # idle socket, server heartbeats keep it alive
+            except Exception as e:
+                if self._closed:
+                    break
+                logger.warning(f"websocket connection lost: {e}")
+                if not self._reconnect():
+                    break
+                decoder = protocol.FrameDecoder()  # drop partial frame of the lost socket
+                continue
+
+            for payload in decoder.feed(result):
+                self._dispatch(payload)
+
+    def _dispatch(self, payload):
+        if protocol.is_heartbeat(payload):
+            try:
+                with self._send_lock:
+                    self._ws.send(protocol.prepend_header(payload))
+            except Exception as e:
+                logger.debug(e)
+            return
+
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.debug(f"unable to decode frame {payload[:100]}")
+            return
+
+        func = message.get("m")
+        params = message.get("p", [])
+
+        if func in ("timescale_update", "du"):
+            closed = []
+            with self._state_lock:
+                for series_id, update in params[1].items():
+                    if not isinstance(update, dict):
+                        continue
+                    if (sub := self._subscriptions.get(series_id)) is not None:
+                        bars = update.get("s", [])
+                        closed += [(sub, bar) for bar in
+                                   (sub.seed(bars) if func == "timescale_update" else sub.update(bars))]
+                    elif func == "timescale_update" \
+                            and (req := self._requests.get(series_id)) is not None:
+                        req.bars.extend(update.get("s", []))
+
+            for sub, bar in closed:  # outside the lock, callbacks may issue requests
+                bars = protocol.SeriesBuffer(1)
+                bars.extend([bar])
+                try:
+                    sub.callback(bars)
+                except Exception as e:
+                    logger.error(f"subscription callback failed for {sub.symbol}: {e}")
+
+        elif func == "series_completed":
+            self._finish(params[1])
+
+        elif func == "series_error":
+            self._finish(params[1], RuntimeError(str(params[2:])))
+
+        elif func == "symbol_error":
+            with self._state_lock:
+                series_id = self._symbol_ids.get(params[1])
+                subscribed = [sub.symbol for sub in self._subscriptions.values()
+                              if sub.symbol_id == params[1]]
+            if subscribed:
+                logger.error(f"unable to subscribe to {subscribed[0]}: {params[2:]}")
+            self._finish(series_id, RuntimeError(str(params[2:])))
+
+        elif func in ("critical_error", "protocol_error"):
+            logger.error(f"{func}: {params}")
+            self._fail_all(RuntimeError(str(params)))
+
+    def _finish(self, series_id, error=None):
+        # mark request as done and drop the series on the server
+        with self._state_lock:
+            req = self._requests.pop(series_id, None)
+            if req is None:
+                return
+            self._symbol_ids.pop(req.symbol_id, None)
+
+        req.error = error
+        req.done.set()
+
+        try:
+            self._send("remove_series", [self.chart_session, series_id])
+        except Exception as e:
+            logger.debug(e)
+
+    def _fail_all(self, error):
+        with self._state_lock:
+            pending = list(self._requests.values())
+            self._requests.clear()
+            self._symbol_ids.clear()
+
+        for req in pending:
+            req.error = error
+            req.done.set()
@@ -0,0 +1,197 @@
+import json, os, time, threading, logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class SymbolCache(object):
+    '''
+    Symbol metadata cache with expiry, optionally kept on disk
+
+    Remembers the symbol search result for each (symbol, exchange)
+    so validating a symbol hits the TradingView symbol search only
+    once per ttl. Combinations that are not listed are remembered
+    as well. If a path is given the cache is loaded from that JSON
+    file and saved back to it at the end of warm() and on save() or
+    close(), so it survives restarts. Single lookups only update the
+    cache in memory.
+
+    Parameters
+    ----------
+    path : str, optional
+        JSON file to keep the cache in, in memory only if None
+        (default None)
+    ttl : float, optional
+        seconds an entry stays valid (default 86400)
+    workers : int, optional
+        number of concurrent symbol searches when warming the
+        cache (default 8)
+
+    Methods
+    -------
+    lookup(tvdatafeed, symbol, exchange)
+        Return symbol metadata, searching TradingView on cache miss
+    warm(tvdatafeed, symbols)
+        Look up all symbols missing from cache concurrently
+    warm_from_file(tvdatafeed, path)
+        Warm cache with symbols listed in a text file
+    save()
+        Write cache into its JSON file if it has changed
+    close()
+        Save cache before it is discarded
+    '''
+    def __init__(self, path=None, ttl=86400, workers=8):
+        self.path=path
+        self.ttl=ttl
+        self.workers=workers
+
+        self._lock=threading.Lock()
+        self._entries={} # "EXCHANGE:SYMBOL" -> {"meta": dict or None, "checked": epoch seconds}
+        self._dirty=False # entries changed since last load or save
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries=json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"ignoring unreadable symbol cache {path}: {e}")
+
+    @staticmethod
+    def _key(symbol, exchange):
+        return f"{exchange}:{symbol}"
+
+    def _get(self, symbol, exchange):
+        # returns (True, metadata or None) for a valid entry, (False, None) otherwise
+        with self._lock:
+            entry=self._entries.get(self._key(symbol, exchange))
+
+        if entry is None or time.time()-entry["checked"] > self.ttl:
+            return False, None
+
+        return True, entry["meta"]
+
+    def _search(self, tvdatafeed, symbol, exchange):
+        # search TradingView and cache the matching item, None if not listed
+        results=tvdatafeed.search_symbol(symbol, exchange)
+        if not results: # search failed or found nothing, do not remember it
+            return None
+
+        meta=None
+        for item in results:
+            if item['symbol']==symbol and item['exchange']==exchange:
+                meta=item
+                break
+
+        with self._lock:
+            self._entries[self._key(symbol, exchange)]={"meta": meta, "checked": time.time()}
+            self._dirty=True
+
+        return meta
+
+    def lookup(self, tvdatafeed, symbol, exchange):
+        '''
+        Return symbol metadata, searching TradingView on cache miss
+
+        Parameters
+        ----------
+        tvdatafeed : TvDatafeed
+            used for the symbol search on cache miss
+        symbol : str
+            ticker string for symbol
+        exchange : str
+            exchange where symbol is listed
+
+        Returns
+        -------
+        dict
+            symbol search result, None if such symbol and
+            exchange combination is not listed
+        '''
+        hit, meta=self._get(symbol, exchange)
+        if hit:
+            return meta
+
+        return self._search(tvdatafeed, symbol, exchange)
+
+    def warm(self, tvdatafeed, symbols):
+        '''
+        Look up all symbols missing from cache concurrently
+
+        Parameters
+        ----------
+        tvdatafeed : TvDatafeed
+            used for the symbol searches
+        symbols : list
+            (symbol, exchange) tuples
+
+        Returns
+        -------
+        int
+            number of symbols searched
+        '''
+        missing=list(dict.fromkeys(
+            (symbol, exchange) for symbol, exchange in symbols if not self._get(symbol, exchange)[0]))
+        if not missing:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(lambda args: self._search(tvdatafeed, *args), missing))
+
+        self.save()
+        logger.debug(f"symbol cache warmed with {len(missing)} symbols")
+
+        return len(missing)
+
+    def warm_from_file(self, tvdatafeed, path):
+        '''
+        Warm cache with symbols listed in a text file
+
+        The file lists one EXCHANGE:SYMBOL per line, empty lines
+        and lines starting with # are skipped.
+
+        Parameters
+        ----------
+        tvdatafeed : TvDatafeed
+            used for the symbol searches
+        path : str
+            symbol list file
+
+        Returns
+        -------
+        int
+            number of symbols searched
+        '''
+        symbols=[]
+        with open(path) as f:
+            for line in f:
+                line=line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                exchange, symbol=line.split(":", 1)
+                symbols.append((symbol, exchange))
+
+        return self.warm(tvdatafeed, symbols)
+
+    def save(self):
+        '''
+        Write cache into its JSON file, nothing to do if in memory
+        only or unchanged since last save
+        '''
+        if self.path is None:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+            data=json.dumps(self._entries)
+            self._dirty=False
+
+        tmp_path=self.path+".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path) # replace atomically so readers never see a partial file
+
+    def close(self):
+        '''
+        Save cache before it is discarded
+        '''
+        self.save()
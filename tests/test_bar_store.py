@@ -0,0 +1,123 @@
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.collectors.bar_store import BarStore, PYARROW_AVAILABLE
+
+
+def make_bars(start, periods, freq='1min'):
+    """生成测试用K线数据"""
+    index = pd.date_range(start, periods=periods, freq=freq, name='datetime')
+    close = np.arange(periods, dtype='float64')
+    return pd.DataFrame({
+        'symbol': 'NASDAQ:AAPL',
+        'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+        'Volume': np.full(periods, 100, dtype='int64'),
+    }, index=index)
+
+
+@unittest.skipUnless(PYARROW_AVAILABLE, "需要 pyarrow")
+class TestBarStore(unittest.TestCase):
+    def setUp(self):
+        """测试开始前的设置"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_append_only_write(self):
+        """测试只追加新K线，重复数据不再写入"""
+        for fmt in ("parquet", "feather"):
+            store = BarStore(str(Path(self.tmpdir.name) / fmt), fmt=fmt)
+            self.assertEqual(store.write(make_bars('2024-01-02 09:30', 100), 'NASDAQ', 'AAPL', '1'), 100)
+            self.assertEqual(store.write(make_bars('2024-01-02 09:30', 150), 'NASDAQ', 'AAPL', '1'), 50)
+            self.assertEqual(store.write(make_bars('2024-01-02 09:30', 150), 'NASDAQ', 'AAPL', '1'), 0)
+
+            df = store.read('NASDAQ', 'AAPL', '1')
+            self.assertEqual(len(df), 150)
+            self.assertEqual(df.index.name, 'date')
+            self.assertEqual(list(df.columns), ['Open', 'High', 'Low', 'Close', 'Volume'])
+            self.assertTrue((df.dtypes == 'float64').all())
+            self.assertEqual(store.last_timestamp('NASDAQ', 'AAPL', '1'), df.index[-1])
+
+    def test_tail_update_and_prepend(self):
+        """测试更新最后一根K线只重写最后一个分片，更早的K线追加为新分片"""
+        store = BarStore(self.tmpdir.name)
+        store.write(make_bars('2024-01-02 09:30', 10), 'NASDAQ', 'AAPL', '1')
+        store.write(make_bars('2024-01-02 09:40', 10), 'NASDAQ', 'AAPL', '1')
+
+        update = make_bars('2024-01-02 09:45', 5)
+        update.loc[update.index[-1], 'Close'] = 99.0
+        self.assertEqual(store.write(update, 'NASDAQ', 'AAPL', '1'), 5)  # 5 根K线与已存储值不同
+        self.assertEqual(store.write(make_bars('2024-01-02 09:00', 30), 'NASDAQ', 'AAPL', '1'), 30)
+
+        df = store.read('NASDAQ', 'AAPL', '1')
+        self.assertEqual(len(df), 50)
+        self.assertEqual(df.loc['2024-01-02 09:49', 'Close'], 99.0)
+        self.assertEqual(len(store._parts('NASDAQ', 'AAPL', '1')), 3)
+
+    def test_gap_fill_and_inner_update(self):
+        """测试分片之间的空缺被补齐，非最后一个分片中变化的K线被更新"""
+        store = BarStore(self.tmpdir.name)
+        bars = make_bars('2024-01-01', 29, freq='D')
+        store.write(bars.iloc[:10], 'NASDAQ', 'AAPL', '1D')
+        store.write(bars.iloc[19:], 'NASDAQ', 'AAPL', '1D')
+
+        update = bars.copy()
+        update.loc['2024-01-05', 'Close'] = 99.0
+        self.assertEqual(store.write(update, 'NASDAQ', 'AAPL', '1D'), 9 + 1)  # 9 根空缺K线和 1 根变化的K线
+
+        df = store.read('NASDAQ', 'AAPL', '1D')
+        self.assertEqual(len(df), 29)
+        self.assertEqual(df.loc['2024-01-15', 'Close'], 14.0)
+        self.assertEqual(df.loc['2024-01-05', 'Close'], 99.0)
+        self.assertEqual(len(store._parts('NASDAQ', 'AAPL', '1D')), 3)
+        self.assertEqual(store.write(update, 'NASDAQ', 'AAPL', '1D'), 0)
+
+    def test_fill_hole_inside_part(self):
+        """测试补齐分片时间范围内缺失的K线"""
+        store = BarStore(self.tmpdir.name)
+        bars = make_bars('2024-01-01', 10, freq='D')
+        store.write(bars.drop(bars.index[4]), 'NASDAQ', 'AAPL', '1D')
+        self.assertEqual(store.write(bars, 'NASDAQ', 'AAPL', '1D'), 1)
+        self.assertEqual(len(store.read('NASDAQ', 'AAPL', '1D')), 10)
+        self.assertEqual(len(store._parts('NASDAQ', 'AAPL', '1D')), 1)
+
+    def test_date_range_read(self):
+        """测试按日期范围和最后 n_bars 根读取"""
+        store = BarStore(self.tmpdir.name)
+        for day in ('2024-01-02', '2024-01-03', '2024-01-04'):
+            store.write(make_bars(f'{day} 09:30', 390), 'NASDAQ', 'AAPL', '1')
+
+        df = store.read('NASDAQ', 'AAPL', '1', start=datetime(2024, 1, 3), end=datetime(2024, 1, 3, 23, 59))
+        self.assertEqual(len(df), 390)
+        self.assertTrue((df.index.date == datetime(2024, 1, 3).date()).all())
+
+        df = store.read('NASDAQ', 'AAPL', '1', n_bars=500)
+        self.assertEqual(len(df), 500)
+        self.assertEqual(df.index[-1], pd.Timestamp('2024-01-04 15:59'))
+        self.assertIsNone(store.read('NASDAQ', 'MSFT', '1'))
+
+    def test_compact(self):
+        """测试合并分片后数据不变"""
+        store = BarStore(self.tmpdir.name)
+        for day in ('2024-01-02', '2024-01-03'):
+            store.write(make_bars(f'{day} 09:30', 10), 'NASDAQ', 'AAPL', '1')
+        before = store.read('NASDAQ', 'AAPL', '1')
+
+        self.assertEqual(store.compact('NASDAQ', 'AAPL', '1'), 2)
+        self.assertEqual(len(store._parts('NASDAQ', 'AAPL', '1')), 1)
+        pd.testing.assert_frame_equal(store.read('NASDAQ', 'AAPL', '1'), before)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
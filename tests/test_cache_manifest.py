@@ -0,0 +1,105 @@
+import unittest
+import pandas as pd
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.collectors.utils import cache_data, load_cached_data, evict_cache, get_manifest, CacheManifest, MANIFEST_NAME
+
+
+class TestCacheManifest(unittest.TestCase):
+    def setUp(self):
+        """每个测试使用独立的缓存目录"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.cache_dir = self.tmpdir.name
+        self.df = pd.DataFrame({'value': [1.0, 2.0]}, index=pd.to_datetime(['2024-01-01', '2024-01-02']))
+
+    def write_dated(self, cache_name, day, age_days):
+        """写入指定日期的缓存文件并设置修改时间"""
+        path = Path(self.cache_dir) / f"{cache_name}_{day}.csv"
+        self.df.to_csv(path, index_label='date')
+        mtime = time.time() - age_days * 86400
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_lookup_uses_manifest(self):
+        """测试读取通过清单定位最新文件，外部删除的文件从清单移除"""
+        cache_data(self.df.copy(), 'NASDAQ_AAPL_1D', self.cache_dir)
+        self.assertTrue((Path(self.cache_dir) / MANIFEST_NAME).exists())
+
+        df = load_cached_data('NASDAQ_AAPL_1D', self.cache_dir)
+        pd.testing.assert_series_equal(df['value'], self.df['value'], check_names=False, check_freq=False)
+        self.assertIsNone(load_cached_data('NASDAQ_MSFT_1D', self.cache_dir))
+
+        entry = get_manifest(self.cache_dir).latest('NASDAQ_AAPL_1D')
+        os.remove(Path(self.cache_dir) / entry['file'])
+        self.assertIsNone(load_cached_data('NASDAQ_AAPL_1D', self.cache_dir))
+        self.assertIsNone(get_manifest(self.cache_dir).latest('NASDAQ_AAPL_1D'))
+
+    def test_manifest_built_from_existing_files(self):
+        """测试没有清单时扫描已有缓存文件生成清单"""
+        self.write_dated('GDP', '20240101', 3)
+        newest = self.write_dated('GDP', '20240103', 0)
+        self.assertEqual(get_manifest(self.cache_dir).latest('GDP')['file'], newest.name)
+        self.assertIsNotNone(load_cached_data('GDP', self.cache_dir))
+
+    def test_concurrent_writers(self):
+        """测试多个清单实例（模拟多个进程）同时写入时不丢失记录"""
+        manifests = [CacheManifest(self.cache_dir) for _ in range(4)]
+
+        def write(n, manifest):
+            for i in range(20):
+                path = self.write_dated(f'S{n}', f'2024{i:04d}', 0)
+                manifest.add(f'S{n}', path)
+
+        threads = [threading.Thread(target=write, args=(n, manifest)) for n, manifest in enumerate(manifests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        manifest = CacheManifest(self.cache_dir)
+        for n in range(4):
+            self.assertEqual(manifest.latest(f'S{n}')['file'], f'S{n}_20240019.csv')
+        self.assertEqual(evict_cache(self.cache_dir, keep_last=20), 0)
+
+    def test_eviction_rescans_unlisted_files(self):
+        """测试清理前发现清单中没有记录的文件时重新扫描目录"""
+        cache_data(self.df.copy(), 'GDP', self.cache_dir)
+        orphan = self.write_dated('GDP', '20200101', 30)  # 其他进程写入但未记入清单的文件
+        manifest = CacheManifest(self.cache_dir)
+
+        self.assertEqual(manifest.evict('GDP', max_age_days=10), 1)
+        self.assertFalse(orphan.exists())
+        self.assertIsNotNone(manifest.latest('GDP'))
+
+    def test_eviction(self):
+        """测试按保留数量、最大天数和总大小清理旧文件"""
+        for day, age in (('20240101', 40), ('20240102', 20), ('20240103', 10), ('20240104', 0)):
+            self.write_dated('GDP', day, age)
+            self.write_dated('M2', day, age)
+
+        self.assertEqual(evict_cache(self.cache_dir, keep_last=3), 2)
+        self.assertEqual(evict_cache(self.cache_dir, max_age_days=15), 2)
+        size = (Path(self.cache_dir) / 'GDP_20240104.csv').stat().st_size
+        self.assertEqual(evict_cache(self.cache_dir, max_total_bytes=2 * size), 2)
+        self.assertEqual(sorted(p.name for p in Path(self.cache_dir).glob('*.csv')),
+                         ['GDP_20240104.csv', 'M2_20240104.csv'])
+
+        cache_data(self.df.copy(), 'GDP', self.cache_dir, keep_last=1)
+        self.assertEqual(len(list(Path(self.cache_dir).glob('GDP_*.csv'))), 1)
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
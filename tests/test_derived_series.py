@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.collectors.derived import DerivedSeries, DerivedSeriesEngine, DERIVED_PREFIX
+from src.models.database import Database
+
+DEFINITIONS = {
+    'SPREAD': {'expression': 'DGS10 - DGS3MO', 'freq': 'B'},
+    'CPI_YOY': {'expression': '100 * pct_change(CPIAUCSL, 12)', 'freq': 'MS', 'units': 'Percent'},
+    'REAL_RATE': {'expression': 'FEDFUNDS - 100 * pct_change(CPIAUCSL, 12)', 'freq': 'MS'},
+}
+
+
+class TestDerivedSeries(unittest.TestCase):
+    def setUp(self):
+        """使用临时数据库和模拟的月度、日度数据"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db = Database(os.path.join(self.tmpdir.name, 'fred.db'))
+        self.addCleanup(self.db.close)
+
+        months = pd.date_range('2022-01-01', periods=30, freq='MS')
+        self.cpi = pd.Series(100 * 1.003 ** np.arange(30), index=months)
+        self.save('CPIAUCSL', self.cpi)
+        self.save('FEDFUNDS', pd.Series(np.linspace(0.1, 5.3, 30), index=months))
+        days = pd.bdate_range('2024-01-01', periods=60)
+        self.save('DGS10', pd.Series(np.linspace(4.0, 4.5, 60), index=days))
+        self.save('DGS3MO', pd.Series(5.0, index=days[::2]))  # 缺失的日期前向填充
+        self.engine = DerivedSeriesEngine(self.db, DEFINITIONS)
+
+    def save(self, series_id, values):
+        self.db.save_series_data(series_id, values.to_frame('value'))
+
+    def test_parse(self):
+        """测试解析表达式的输入系列和历史期数"""
+        derived = self.engine.series['REAL_RATE']
+        self.assertEqual(derived.inputs, ['FEDFUNDS', 'CPIAUCSL'])
+        self.assertEqual(derived.lookback, 12)
+        self.assertEqual(derived.series_id, DERIVED_PREFIX + 'REAL_RATE')
+        with self.assertRaises(ValueError):
+            DerivedSeries('BAD', '__import__("os")', 'MS')
+        with self.assertRaises(ValueError):
+            DerivedSeries('BAD', 'pct_change(CPIAUCSL, -1)', 'MS')
+
+    def test_compute(self):
+        """测试在对齐的面板上向量化计算"""
+        yoy = self.engine.compute('CPI_YOY')
+        expected = (100 * self.cpi.pct_change(12)).dropna()
+        np.testing.assert_allclose(yoy.to_numpy(), expected.to_numpy())
+        self.assertEqual(list(yoy.index), list(expected.index))
+
+        spread = self.engine.compute('SPREAD')
+        self.assertEqual(len(spread), 60)
+        self.assertAlmostEqual(spread.iloc[1], 4.0 + 0.5 / 59 - 5.0)
+
+    def test_incremental_update(self):
+        """测试只重新计算输入系列有新数据之后的部分"""
+        rows = self.engine.update()
+        self.assertEqual(rows['CPI_YOY'], 18)
+        self.assertEqual(self.engine.update(), {'SPREAD': 0, 'CPI_YOY': 0, 'REAL_RATE': 0})
+
+        # CPI 新增两个月并修订最后一个月
+        tail = pd.Series([self.cpi.iloc[-1] * 1.01, 150.0, 151.0], index=pd.date_range('2024-06-01', periods=3, freq='MS'))
+        self.save('CPIAUCSL', tail)
+        rows = self.engine.update()
+        self.assertEqual(rows, {'SPREAD': 0, 'CPI_YOY': 3, 'REAL_RATE': 3})
+
+        stored = self.db.get_series_data(DERIVED_PREFIX + 'CPI_YOY')['value']
+        full = self.engine.compute('CPI_YOY')
+        np.testing.assert_allclose(stored.to_numpy(), full.to_numpy())
+        self.assertEqual(self.db.get_series_metadata(DERIVED_PREFIX + 'CPI_YOY')['units'], 'Percent')
+
+        self.assertEqual(self.engine.update(['CPI_YOY'], full=True), {'CPI_YOY': 20})
+
+
+if __name__ == '__main__':
+    unittest.main()
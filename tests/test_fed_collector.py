@@ -5,6 +5,11 @@ import os
 import sys
 from pathlib import Path
 import sqlite3
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
 
 # 添加项目根目录到 Python 路径
 project_root = Path(__file__).parent.parent
@@ -13,6 +18,8 @@ sys.path.append(str(project_root))
 from src.collectors.fed_collector import FedDataCollector
 from src.config import FRED_SERIES
 from src.models.database import Database
+from src.collectors.utils import RateLimiter
+from src.collectors.fred_replay import FredRecorder, FredReplay
 
 class TestFedDataCollector(unittest.TestCase):
     def setUp(self):
@@ -119,6 +126,434 @@ class TestFedDataCollector(unittest.TestCase):
         self.assertIn('units', metadata)
         self.assertIn('frequency', metadata)
 
+class FakeFred:
+    """模拟 FRED API，每次请求耗时固定并记录最大并发数"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.data = pd.Series(range(12), index=pd.date_range('2024-01-01', periods=12, freq='MS'), dtype=float)
+        self.last_updated = '2024-12-02 07:45:00-06'
+        self.releases = pd.DataFrame(columns=['date', 'realtime_start', 'value'])
+        self.observation_starts = []
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _request(self, name, series_id):
+        with self._lock:
+            self.calls.append((name, series_id))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+    def get_series(self, series_id, observation_start=None, observation_end=None):
+        self._request('get_series', series_id)
+        self.observation_starts.append(observation_start)
+        data = self.data
+        if observation_start is not None:
+            data = data[data.index >= pd.Timestamp(observation_start)]
+        if observation_end is not None:
+            data = data[data.index <= pd.Timestamp(observation_end)]
+        return data
+
+    def get_series_info(self, series_id):
+        self._request('get_series_info', series_id)
+        return SimpleNamespace(title=f"{series_id} title", units='Percent', frequency='Monthly',
+                               last_updated=self.last_updated)
+
+    def get_series_all_releases(self, series_id, realtime_start=None, realtime_end=None):
+        self._request('get_series_all_releases', series_id)
+        releases = self.releases.copy()
+        # 与 FRED 相同，早于请求起始日期的发布返回请求的起始日期
+        releases['realtime_start'] = releases['realtime_start'].clip(lower=pd.Timestamp(realtime_start))
+        return releases
+
+
+class TestConcurrentFetch(unittest.TestCase):
+    def setUp(self):
+        """使用模拟的 FRED API 和临时数据库"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.fred = FakeFred()
+        patcher = mock.patch('src.collectors.fed_collector.Fred', return_value=self.fred)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.collector = FedDataCollector(db=Database(os.path.join(self.tmpdir.name, 'fred.db')))
+
+    def test_concurrent_fetch(self):
+        """测试并发获取多个系列并记录每个系列的耗时"""
+        series_ids = [f"S{n}" for n in range(16)]
+        started = time.perf_counter()
+        results = self.collector.get_multiple_series(series_ids, max_workers=8)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(sorted(results), sorted(series_ids))
+        self.assertGreater(self.fred.max_active, 1)
+        self.assertLess(elapsed, len(self.fred.calls) * self.fred.delay)
+        self.assertEqual(set(self.collector.fetch_stats), set(series_ids))
+        self.assertTrue(all(stats['rows'] == 12 and stats['error'] is None
+                            for stats in self.collector.fetch_stats.values()))
+
+    def test_error_recorded(self):
+        """测试单个系列失败不影响其他系列"""
+        get_series = self.fred.get_series
+
+        def failing_get_series(series_id, *args):
+            if series_id == 'BAD':
+                raise ValueError('bad series')
+            return get_series(series_id, *args)
+        self.fred.get_series = failing_get_series
+        results = self.collector.get_multiple_series(['GOOD', 'BAD'])
+        self.assertEqual(list(results), ['GOOD'])
+        self.assertEqual(self.collector.fetch_stats['BAD']['error'], 'bad series')
+
+    def test_rate_limiter(self):
+        """测试限流器在突发配额用完后按速率放行"""
+        limiter = RateLimiter(5, 0.5)
+        started = time.perf_counter()
+        for _ in range(7):
+            limiter.acquire()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.15)
+
+
+class TestIncrementalSync(unittest.TestCase):
+    def setUp(self):
+        """使用模拟的 FRED API 和临时数据库"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.fred = FakeFred(delay=0)
+        patcher = mock.patch('src.collectors.fed_collector.Fred', return_value=self.fred)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db_path = os.path.join(self.tmpdir.name, 'fred.db')
+        self.db = Database(self.db_path)
+        self.collector = FedDataCollector(db=self.db)
+
+    def append_observations(self, values):
+        """FRED 发布新的观测值"""
+        index = pd.date_range(self.fred.data.index[-1], periods=len(values) + 1, freq='MS')[1:]
+        self.fred.data = pd.concat([self.fred.data, pd.Series(values, index=index, dtype=float)])
+        self.fred.last_updated = '2025-03-03 07:45:00-06'
+
+    def count_calls(self, name):
+        return sum(1 for call, _ in self.fred.calls if call == name)
+
+    def test_sync_state(self):
+        """测试首次同步保存全部历史和同步状态，FRED 未更新时不再请求数据"""
+        self.assertEqual(self.collector.sync_series('CPI'), 12)
+        metadata = self.db.get_series_metadata('CPI')
+        self.assertEqual(metadata['last_observation'], '2024-12-01')
+        self.assertEqual(metadata['fred_last_updated'], self.fred.last_updated)
+        self.assertIsNotNone(metadata['last_checked'])
+
+        self.assertEqual(self.collector.sync_series('CPI'), 0)
+        self.assertEqual(self.count_calls('get_series'), 1)
+
+    def test_sync_delta(self):
+        """测试只请求最后一个观测日期之后的数据"""
+        self.collector.sync_series('CPI')
+        self.append_observations([12.0, 13.0])
+
+        self.assertEqual(self.collector.sync_series('CPI'), 2)
+        self.assertEqual(self.fred.observation_starts[-1], pd.Timestamp('2024-12-02'))
+        df = self.db.get_series_data('CPI')
+        self.assertEqual(len(df), 14)
+        self.assertEqual(df['value'].iloc[-1], 13.0)
+        self.assertEqual(self.db.get_series_metadata('CPI')['last_observation'], '2025-02-01')
+
+    def test_sync_revisions(self):
+        """测试同步上次同步后发布的修订值"""
+        self.collector.sync_series('CPI')
+        self.fred.releases = pd.DataFrame({
+            'date': pd.to_datetime(['2024-05-01', '2024-06-01', '2024-06-01']),
+            'realtime_start': pd.to_datetime(['2024-06-10', '2024-12-20', '2025-01-15']),
+            'value': [40.0, 50.0, 55.0]
+        })
+        self.append_observations([12.0])
+
+        self.assertEqual(self.collector.sync_series('CPI', revisions=True), 2)
+        df = self.db.get_series_data('CPI')
+        self.assertEqual(df.loc['2024-06-01', 'value'], 55.0)
+        self.assertEqual(df.loc['2024-05-01', 'value'], 4.0)
+        self.assertEqual(len(df), 13)
+
+    def test_stale_cache(self):
+        """测试数据库中的数据超过检查间隔后先增量同步"""
+        self.collector.get_series_data('CPI')
+        self.append_observations([12.0])
+
+        self.assertEqual(len(self.collector.get_series_data('CPI')), 12)
+        self.assertEqual(self.count_calls('get_series_info'), 1)
+
+        self.collector.sync_max_age = timedelta(0)
+        self.assertEqual(len(self.collector.get_series_data('CPI')), 13)
+
+    def test_migrate_metadata(self):
+        """测试升级旧版本没有主键的元数据表"""
+        os.remove(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            pd.DataFrame([{'series_id': 'CPI', 'title': 'CPI title', 'units': 'Index',
+                           'frequency': 'Monthly', 'last_updated': '2024-01-01'}]).to_sql(
+                'series_metadata', conn, index=False)
+
+        db = Database(self.db_path)
+        db.save_series_metadata('CPI', {'last_observation': '2024-12-01'})
+        db.save_series_metadata('GDP', {'title': 'GDP title'})
+        self.assertEqual(db.get_series_metadata('CPI')['title'], 'CPI title')
+        self.assertEqual(db.get_series_metadata('CPI')['last_observation'], '2024-12-01')
+        self.assertEqual(db.get_series_metadata('GDP')['title'], 'GDP title')
+
+
+class TestFredReplay(unittest.TestCase):
+    def setUp(self):
+        """录制模拟 FRED API 的响应，使用不同的临时数据库对比回放结果"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.fixture_dir = os.path.join(self.tmpdir.name, 'fixtures')
+        self.fred = FakeFred(delay=0)
+        # fredapi 返回的系列信息是 pd.Series
+        get_series_info = self.fred.get_series_info
+        self.fred.get_series_info = lambda series_id: pd.Series(vars(get_series_info(series_id)))
+        self.fred.releases = pd.DataFrame({
+            'date': pd.to_datetime(['2024-11-01', '2024-11-01', '2024-12-01']),
+            'realtime_start': pd.to_datetime(['2024-12-10', '2025-01-10', '2025-01-10']),
+            'value': [10.0, 10.5, 11.0]
+        })
+
+    def collect(self, fred, name):
+        db = Database(os.path.join(self.tmpdir.name, f'{name}.db'))
+        self.addCleanup(db.close)
+        collector = FedDataCollector(db=db, max_requests_per_minute=10000, fred=fred)
+        collector.get_series_data('CPI', '2024-03-01', '2024-06-01', use_cache=False)
+        collector.sync_series('GDP')
+        return db
+
+    def test_record_and_replay(self):
+        """测试离线回放得到与录制时相同的数据"""
+        recorded = self.collect(FredRecorder(self.fred, self.fixture_dir), 'recorded')
+        replay = FredReplay(self.fixture_dir)
+        replayed = self.collect(replay, 'replayed')
+
+        for series_id in ['CPI', 'GDP']:
+            pd.testing.assert_frame_equal(replayed.get_series_data(series_id), recorded.get_series_data(series_id))
+            self.assertEqual(replayed.get_series_metadata(series_id)['title'], f"{series_id} title")
+        self.assertEqual(replay.stats(), {'get_series': 2, 'get_series_info': 2})
+
+        data = replay.get_series('GDP', '2024-05-01', '2024-07-01')
+        self.assertEqual(list(data), [4.0, 5.0, 6.0])
+        with self.assertRaises(ValueError):
+            replay.get_series('UNKNOWN')
+
+    def test_replay_releases(self):
+        """测试回放历史修订值时按请求的起始日期截断发布日期"""
+        recorder = FredRecorder(self.fred, self.fixture_dir)
+        recorder.get_series_all_releases('CPI', '2024-01-01')
+        releases = FredReplay(self.fixture_dir).get_series_all_releases('CPI', '2025-01-01', '2025-01-31')
+        self.assertEqual(len(releases), 3)
+        self.assertEqual(list(releases['realtime_start']),
+                         list(pd.to_datetime(['2025-01-01', '2025-01-10', '2025-01-10'])))
+        self.assertEqual(list(releases['value']), [10.0, 10.5, 11.0])
+
+
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        """使用临时数据库"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db = Database(os.path.join(self.tmpdir.name, 'fred.db'))
+        self.addCleanup(self.db.close)
+
+    def test_connection_per_thread(self):
+        """测试同一线程复用连接，不同线程使用各自的连接"""
+        conn = self.db._get_connection()
+        self.assertIs(self.db._get_connection(), conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db._get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+        # 已退出线程的连接在创建新连接时关闭
+        thread = threading.Thread(target=self.db._get_connection)
+        thread.start()
+        thread.join()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            other[0].execute("SELECT 1")
+
+    def test_read_during_write(self):
+        """测试写事务未提交时其他线程仍可读取"""
+        df = pd.DataFrame({'value': [1.0]}, index=pd.DatetimeIndex(['2024-01-01']))
+        self.db.save_series_data('A', df)
+        conn = self.db._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE economic_data SET value = 2.0")
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.db.get_series_data('A')['value'].iloc[0]))
+        thread.start()
+        thread.join(5)
+        conn.commit()
+        self.assertEqual(result, [1.0])
+
+    def test_overlapping_save(self):
+        """测试重复保存重叠的数据时覆盖原值"""
+        index = pd.date_range('2024-01-01', periods=10, freq='D')
+        self.db.save_series_data('A', pd.DataFrame({'value': range(10)}, index=index, dtype=float))
+        rows = self.db.save_series_data('A', pd.DataFrame({'value': [50.0, 60.0, float('nan')]}, index=index[-2:].append(
+            pd.DatetimeIndex(['2024-01-11']))))
+
+        self.assertEqual(rows, 3)
+        df = self.db.get_series_data('A')
+        self.assertEqual(len(df), 11)
+        self.assertEqual(df['value'].iloc[8], 50.0)
+        self.assertTrue(pd.isna(df['value'].iloc[-1]))
+        self.assertEqual(self.db.write_stats['rows'], 3)
+        self.assertGreater(self.db.write_stats['rows_per_second'], 0)
+
+    def test_metadata_upsert(self):
+        """测试保存元数据不影响其他系列"""
+        df = pd.DataFrame({'value': [1.0]}, index=pd.DatetimeIndex(['2024-01-01']))
+        self.db.save_series_data('A', df, {'series_id': 'A', 'title': 'A title', 'units': 'Percent'})
+        self.db.save_series_data('B', df, {'series_id': 'B', 'title': 'B title'})
+        self.db.save_series_data('A', df, {'title': 'A new title'})
+
+        self.assertEqual(self.db.get_series_metadata('A')['title'], 'A new title')
+        self.assertEqual(self.db.get_series_metadata('A')['units'], 'Percent')
+        self.assertEqual(self.db.get_series_metadata('B')['title'], 'B title')
+
+    def test_migrate_text_dates(self):
+        """测试旧版本以文本保存日期的表迁移为 epoch day"""
+        path = os.path.join(self.tmpdir.name, 'old.db')
+        with sqlite3.connect(path) as conn:
+            conn.execute('''
+                CREATE TABLE economic_data (
+                    series_id TEXT, date TEXT, value REAL, last_updated TEXT, PRIMARY KEY (series_id, date)
+                )
+            ''')
+            conn.executemany("INSERT INTO economic_data VALUES (?, ?, ?, ?)", [
+                ('A', '1969-12-31 00:00:00', 1.0, '2024-01-01T00:00:00'),
+                ('A', '2024-01-01 00:00:00', 2.0, '2024-02-01T00:00:00'),
+                ('B', '2024-01-01', 3.0, '2024-01-01T00:00:00'),
+            ])
+        conn.close()
+
+        db = Database(path)
+        self.addCleanup(db.close)
+        conn = db._get_connection()
+        self.assertEqual(conn.execute("SELECT date, value FROM economic_data WHERE series_id = 'A' ORDER BY date").fetchall(),
+                         [(-1, 1.0), (19723, 2.0)])
+        self.assertIn('WITHOUT ROWID', conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'economic_data'").fetchone()[0])
+
+        df = db.get_series_data('A', start_date='2000-01-01')
+        self.assertEqual(list(df.index), [pd.Timestamp('2024-01-01')])
+        self.assertEqual(df.index.name, 'date')
+        log = db.get_load_log('A')
+        self.assertEqual(log.iloc[0]['rows'], 2)
+        self.assertEqual(log.iloc[0]['loaded_at'], pd.Timestamp('2024-02-01'))
+        self.assertEqual(log.iloc[0]['first_date'], pd.Timestamp('1969-12-31'))
+
+    def test_load_log(self):
+        """测试每次写入记录一行写入日志"""
+        index = pd.date_range('2024-01-01', periods=3, freq='MS')
+        self.db.save_series_data('A', pd.DataFrame({'value': [1.0, 2.0, 3.0]}, index=index))
+        self.db.save_series_data('A', pd.DataFrame({'value': [4.0]}, index=index[-1:]))
+
+        log = self.db.get_load_log('A')
+        self.assertEqual(list(log['rows']), [3, 1])
+        self.assertEqual(list(log['last_date']), [index[-1], index[-1]])
+        self.assertEqual(self.db.get_last_observation('A'), index[-1])
+
+    def test_panel(self):
+        """测试一次查询得到多个系列的宽表"""
+        self.db.save_series_data('GDP', pd.DataFrame({'value': [1.0, 2.0, 3.0]},
+                                                     index=pd.to_datetime(['2024-01-01', '2024-04-01', '2024-07-01'])))
+        self.db.save_series_data('DGS10', pd.DataFrame({'value': [4.0, float('nan'), 4.2]},
+                                                       index=pd.to_datetime(['2024-03-29', '2024-04-01', '2024-04-02'])))
+
+        panel = self.db.get_panel(['DGS10', 'GDP', 'NONE'], start_date='2024-02-01')
+        self.assertEqual(list(panel.columns), ['DGS10', 'GDP', 'NONE'])
+        self.assertEqual(list(panel.index), list(pd.to_datetime(['2024-03-29', '2024-04-01', '2024-04-02', '2024-07-01'])))
+        self.assertEqual(panel.loc['2024-04-01', 'GDP'], 2.0)
+        self.assertTrue(panel['NONE'].isna().all())
+        pd.testing.assert_series_equal(panel['GDP'].dropna(), self.db.get_series_data('GDP', '2024-02-01')['value'],
+                                       check_names=False, check_freq=False)
+
+    def test_panel_resample(self):
+        """测试按统一日历前向填充不同频率的系列"""
+        self.db.save_series_data('GDP', pd.DataFrame({'value': [1.0, 2.0]},
+                                                     index=pd.to_datetime(['2024-01-01', '2024-04-01'])))
+        self.db.save_series_data('DGS10', pd.DataFrame({'value': [4.0, float('nan'), 4.2]},
+                                                       index=pd.to_datetime(['2024-03-29', '2024-04-01', '2024-04-02'])))
+
+        panel = self.db.get_panel(['GDP', 'DGS10'], '2024-03-01', '2024-05-01', freq='MS')
+        self.assertEqual(list(panel.index), list(pd.date_range('2024-03-01', '2024-05-01', freq='MS')))
+        self.assertEqual(list(panel['GDP']), [1.0, 2.0, 2.0])
+        self.assertTrue(pd.isna(panel['DGS10'].iloc[0]))
+        self.assertEqual(list(panel['DGS10'].iloc[1:]), [4.0, 4.2])
+
+        # 开始日期之前只读取每个系列最后一个非空值用于前向填充
+        self.db.save_series_data('DGS10', pd.DataFrame({'value': [float('nan')]}, index=pd.DatetimeIndex(['2024-04-03'])))
+        panel = self.db.get_panel(['GDP', 'DGS10'], '2024-04-10', '2024-04-12', freq='D')
+        self.assertEqual(list(panel['GDP']), [2.0, 2.0, 2.0])
+        self.assertEqual(list(panel['DGS10']), [4.2, 4.2, 4.2])
+
+    def save_history(self, db):
+        index = pd.date_range('2024-01-01', periods=3, freq='MS')
+        db.save_series_data('A', pd.DataFrame({'value': [1.0, 2.0, 4.0]}, index=index), {'title': 'A title'})
+        db.save_series_data('B', pd.DataFrame({'value': [10.0]}, index=index[:1]))
+
+    def test_latest_summary(self):
+        """测试一次查询得到各系列的最新值和变化"""
+        self.save_history(self.db)
+        summary = self.db.get_latest_summary(['B', 'A', 'C'])
+
+        self.assertEqual(list(summary['series_id']), ['B', 'A'])
+        a = summary.iloc[1]
+        self.assertEqual(a['title'], 'A title')
+        self.assertEqual(a['latest_date'], pd.Timestamp('2024-03-01'))
+        self.assertEqual(a['latest_value'], 4.0)
+        self.assertEqual(a['change'], 2.0)
+        self.assertEqual(a['pct_change'], 100.0)
+        self.assertEqual(summary.iloc[0]['title'], 'B')
+        self.assertTrue(pd.isna(summary.iloc[0]['change']))
+
+    def test_materialized_summary(self):
+        """测试摘要表在缺失时构建并在写入时增量更新"""
+        self.save_history(self.db)
+        db = Database(self.db.db_path, materialize_summary=True)
+        self.addCleanup(db.close)
+        pd.testing.assert_frame_equal(db.get_latest_summary(), self.db.get_latest_summary())
+
+        db.save_series_data('A', pd.DataFrame({'value': [5.0]}, index=pd.DatetimeIndex(['2024-04-01'])))
+        summary = db.get_latest_summary(['A'])
+        self.assertEqual(summary.iloc[0]['latest_value'], 5.0)
+        self.assertEqual(summary.iloc[0]['change'], 1.0)
+        pd.testing.assert_frame_equal(summary, self.db.get_latest_summary(['A']))
+
+        # 再次打开时沿用已有的摘要表，不从 economic_data 重建
+        with db._get_connection() as conn:
+            conn.execute("UPDATE series_summary SET latest_value = 6.0 WHERE series_id = 'A'")
+        reopened = Database(self.db.db_path, materialize_summary=True)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get_latest_summary(['A']).iloc[0]['latest_value'], 6.0)
+
+        # 未启用的实例打开和写入时同样维护摘要表，与启用的实例可以共用数据库
+        writer = Database(self.db.db_path)
+        self.addCleanup(writer.close)
+        writer.save_series_data('A', pd.DataFrame({'value': [7.0]}, index=pd.DatetimeIndex(['2024-05-01'])))
+        summary = reopened.get_latest_summary(['A'])
+        self.assertEqual(summary.iloc[0]['latest_value'], 7.0)
+        self.assertEqual(summary.iloc[0]['change'], 2.0)
+        pd.testing.assert_frame_equal(summary, writer.get_latest_summary(['A']))
+
+
 def main():
     unittest.main()
 
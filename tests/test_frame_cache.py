@@ -0,0 +1,119 @@
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+import pandas as pd
+from unittest import mock
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.models.frame_cache import FrameCache
+from src.models.database import Database
+
+
+def make_series(periods=100, start='2024-01-01'):
+    index = pd.date_range(start, periods=periods, freq='D', name='date')
+    return pd.DataFrame({'value': range(periods)}, index=index, dtype=float)
+
+
+class TestFrameCache(unittest.TestCase):
+    def test_range_containment(self):
+        """测试从已缓存的更大范围切片返回子范围"""
+        cache = FrameCache(10 * 1024 * 1024)
+        df = make_series()
+        cache.put('A', None, None, df)
+
+        sub = cache.get('A', '2024-01-10', '2024-01-19')
+        pd.testing.assert_frame_equal(sub, df.loc['2024-01-10':'2024-01-19'])
+        self.assertIsNone(cache.get('B', '2024-01-10', '2024-01-19'))
+
+        cache.put('C', '2024-01-10', '2024-01-31', df.loc['2024-01-10':'2024-01-31'])
+        self.assertEqual(len(cache.get('C', '2024-01-15', '2024-01-20')), 6)
+        self.assertIsNone(cache.get('C', None, '2024-01-20'))
+        self.assertIsNone(cache.get('C', '2024-01-15', None))
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def test_returns_copy(self):
+        """测试修改返回的数据不影响缓存"""
+        cache = FrameCache(10 * 1024 * 1024)
+        cache.put('A', None, None, make_series())
+        df = cache.get('A')
+        df.iloc[0, 0] = -1.0
+        self.assertEqual(cache.get('A').iloc[0, 0], 0.0)
+
+    def test_lru_eviction(self):
+        """测试超过字节上限时淘汰最久未使用的数据"""
+        size = int(make_series().memory_usage(index=True, deep=True).sum())
+        cache = FrameCache(size * 2)
+        cache.put('A', None, None, make_series())
+        cache.put('B', None, None, make_series())
+        cache.get('A')
+        cache.put('C', None, None, make_series())
+
+        self.assertIsNotNone(cache.get('A'))
+        self.assertIsNone(cache.get('B'))
+        self.assertLessEqual(cache.stats()['bytes'], size * 2)
+
+        cache.put('D', None, None, make_series(periods=1000))  # 超过上限的数据不缓存
+        self.assertIsNone(cache.get('D'))
+
+    def test_stale_put_skipped(self):
+        """测试读取期间系列失效时旧数据不写入缓存"""
+        cache = FrameCache(10 * 1024 * 1024)
+        generation = cache.generation('A')
+        cache.invalidate('A')
+        cache.put('A', None, None, make_series(), generation)
+        self.assertIsNone(cache.get('A'))
+
+        generation = cache.generation('A')
+        cache.invalidate('B')  # 其他系列失效不影响
+        cache.put('A', None, None, make_series(), generation)
+        self.assertIsNotNone(cache.get('A'))
+
+        generation = cache.generation('A')
+        cache.invalidate()
+        cache.put('A', None, None, make_series(), generation)
+        self.assertIsNone(cache.get('A'))
+
+    def test_database_cache_concurrent_write(self):
+        """测试读取数据库和写入缓存之间发生写入时不缓存旧数据"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = Database(os.path.join(tmpdir, 'fred.db'), frame_cache_bytes=10 * 1024 * 1024)
+            db.save_series_data('A', make_series())
+            read_sql_query = pd.read_sql_query
+
+            def read_then_write(*args, **kwargs):
+                df = read_sql_query(*args, **kwargs)
+                db.save_series_data('A', make_series(periods=1) + 50)  # 模拟其他线程在读取后写入
+                return df
+
+            with mock.patch('src.models.database.pd.read_sql_query', side_effect=read_then_write):
+                self.assertEqual(db.get_series_data('A')['value'].iloc[0], 0.0)
+            self.assertEqual(db.get_series_data('A')['value'].iloc[0], 50.0)
+            db.close()
+
+    def test_database_cache(self):
+        """测试数据库读取经过缓存，写入时失效"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db = Database(os.path.join(tmpdir, 'fred.db'), frame_cache_bytes=10 * 1024 * 1024)
+            db.save_series_data('A', make_series())
+
+            full = db.get_series_data('A')
+            sub = db.get_series_data('A', '2024-02-01', '2024-02-29')
+            self.assertEqual(len(sub), 29)
+            pd.testing.assert_frame_equal(sub, full.loc['2024-02-01':'2024-02-29'], check_freq=False)
+            self.assertEqual(db.cache_stats()['hits'], 1)
+            self.assertEqual(db.cache_stats()['misses'], 1)
+
+            db.save_series_data('A', make_series(periods=1, start='2024-02-01') + 50)
+            self.assertEqual(db.get_series_data('A', '2024-02-01', '2024-02-01')['value'].iloc[0], 50.0)
+            self.assertEqual(db.cache_stats()['misses'], 2)
+            db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from src.collectors.indicators import IndicatorEngine
+
+ALL_INDICATORS = ['SMA5', 'SMA20', 'EMA12', 'RSI', 'MACD', 'BB20', 'ATR14', 'VWAP']
+
+
+def make_bars(periods=300, seed=0, start='2024-01-02 09:30', freq='30min'):
+    """生成随机游走K线数据"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    high = close + rng.uniform(0, 1, periods)
+    low = close - rng.uniform(0, 1, periods)
+    return pd.DataFrame({
+        'Open': close + rng.normal(0, 0.2, periods), 'High': high, 'Low': low, 'Close': close,
+        'Volume': rng.integers(100, 1000, periods).astype(float),
+    }, index=pd.date_range(start, periods=periods, freq=freq))
+
+
+def wilder(values, period):
+    """逐根K线计算的 Wilder 平滑，作为对照"""
+    out = np.full(len(values), np.nan)
+    valid = [i for i, v in enumerate(values) if not np.isnan(v)]
+    if len(valid) < period:
+        return out
+    seed = valid[period - 1]
+    out[seed] = np.mean([values[i] for i in valid[:period]])
+    for i in range(seed + 1, len(values)):
+        out[i] = out[i - 1] + (values[i] - out[i - 1]) / period
+    return out
+
+
+class TestIndicatorEngine(unittest.TestCase):
+    def setUp(self):
+        """测试开始前的设置"""
+        self.df = make_bars()
+
+    def test_against_reference(self):
+        """测试各指标与 pandas 逐项计算结果一致"""
+        result = IndicatorEngine(ALL_INDICATORS).compute(self.df)
+        close = self.df['Close']
+
+        np.testing.assert_allclose(result['SMA20'], close.rolling(20).mean(), equal_nan=True)
+        np.testing.assert_allclose(result['EMA12'], close.ewm(span=12, adjust=False).mean())
+
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        np.testing.assert_allclose(result['MACD'], macd)
+        np.testing.assert_allclose(result['MACD_signal'], macd.ewm(span=9, adjust=False).mean())
+
+        std = close.rolling(20).std(ddof=0)
+        np.testing.assert_allclose(result['BB20_upper'], close.rolling(20).mean() + 2 * std, equal_nan=True)
+
+        change = close.diff().to_numpy()
+        gain = wilder(np.where(np.isnan(change), np.nan, np.maximum(change, 0)), 14)
+        loss = wilder(np.where(np.isnan(change), np.nan, np.maximum(-change, 0)), 14)
+        np.testing.assert_allclose(result['RSI'], 100 - 100 / (1 + gain / loss), equal_nan=True)
+
+        prev_close = close.shift()
+        true_range = pd.concat([self.df['High'] - self.df['Low'], (self.df['High'] - prev_close).abs(),
+                                (self.df['Low'] - prev_close).abs()], axis=1).max(axis=1)
+        np.testing.assert_allclose(result['ATR14'], wilder(true_range.to_numpy(), 14), equal_nan=True)
+
+        typical = (self.df['High'] + self.df['Low'] + self.df['Close']) / 3
+        day = self.df.index.normalize()
+        vwap = (typical * self.df['Volume']).groupby(day).cumsum() / self.df['Volume'].groupby(day).cumsum()
+        np.testing.assert_allclose(result['VWAP'], vwap)
+
+    def test_panel_matches_single(self):
+        """测试面板计算与逐个品种计算结果一致，品种的时间索引可以不同"""
+        panel = {'AAPL': self.df, 'MSFT': make_bars(seed=1).iloc[50:], 'GOOGL': make_bars(seed=2).iloc[::2]}
+        results = IndicatorEngine(ALL_INDICATORS).compute(panel)
+        for symbol, df in panel.items():
+            expected = IndicatorEngine(ALL_INDICATORS).compute(df)
+            pd.testing.assert_frame_equal(results[symbol], expected, check_exact=False, rtol=1e-9)
+
+    def test_incremental_update(self):
+        """测试增量计算新K线的结果与完整重新计算一致"""
+        panel = {'AAPL': self.df, 'MSFT': make_bars(seed=1)}
+        full = IndicatorEngine(ALL_INDICATORS).compute(panel)
+
+        engine = IndicatorEngine(ALL_INDICATORS)
+        engine.compute({symbol: df.iloc[:200] for symbol, df in panel.items()})
+        parts = [engine.update({symbol: df.iloc[200:201] for symbol, df in panel.items()}),
+                 engine.update({symbol: df.iloc[201:] for symbol, df in panel.items()})]
+        for symbol in panel:
+            incremental = pd.concat([part[symbol] for part in parts])
+            pd.testing.assert_frame_equal(incremental, full[symbol].iloc[200:], check_exact=False, rtol=1e-9)
+
+        with self.assertRaises(ValueError):
+            engine.update({'AAPL': self.df.iloc[-1:]})
+
+    def test_late_symbol_update(self):
+        """测试面板中某个品种的K线晚于其他品种到达时仍可增量计算"""
+        panel = {'AAPL': self.df, 'MSFT': make_bars(seed=1)}
+        full = IndicatorEngine(ALL_INDICATORS).compute(panel)
+
+        engine = IndicatorEngine(ALL_INDICATORS)
+        # 第 173 根K线是新的一天，MSFT 前一天最后两根K线在 AAPL 进入新的一天之后才到达
+        engine.compute({'AAPL': self.df.iloc[:174], 'MSFT': panel['MSFT'].iloc[:171]})
+        parts = [engine.update({'AAPL': self.df.iloc[174:175], 'MSFT': panel['MSFT'].iloc[171:173]}),
+                 engine.update({'AAPL': self.df.iloc[175:], 'MSFT': panel['MSFT'].iloc[173:]})]
+        pd.testing.assert_frame_equal(pd.concat([part['AAPL'] for part in parts]), full['AAPL'].iloc[174:],
+                                      check_exact=False, rtol=1e-9)
+        pd.testing.assert_frame_equal(pd.concat([part['MSFT'] for part in parts]), full['MSFT'].iloc[171:],
+                                      check_exact=False, rtol=1e-9)
+
+        with self.assertRaises(ValueError):
+            engine.update({'MSFT': panel['MSFT'].iloc[-1:]})
+
+    def test_invalid_indicator(self):
+        """测试不支持的指标名称"""
+        for name in ('SMA', 'FOO10', 'MACD12'):
+            with self.assertRaises(ValueError):
+                IndicatorEngine([name])
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
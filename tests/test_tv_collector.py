@@ -3,15 +3,21 @@ import pandas as pd
 from datetime import datetime, timedelta
 import os
 import sys
+import tempfile
+import time
 from pathlib import Path
+from unittest import mock
 
 # 添加项目根目录到 Python 路径
 current_dir = Path(__file__).parent
 project_root = current_dir.parent
 sys.path.append(str(project_root))
+sys.path.append(str(project_root / 'src'))  # tvDatafeed 包内使用 import tvDatafeed
 
 from src.collectors.tv_collector import TvDataCollector
-from src.tvDatafeed import Interval
+from src.collectors.bar_store import PYARROW_AVAILABLE
+from src.tvDatafeed import Interval, TvDatafeed, TvReplayServer
+from src.tvDatafeed.replay import WEBSOCKETS_AVAILABLE
 
 class TestTvDataCollector(unittest.TestCase):
     def setUp(self):
@@ -62,6 +68,115 @@ class TestTvDataCollector(unittest.TestCase):
         for indicator in indicators:
             self.assertIn(indicator, df_with_indicators.columns)
 
+def fake_hist(symbol, exchange, interval, n_bars):
+    """模拟 TvDatafeed.get_hist，返回截至今天的 n_bars 根日线"""
+    index = pd.date_range(end=pd.Timestamp.now().normalize(), periods=n_bars, freq='D', name='datetime')
+    close = [float(ts.toordinal()) for ts in index]
+    return pd.DataFrame({'symbol': f"{exchange}:{symbol}", 'open': close, 'high': close,
+                         'low': close, 'close': close, 'volume': 100.0}, index=index)
+
+
+@unittest.skipUnless(PYARROW_AVAILABLE, "需要 pyarrow")
+class TestIncrementalFetch(unittest.TestCase):
+    def setUp(self):
+        """使用模拟的 TvDatafeed 和临时K线存储"""
+        patcher = mock.patch('src.collectors.tv_collector.TvDatafeed')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.collector = TvDataCollector(store_dir=self.tmpdir.name)
+        self.tv = self.collector.tv
+
+    def store_history(self, symbol, days_behind):
+        """存储截至 days_behind 天前的 100 根日线，并使其过期"""
+        df = fake_hist(symbol, 'NASDAQ', Interval.in_daily, 100 + days_behind).iloc[:-days_behind]
+        self.collector.store.write(self.collector._process_dataframe(df), 'NASDAQ', symbol, '1D')
+        stale = time.time() - 3 * 86400
+        for _, _, path in self.collector.store._parts('NASDAQ', symbol, '1D'):
+            os.utime(path, (stale, stale))
+
+    def test_delta_fetch(self):
+        """测试只获取缺失的K线并与已存储数据合并"""
+        self.store_history('AAPL', 3)
+        self.tv.get_hist.side_effect = fake_hist
+
+        df = self.collector.get_symbol_data('AAPL', n_bars=100)
+        self.assertEqual(self.tv.get_hist.call_args.kwargs['n_bars'], 3 + 2)
+        self.assertEqual(len(df), 100)
+        self.assertEqual(df.index[-1], pd.Timestamp.now().normalize())
+        self.assertFalse(df.index.duplicated().any())
+        self.assertEqual(len(self.collector.store.read('NASDAQ', 'AAPL', '1D')), 103)
+
+    def test_gap_refetch(self):
+        """测试增量数据与已存储数据不衔接时重新获取完整数据"""
+        self.store_history('AAPL', 3)
+        self.tv.get_hist.side_effect = lambda symbol, exchange, interval, n_bars: \
+            fake_hist(symbol, exchange, interval, n_bars).iloc[-2:] if n_bars < 100 else fake_hist(symbol, exchange, interval, n_bars)
+
+        df = self.collector.get_symbol_data('AAPL', n_bars=100)
+        self.assertEqual([c.kwargs['n_bars'] for c in self.tv.get_hist.call_args_list], [5, 100])
+        self.assertEqual(len(df), 100)
+
+    def test_hole_closed(self):
+        """测试已存储数据中间有缺口时获取完整数据并补齐缺口"""
+        history = fake_hist('AAPL', 'NASDAQ', Interval.in_daily, 103).iloc[:-3]
+        for part in (history.iloc[:40], history.iloc[50:]):
+            self.collector.store.write(self.collector._process_dataframe(part), 'NASDAQ', 'AAPL', '1D')
+        stale = time.time() - 3 * 86400
+        for _, _, path in self.collector.store._parts('NASDAQ', 'AAPL', '1D'):
+            os.utime(path, (stale, stale))
+        self.tv.get_hist.side_effect = fake_hist
+
+        df = self.collector.get_symbol_data('AAPL', n_bars=100)
+        self.assertEqual(self.tv.get_hist.call_args.kwargs['n_bars'], 100)  # 已存储的K线不足 100 根
+        self.assertEqual(df.index.name, 'date')
+        stored = self.collector.store.read('NASDAQ', 'AAPL', '1D')
+        self.assertEqual(len(stored), 103)
+        self.assertTrue((stored.index.to_series().diff().dropna() == pd.Timedelta(days=1)).all())
+
+        # 缺口补齐后只需增量获取
+        for _, _, path in self.collector.store._parts('NASDAQ', 'AAPL', '1D'):
+            os.utime(path, (stale, stale))
+        self.collector.get_symbol_data('AAPL', n_bars=100)
+        self.assertEqual(self.tv.get_hist.call_args.kwargs['n_bars'], 2)
+
+    def test_multiple_symbols_batched_by_delta(self):
+        """测试多个品种按需获取的K线数量分批获取"""
+        self.store_history('AAPL', 3)
+        self.store_history('MSFT', 3)
+
+        def get_hist_many(symbols, interval, n_bars):
+            return {s: fake_hist(s.split(':')[1], 'NASDAQ', interval, n_bars) for s in symbols}
+        self.tv.get_hist_many.side_effect = get_hist_many
+
+        symbols = [{"symbol": s, "exchange": "NASDAQ"} for s in ('AAPL', 'MSFT', 'GOOGL')]
+        results = self.collector.get_multiple_symbols(symbols, n_bars=100)
+        calls = sorted((c.kwargs['n_bars'], sorted(c.kwargs['symbols'])) for c in self.tv.get_hist_many.call_args_list)
+        self.assertEqual(calls, [(5, ['NASDAQ:AAPL', 'NASDAQ:MSFT']), (100, ['NASDAQ:GOOGL'])])
+        self.assertEqual({key: len(df) for key, df in results.items()},
+                         {'NASDAQ_AAPL': 100, 'NASDAQ_MSFT': 100, 'NASDAQ_GOOGL': 100})
+
+
+@unittest.skipUnless(WEBSOCKETS_AVAILABLE, "需要 websockets")
+class TestReplayCollector(unittest.TestCase):
+    def setUp(self):
+        """使用本地 TradingView websocket 替身和临时K线存储"""
+        self.server = TvReplayServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.collector = TvDataCollector(store_dir=self.tmpdir.name, tv=TvDatafeed(ws_url=self.server.url))
+
+    def test_get_multiple_symbols(self):
+        """测试采集器离线获取多个品种"""
+        symbols = [{"symbol": s, "exchange": "NASDAQ"} for s in ('AAPL', 'MSFT')]
+        results = self.collector.get_multiple_symbols(symbols, n_bars=50, use_cache=False)
+        self.assertEqual({key: len(df) for key, df in results.items()}, {'NASDAQ_AAPL': 50, 'NASDAQ_MSFT': 50})
+        self.assertEqual(self.server.stats["series"], 2)
+
+
 def main():
     unittest.main()
 
@@ -0,0 +1,757 @@
+import unittest
+import asyncio
+import collections
+import datetime
+import json
+import numpy as np
+import os
+import pandas as pd
+import queue
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+# 添加 src 目录到 Python 路径 (tvDatafeed 包内使用 import tvDatafeed)
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root / 'src'))
+
+from tvDatafeed import indicators, AsyncDispatcher, Consumer, ConsumerPool, Seis, SymbolCache, main, protocol, session, async_datafeed, TvDatafeed, TvDatafeedLive, AsyncTvDatafeed, Interval, TvReplayServer, replay, datafeed
+
+
+class FakeWebSocket:
+    """模拟 TradingView websocket，对每个 create_series 返回 n_bars 根K线"""
+
+    def __init__(self, base_time=1700000000, step=86400):
+        self.base_time = base_time
+        self.step = step
+        self.sent = []
+        self.incoming = queue.Queue()
+        self.closed = False
+        self.incoming.put(protocol.prepend_header('{"session_id":"test"}'))
+
+    def send(self, message):
+        for payload in protocol.split_frames(message):
+            self.sent.append(payload)
+            if protocol.is_heartbeat(payload):
+                continue
+            msg = json.loads(payload)
+            if msg["m"] == "create_series":
+                cs, series_id, n_bars = msg["p"][0], msg["p"][1], msg["p"][5]
+                s = [{"i": i, "v": [self.base_time + i * self.step, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 100.0]}
+                     for i in range(n_bars)]
+                self.respond(
+                    protocol.create_message("timescale_update", [cs, {series_id: {"s": s}}])
+                    + protocol.create_message("series_completed", [cs, series_id, "streaming", series_id]))
+
+    def respond(self, message):
+        self.incoming.put(message)
+
+    def recv(self):
+        message = self.incoming.get()
+        if message is None:
+            raise ConnectionError("closed")
+        return message
+
+    def close(self):
+        self.closed = True
+        self.incoming.put(None)
+
+
+class TestTvSession(unittest.TestCase):
+    def setUp(self):
+        self.ws = FakeWebSocket()
+        patcher = mock.patch.object(session, 'create_connection', return_value=self.ws)
+        self.create_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tv_session = session.TvSession("token", "wss://test", "{}")
+        self.addCleanup(self.tv_session.close)
+
+    def test_split_frames(self):
+        """测试多帧消息拆分"""
+        raw = protocol.create_message("a", [1]) + "~m~4~m~~h~1"
+        self.assertEqual(protocol.split_frames(raw), ['{"m":"a","p":[1]}', '~h~1'])
+
+    def test_one_handshake_for_many_requests(self):
+        """测试多次请求只握手一次，每次请求使用独立的 series id"""
+        for _ in range(3):
+            bars = self.tv_session.fetch("NASDAQ:AAPL", "1D", 3, timeout=5)
+            self.assertEqual(len(bars), 3)
+
+        self.create_connection.assert_called_once()
+        funcs = [json.loads(p)["m"] for p in self.ws.sent if not protocol.is_heartbeat(p)]
+        self.assertEqual(funcs.count("set_auth_token"), 1)
+        self.assertEqual(funcs.count("create_series"), 3)
+        series_ids = [json.loads(p)["p"][1] for p in self.ws.sent
+                      if not protocol.is_heartbeat(p) and json.loads(p)["m"] == "create_series"]
+        self.assertEqual(series_ids, ["s1", "s2", "s3"])
+
+    def test_heartbeat_echo(self):
+        """测试心跳回复"""
+        self.tv_session.connect()
+        self.ws.incoming.put("~m~4~m~~h~7")
+        self.tv_session.fetch("NASDAQ:AAPL", "1D", 1, timeout=5)
+        self.assertIn("~h~7", self.ws.sent)
+
+    def test_reconnect(self):
+        """测试连接断开后自动重连"""
+        self.tv_session.fetch("NASDAQ:AAPL", "1D", 1, timeout=5)
+        new_ws = FakeWebSocket()
+        self.create_connection.return_value = new_ws
+        self.ws.incoming.put(None)  # 模拟连接断开
+
+        bars = self.tv_session.fetch("NASDAQ:MSFT", "1D", 2, timeout=5)
+        self.assertEqual(len(bars), 2)
+        self.assertEqual(self.create_connection.call_count, 2)
+
+    def test_reconnect_send_failure(self):
+        """测试重连后重发请求失败时再次重连，请求最终完成"""
+        self.ws.respond = lambda message: None  # 第一个连接不返回数据
+        req = self.tv_session.request("NASDAQ:AAPL", "1D", 2)
+        failing = FakeWebSocket()
+
+        def send(message):
+            if "create_series" in message:
+                raise ConnectionError("dropped")
+            failing.sent.append(message)
+
+        failing.send = send
+        new_ws = FakeWebSocket()
+        self.create_connection.side_effect = [failing, new_ws]
+        self.ws.incoming.put(None)  # 模拟连接断开
+
+        self.assertEqual(len(self.tv_session.wait(req, 5)), 2)
+        self.assertTrue(failing.closed)
+        self.assertEqual(self.create_connection.call_count, 3)
+
+    def test_reader_failure(self):
+        """测试读取线程异常退出时标记为断开并使等待中的请求失败"""
+        self.ws.respond = lambda message: None
+        req = self.tv_session.request("NASDAQ:AAPL", "1D", 2)
+        with mock.patch.object(self.tv_session, '_dispatch', side_effect=RuntimeError("boom")):
+            self.ws.incoming.put(protocol.create_message("du", ["cs", {}]))
+            self.assertIsNone(self.tv_session.wait(req, 5))
+        self.assertTrue(req.done.is_set())
+        self.assertFalse(self.tv_session.connected)
+        self.assertTrue(self.ws.closed)
+
+    def test_persistent_get_hist_timeout(self):
+        """测试持久连接模式下服务器无响应时 get_hist 超时返回"""
+        self.ws.respond = lambda message: None
+        tv = TvDatafeed(persistent=True)
+        self.addCleanup(tv.close)
+        tv._TvDatafeed__ws_timeout = 0.2
+        started = time.monotonic()
+        self.assertIsNone(tv.get_hist("AAPL", "NASDAQ"))
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_bars_to_df(self):
+        """测试K线数据转换为 DataFrame"""
+        bars = self.tv_session.fetch("NASDAQ:AAPL", "1D", 3, timeout=5)
+        df = protocol.bars_to_df(bars, "NASDAQ:AAPL")
+        self.assertEqual(list(df.columns), ["symbol", "open", "high", "low", "close", "volume"])
+        self.assertEqual(len(df), 3)
+
+
+class TestProtocol(unittest.TestCase):
+    def test_frame_decoder_partial(self):
+        """测试跨消息的不完整帧"""
+        raw = protocol.create_message("a", [1]) + protocol.create_message("b", [2])
+        decoder = protocol.FrameDecoder()
+        self.assertEqual(decoder.feed(raw[:25]), ['{"m":"a","p":[1]}'])
+        self.assertEqual(decoder.feed(raw[25:]), ['{"m":"b","p":[2]}'])
+
+    def test_series_buffer(self):
+        """测试列式K线缓冲区：扩容、缺失成交量和本地时间索引"""
+        buffer = protocol.SeriesBuffer(2)
+        buffer.extend([{"i": 0, "v": [1700000000, 1, 2, 0.5, 1.5, 10]},
+                       {"i": 1, "v": [1700086400, 2, 3, 1.5, 2.5, None]}])
+        buffer.extend([{"i": 2, "v": [1700172800, 3, 4, 2.5, 3.5]}])
+        df = buffer.to_df("NASDAQ:AAPL")
+
+        self.assertEqual(len(df), 3)
+        self.assertEqual(df.index.name, "datetime")
+        self.assertEqual(df.index[0].to_pydatetime(), datetime.datetime.fromtimestamp(1700000000))
+        self.assertEqual(list(df["volume"]), [10.0, 0.0, 0.0])
+        self.assertEqual(list(df["close"]), [1.5, 2.5, 3.5])
+        self.assertIsNone(protocol.SeriesBuffer().to_df("NASDAQ:AAPL"))
+
+
+class TestGetHistMany(unittest.TestCase):
+    def setUp(self):
+        self.ws = FakeWebSocket()
+        patcher = mock.patch.object(session, 'create_connection', return_value=self.ws)
+        self.create_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_hist_many(self):
+        """测试多个品种通过同一连接批量获取"""
+        tv = TvDatafeed()
+        symbols = [f"SYM{i}" for i in range(20)] + ["NYSE:IBM"]
+        results = tv.get_hist_many(symbols, exchange="NASDAQ", interval=Interval.in_daily,
+                                   n_bars=5, batch_size=8, timeout=5)
+
+        self.assertEqual(len(results), 21)
+        self.assertIn("NASDAQ:SYM0", results)
+        self.assertIn("NYSE:IBM", results)
+        self.assertEqual(len(results["NYSE:IBM"]), 5)
+        self.create_connection.assert_called_once()
+        self.assertTrue(self.ws.closed)  # 非持久模式下用完即关闭
+
+    def test_get_hist_many_deadline(self):
+        """测试超时时间对整个调用生效，无响应的品种不会逐个等待"""
+        self.ws.respond = lambda message: None
+        tv = TvDatafeed()
+        started = time.monotonic()
+        results = tv.get_hist_many([f"SYM{i}" for i in range(20)], exchange="NASDAQ",
+                                   batch_size=8, timeout=0.3)
+        self.assertEqual(results, {})
+        self.assertLess(time.monotonic() - started, 2)
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.ws = FakeWebSocket()
+        patcher = mock.patch.object(session, 'create_connection', return_value=self.ws)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_closed_bars_pushed_to_consumer(self):
+        """测试流式模式下收盘K线直接推送给 Consumer，订阅前已收盘的K线不推送"""
+        tv = TvDatafeedLive(streaming=True)
+        self.addCleanup(tv.del_tvdatafeed)
+        received = queue.Queue()
+
+        with mock.patch.object(tv, 'search_symbol', return_value=[{'symbol': 'AAPL', 'exchange': 'NASDAQ'}]):
+            seis = tv.new_seis('AAPL', 'NASDAQ', Interval.in_1_minute)
+        seis.new_consumer(lambda seis, data: received.put(data))
+
+        # 初始快照的两根K线只用于记录正在形成的K线；之后每出现一根新K线，上一根收盘
+        sub = tv._subscriptions[('AAPL', 'NASDAQ', '1')]
+        for i, t in enumerate((1700172800, 1700259200)):
+            self.ws.respond(protocol.create_message("du", [
+                "cs", {sub.series_id: {"s": [{"i": 2 + i, "v": [t, 3, 4, 2.5, 3.5 + i, 100.0]}]}}]))
+
+        first = received.get(timeout=5)
+        second = received.get(timeout=5)
+        self.assertEqual(first.index[0].to_pydatetime(), datetime.datetime.fromtimestamp(1700086400))
+        self.assertEqual(first["close"].iloc[0], 2.5)
+        self.assertEqual(first["symbol"].iloc[0], "NASDAQ:AAPL")
+        self.assertEqual(second["close"].iloc[0], 3.5)
+        self.assertTrue(received.empty())
+        self.assertIsNone(tv._main_thread)  # 无轮询主线程
+
+    def test_subscription_seed(self):
+        """测试快照不推送订阅前收盘的K线，重连后的快照推送断线期间收盘的K线"""
+        sub = session._Subscription("NASDAQ:AAPL", "1", False, "symbol_1", "s1", None)
+        bar = lambda t, close: {"i": 0, "v": [t, 1.0, 2.0, 0.5, close, 100.0]}
+
+        self.assertEqual(sub.seed([bar(60, 1.0), bar(120, 2.0)]), [])
+        self.assertEqual(sub.update([bar(120, 2.5)]), [])
+        self.assertEqual(sub.update([bar(180, 3.0)]), [bar(120, 2.5)])
+        # 断线期间 180 和 240 收盘
+        self.assertEqual(sub.seed([bar(180, 3.2), bar(240, 4.0), bar(300, 5.0)]),
+                         [bar(180, 3.2), bar(240, 4.0)])
+        self.assertEqual(sub.bar, bar(300, 5.0))
+
+    def test_block_policy_rejected(self):
+        """测试流式模式下不允许会阻塞读取线程的 block 策略"""
+        tv = TvDatafeedLive(streaming=True)
+        self.addCleanup(tv.del_tvdatafeed)
+        with mock.patch.object(tv, 'search_symbol', return_value=[{'symbol': 'AAPL', 'exchange': 'NASDAQ'}]):
+            seis = tv.new_seis('AAPL', 'NASDAQ', Interval.in_1_minute)
+        with self.assertRaises(ValueError):
+            seis.new_consumer(lambda seis, data: None, policy=Consumer.BLOCK)
+
+
+class TestMainLoop(unittest.TestCase):
+    def test_group_refresh_over_one_socket(self):
+        """测试到期的时间间隔组通过一个连接批量刷新并记录耗时"""
+        # 最新一根分钟K线刚开盘，上一根已收盘，因此新建的 Seis 立即到期
+        now = int(time.time()) // 60 * 60
+        sockets = []
+
+        def create_connection(*args, **kwargs):
+            sockets.append(FakeWebSocket(base_time=now - 60, step=60))
+            return sockets[-1]
+
+        patchers = [mock.patch.object(module, 'create_connection', side_effect=create_connection)
+                    for module in (main, session)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        tv = TvDatafeedLive()
+        self.addCleanup(tv.del_tvdatafeed)
+        received = []
+        delivered = threading.Event()
+
+        def callback(seis, data):
+            received.append(seis.symbol)
+            if len(received) == 3:
+                delivered.set()
+
+        symbols = ['AAPL', 'MSFT', 'GOOGL']
+        tv._main_thread = threading.Thread(name="main_loop", target=tv._main_loop)  # 全部添加后再启动主循环
+        with mock.patch.object(tv, 'search_symbol', side_effect=lambda symbol, exchange: [{'symbol': symbol, 'exchange': exchange}]):
+            for symbol in symbols:
+                tv.new_seis(symbol, 'NASDAQ', Interval.in_1_minute).new_consumer(callback)
+        tv._main_thread.start()
+
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(sorted(received), sorted(symbols))
+        self.assertEqual(len(sockets), 2)  # 新建时间间隔组一次，整组刷新一次
+        self.assertEqual(tv.cycle_stats['1']['seises'], 3)
+        self.assertEqual(tv.cycle_stats['1']['retries'], 0)
+
+
+    def test_retry_budget(self):
+        """测试无响应的时间间隔组在重试时间预算用完后停止，而不是按固定次数重试"""
+        now = int(time.time()) // 60 * 60
+        silent = FakeWebSocket(base_time=now - 60, step=60)
+        silent.respond = lambda message: None  # 刷新时不返回任何数据
+        patchers = [mock.patch.object(main, 'create_connection', side_effect=lambda *args, **kwargs: FakeWebSocket(base_time=now - 60, step=60)),
+                    mock.patch.object(session, 'create_connection', return_value=silent),
+                    mock.patch.object(datafeed, 'RETRY_TIMEOUT', 0.1),
+                    mock.patch.object(datafeed, 'RETRY_BUDGET_MAX', 0.5)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        tv = TvDatafeedLive()
+        self.addCleanup(tv.del_tvdatafeed)
+        with mock.patch.object(tv, 'search_symbol', return_value=[{'symbol': 'AAPL', 'exchange': 'NASDAQ'}]):
+            tv.new_seis('AAPL', 'NASDAQ', Interval.in_1_minute)
+
+        main_thread = tv._main_thread
+        main_thread.join(5)
+        self.assertFalse(main_thread.is_alive())  # 预算用完后主循环退出
+        self.assertLess(tv.cycle_stats['1']['seconds'], 2)
+        self.assertGreater(tv.cycle_stats['1']['retries'], 0)
+
+    def test_failing_block_consumer(self):
+        """测试缓冲区已满时回调抛出异常不会与推送数据的线程死锁"""
+        patcher = mock.patch.object(main, 'create_connection', side_effect=lambda *args, **kwargs: FakeWebSocket())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        tv = TvDatafeedLive()
+        self.addCleanup(tv.del_tvdatafeed)
+        tv._main_thread = threading.Thread(name="main_loop", target=tv._main_loop)  # 不启动主循环，直接推送数据
+        with mock.patch.object(tv, 'search_symbol', return_value=[{'symbol': 'AAPL', 'exchange': 'NASDAQ'}]):
+            seis = tv.new_seis('AAPL', 'NASDAQ', Interval.in_1_minute)
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def callback(seis, data):
+            started.set()
+            release.wait(5)
+            raise RuntimeError("callback failed")
+
+        consumer = seis.new_consumer(callback, policy=Consumer.BLOCK, maxsize=1)
+        tv._push(seis, 0)
+        self.assertTrue(started.wait(5))  # 第一项正在回调中
+        tv._push(seis, 1)  # 缓冲区已满
+
+        producer = threading.Thread(target=tv._push, args=(seis, 2))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())
+        release.set()  # 回调抛出异常，Consumer 从 Seis 中移除并唤醒生产者
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        consumer.join(5)
+        self.assertNotIn(consumer, seis.get_consumers())
+        tv._main_thread = None  # 主循环未启动，del_tvdatafeed 无需等待
+
+
+class TestSymbolCache(unittest.TestCase):
+    def setUp(self):
+        self.tv = mock.Mock()
+        self.tv.search_symbol.side_effect = lambda symbol, exchange: [{'symbol': symbol, 'exchange': exchange}]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_lookup_cached(self):
+        """测试缓存命中时不再搜索，未上市组合同样被缓存"""
+        cache = SymbolCache()
+        self.assertEqual(cache.lookup(self.tv, 'AAPL', 'NASDAQ')['symbol'], 'AAPL')
+        self.assertIsNotNone(cache.lookup(self.tv, 'AAPL', 'NASDAQ'))
+        self.tv.search_symbol.side_effect = lambda symbol, exchange: [{'symbol': 'OTHER', 'exchange': exchange}]
+        self.assertIsNone(cache.lookup(self.tv, 'NOPE', 'NASDAQ'))
+        self.assertIsNone(cache.lookup(self.tv, 'NOPE', 'NASDAQ'))
+        self.assertEqual(self.tv.search_symbol.call_count, 2)
+
+    def test_expiry_and_persistence(self):
+        """测试缓存保存后可被新实例读取，单次查询不写磁盘，过期条目重新搜索"""
+        path = str(Path(self.tmpdir.name) / 'symbols.json')
+        cache = SymbolCache(path)
+        cache.lookup(self.tv, 'AAPL', 'NASDAQ')
+        self.assertFalse(os.path.exists(path))
+        cache.close()
+        self.assertIsNotNone(SymbolCache(path).lookup(self.tv, 'AAPL', 'NASDAQ'))
+        self.assertEqual(self.tv.search_symbol.call_count, 1)
+
+        SymbolCache(path, ttl=-1).lookup(self.tv, 'AAPL', 'NASDAQ')
+        self.assertEqual(self.tv.search_symbol.call_count, 2)
+
+    def test_warm_from_file(self):
+        """测试从符号列表文件并发预热缓存"""
+        path = Path(self.tmpdir.name) / 'symbols.txt'
+        path.write_text('# watchlist\nNASDAQ:AAPL\n\nNASDAQ:MSFT\nNASDAQ:AAPL\n')
+        cache = SymbolCache()
+        self.assertEqual(cache.warm_from_file(self.tv, str(path)), 2)
+        self.assertEqual(cache.warm(self.tv, [('AAPL', 'NASDAQ'), ('MSFT', 'NASDAQ')]), 0)
+
+    def test_warm_saves_once(self):
+        """测试预热结束时只写一次磁盘，缓存未变化时不再写入"""
+        path = str(Path(self.tmpdir.name) / 'symbols.json')
+        cache = SymbolCache(path)
+        with mock.patch('os.replace', wraps=os.replace) as replace:
+            cache.warm(self.tv, [('AAPL', 'NASDAQ'), ('MSFT', 'NASDAQ'), ('GOOG', 'NASDAQ')])
+            cache.save()
+        self.assertEqual(replace.call_count, 1)
+        self.assertEqual(SymbolCache(path).warm(self.tv, [('AAPL', 'NASDAQ'), ('MSFT', 'NASDAQ')]), 0)
+
+    def test_new_seis_many(self):
+        """测试批量添加 Seis 时每个符号只搜索一次，无效符号时不添加任何 Seis"""
+        patchers = [mock.patch.object(module, 'create_connection', side_effect=lambda *args, **kwargs: FakeWebSocket())
+                    for module in (main, session)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        tv = TvDatafeedLive()
+        self.addCleanup(tv.del_tvdatafeed)
+        tv._main_thread = threading.Thread(name="main_loop", target=lambda: None)  # 已结束的线程代替主循环
+        tv._main_thread.start()
+
+        def search(symbol, exchange):
+            return [] if symbol == 'NOPE' else [{'symbol': symbol, 'exchange': exchange}]
+
+        with mock.patch.object(tv, 'search_symbol', side_effect=search) as search_symbol:
+            with self.assertRaises(ValueError):
+                tv.new_seis_many([('AAPL', 'NASDAQ', Interval.in_daily), ('NOPE', 'NASDAQ', Interval.in_daily)])
+            self.assertEqual(len(tv._sat), 0)
+            search_symbol.reset_mock()
+
+            seises = [(symbol, 'NASDAQ', interval) for symbol in ('AAPL', 'MSFT', 'GOOGL')
+                      for interval in (Interval.in_daily, Interval.in_1_hour)]
+            added = tv.new_seis_many(seises)
+            self.assertEqual(len(added), 6)
+            self.assertEqual(search_symbol.call_count, 2)  # AAPL 已缓存，MSFT 和 GOOGL 各搜索一次
+            self.assertIs(tv.new_seis_many(seises[:1])[0], added[0])
+            self.assertEqual(search_symbol.call_count, 2)
+
+
+class TestStreamingIndicators(unittest.TestCase):
+    def setUp(self):
+        """生成随机游走K线"""
+        rng = np.random.default_rng(0)
+        close = 100 + np.cumsum(rng.normal(0, 1, 200))
+        self.df = pd.DataFrame({'open': close, 'high': close + rng.uniform(0, 1, 200),
+                                'low': close - rng.uniform(0, 1, 200), 'close': close, 'volume': 100.0})
+        self.bars = self.df.to_dict("records")
+
+    def feed(self, indicator):
+        return np.array([indicator.update(bar) for bar in self.bars])
+
+    @staticmethod
+    def wilder(values, period):
+        """逐根K线计算的 Wilder 平滑，首个值为前 period 个值的均值"""
+        out = np.full(len(values), np.nan)
+        out[period - 1] = np.mean(values[:period])
+        for i in range(period, len(values)):
+            out[i] = out[i - 1] + (values[i] - out[i - 1]) / period
+        return out
+
+    def test_against_pandas(self):
+        """测试流式指标与 pandas 计算结果一致"""
+        close = self.df['close']
+        np.testing.assert_allclose(self.feed(indicators.RollingMean(20)), close.rolling(20).mean(), equal_nan=True)
+        np.testing.assert_allclose(self.feed(indicators.RollingVariance(20)), close.rolling(20).var(ddof=0), equal_nan=True)
+        np.testing.assert_allclose(self.feed(indicators.RollingVariance(20, ddof=1)), close.rolling(20).var(), equal_nan=True)
+        np.testing.assert_allclose(self.feed(indicators.EMA(12)), close.ewm(span=12, adjust=False).mean())
+
+        change = close.diff().to_numpy()[1:]
+        gain = self.wilder(np.maximum(change, 0), 14)
+        loss = self.wilder(np.maximum(-change, 0), 14)
+        np.testing.assert_allclose(self.feed(indicators.RSI(14))[1:], 100 - 100 / (1 + gain / loss), equal_nan=True)
+
+        prev_close = close.shift()
+        true_range = pd.concat([self.df['high'] - self.df['low'], (self.df['high'] - prev_close).abs(),
+                                (self.df['low'] - prev_close).abs()], axis=1).max(axis=1)
+        np.testing.assert_allclose(self.feed(indicators.ATR(14)), self.wilder(true_range.to_numpy(), 14), equal_nan=True)
+
+    def test_seis_indicators(self):
+        """测试 Seis 上的指标随新K线更新，consumer 收到带指标列的数据"""
+        tv = TvDatafeedLive()
+        self.addCleanup(tv.del_tvdatafeed)
+        seis = Seis('AAPL', 'NASDAQ', Interval.in_1_minute)
+        seis.add_indicator('sma3', indicators.RollingMean(3))
+        seis.add_indicator('rsi', indicators.RSI(2))
+        consumer = mock.Mock()
+        seis.add_consumer(consumer)
+
+        for n in range(4):
+            bars = protocol.SeriesBuffer(1)
+            bars.extend([{"i": n, "v": [1700000000 + 60 * n, 1, 1, 1, float(n), 10]}])
+            tv._push_streamed(seis, bars)
+
+        data = consumer.put.call_args.args[0]
+        self.assertEqual(list(data.columns), ['symbol', 'open', 'high', 'low', 'close', 'volume', 'sma3', 'rsi'])
+        self.assertEqual(data['sma3'].iloc[0], 2.0)
+        self.assertEqual(data['rsi'].iloc[0], 100.0)
+        self.assertEqual(seis.get_indicators(), {'sma3': 2.0, 'rsi': 100.0})
+        self.assertEqual(consumer.put.call_count, 4)
+
+
+class TestSeisesAndTrigger(unittest.TestCase):
+    def test_index_and_heap(self):
+        """测试 Seis 索引查找和基于堆的到期调度"""
+        sat = TvDatafeedLive._SeisesAndTrigger()
+        now = datetime.datetime.now()
+        minute = [Seis(f"SYM{i}", "NASDAQ", Interval.in_1_minute) for i in range(1000)]
+        hourly = Seis("SYM0", "NASDAQ", Interval.in_1_hour)
+
+        sat.append(minute[0], now - datetime.timedelta(minutes=1))
+        for seis in minute[1:]:
+            sat.append(seis)
+        sat.append(hourly, now)
+
+        self.assertIs(sat.get_seis("SYM999", "NASDAQ", Interval.in_1_minute), minute[999])
+        self.assertIsNone(sat.get_seis("SYM999", "NASDAQ", Interval.in_1_hour))
+        self.assertIn(Seis("SYM5", "NASDAQ", Interval.in_1_minute), sat)
+        self.assertEqual(len(list(sat)), 1001)
+        self.assertEqual(sat._next_trigger_dt(), now)
+
+        self.assertEqual(sat.get_expired(), ["1"])
+        self.assertEqual(sat._next_trigger_dt(), now + datetime.timedelta(minutes=1))
+
+        sat.discard(hourly)
+        self.assertNotIn(hourly, sat)
+        for seis in minute:
+            sat.discard(seis)
+        self.assertIsNone(sat._next_trigger_dt())
+        self.assertEqual(list(sat), [])
+
+
+class TestConsumerPolicies(unittest.TestCase):
+    def make_consumer(self, policy, maxsize=2):
+        """回调阻塞直到 release 被设置"""
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.received = []
+
+        def callback(seis, data):
+            self.started.set()
+            self.release.wait(5)
+            self.received.append(data)
+
+        consumer = Consumer(Seis("AAPL", "NASDAQ", Interval.in_1_minute), callback, policy, maxsize)
+        consumer.start()
+        consumer.put(0)
+        self.assertTrue(self.started.wait(5))  # 第一项正在回调中
+        return consumer
+
+    def finish(self, consumer):
+        self.release.set()
+        consumer.stop()
+        consumer.join(5)
+
+    def test_drop_oldest(self):
+        """测试有界队列丢弃最旧数据"""
+        consumer = self.make_consumer(Consumer.DROP_OLDEST)
+        for i in range(1, 6):
+            consumer.put(i)
+        self.assertEqual(consumer.stats()["pending"], 2)
+        self.finish(consumer)
+        self.assertEqual(self.received, [0, 4, 5])
+        self.assertEqual((consumer.queued, consumer.dropped, consumer.processed), (6, 3, 3))
+
+    def test_coalesce(self):
+        """测试只保留最新K线"""
+        consumer = self.make_consumer(Consumer.COALESCE)
+        for i in range(1, 6):
+            consumer.put(i)
+        self.finish(consumer)
+        self.assertEqual(self.received, [0, 5])
+        self.assertEqual(consumer.dropped, 4)
+
+    def test_block(self):
+        """测试缓冲区满时阻塞生产者"""
+        consumer = self.make_consumer(Consumer.BLOCK, maxsize=1)
+        consumer.put(1)
+        producer = threading.Thread(target=consumer.put, args=(2,))
+        producer.start()
+        producer.join(0.2)
+        self.assertTrue(producer.is_alive())  # 缓冲区已满
+        self.release.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.finish(consumer)
+        self.assertEqual(self.received, [0, 1, 2])
+        self.assertEqual(consumer.dropped, 0)
+        self.assertGreater(consumer.stats()["latency_max"], 0)
+
+
+class TestDispatchers(unittest.TestCase):
+    def run_consumers(self, dispatcher, callback, n_consumers=50, n_items=20):
+        consumers = [Consumer(Seis(f"SYM{i}", "NASDAQ", Interval.in_1_minute), callback, dispatcher=dispatcher)
+                     for i in range(n_consumers)]
+        threads_before = threading.active_count()
+        for consumer in consumers:
+            consumer.start()
+        for item in range(n_items):
+            for consumer in consumers:
+                consumer.put(item)
+        self.assertEqual(threading.active_count(), threads_before)  # 不为每个 Consumer 创建线程
+        for consumer in consumers:
+            consumer.stop()
+            consumer.join(5)
+        dispatcher.shutdown()
+        return consumers
+
+    def test_pool_keeps_order(self):
+        """测试共享线程池按 Consumer 顺序执行回调"""
+        received = collections.defaultdict(list)
+
+        def callback(seis, data):
+            received[seis.symbol].append(data)
+
+        consumers = self.run_consumers(ConsumerPool(workers=3), callback)
+        self.assertEqual(len(received), 50)
+        self.assertTrue(all(items == list(range(20)) for items in received.values()))
+        self.assertTrue(all(consumer.processed == 20 for consumer in consumers))
+
+    def test_async_callbacks(self):
+        """测试 async def 回调在共享事件循环上执行"""
+        received = collections.defaultdict(list)
+
+        async def callback(seis, data):
+            await asyncio.sleep(0)
+            received[seis.symbol].append(data)
+
+        self.run_consumers(AsyncDispatcher(), callback, n_consumers=10)
+        self.assertTrue(all(items == list(range(20)) for items in received.values()))
+
+
+class FakeAsyncWebSocket(FakeWebSocket):
+    """FakeWebSocket 的 asyncio 版本"""
+
+    def __init__(self):
+        super().__init__()
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait(protocol.prepend_header('{"session_id":"test"}'))
+
+    def respond(self, message):
+        self.incoming.put_nowait(message)
+
+    async def send(self, message):
+        FakeWebSocket.send(self, message)
+
+    async def recv(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise ConnectionError("closed")
+        return message
+
+    async def close(self):
+        self.closed = True
+
+
+@unittest.skipUnless(replay.WEBSOCKETS_AVAILABLE, "需要 websockets")
+class TestTvReplayServer(unittest.TestCase):
+    def start(self, **kwargs):
+        server = TvReplayServer(**kwargs)
+        server.start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_get_hist_synthetic(self):
+        """测试 get_hist 通过本地 websocket 获取确定性的合成K线"""
+        server = self.start()
+        tv = TvDatafeed(ws_url=server.url)
+        df = tv.get_hist("AAPL", "NASDAQ", interval=Interval.in_1_hour, n_bars=50)
+
+        self.assertEqual(len(df), 50)
+        self.assertEqual(list(df.columns), ["symbol", "open", "high", "low", "close", "volume"])
+        self.assertTrue((df["high"] >= df[["open", "close"]].max(axis=1)).all())
+        self.assertTrue((df.index.to_series().diff().dropna() == pd.Timedelta(hours=1)).all())
+        pd.testing.assert_frame_equal(tv.get_hist("AAPL", "NASDAQ", interval=Interval.in_1_hour, n_bars=50), df)
+        self.assertEqual(server.stats["connections"], 2)
+
+    def test_replay_fixtures(self):
+        """测试持久连接回放录制的K线，未录制的品种返回错误"""
+        fixture = TvDatafeed(ws_url=self.start().url).get_hist("IBM", "NYSE", n_bars=30)
+        server = self.start(bars={"NYSE:IBM": fixture}, heartbeat_interval=0.05)
+
+        tv = TvDatafeed(persistent=True, ws_url=server.url)
+        self.addCleanup(tv.close)
+        results = tv.get_hist_many(["NYSE:IBM", "NYSE:UNKNOWN"], n_bars=10, timeout=5)
+
+        self.assertEqual(list(results), ["NYSE:IBM"])
+        pd.testing.assert_frame_equal(results["NYSE:IBM"], fixture.iloc[-10:])
+        self.assertEqual(server.stats["series"], 1)
+        self.assertEqual(server.stats["bars"], 10)
+        time.sleep(0.2)  # 连接空闲时收到的心跳由会话回复
+        self.assertGreater(server.stats["heartbeats"], 0)
+
+    def test_async_get_hist_many(self):
+        """测试异步客户端连接本地 websocket"""
+        server = self.start(latency=0.01)
+
+        async def run():
+            async with AsyncTvDatafeed(max_connections=2, timeout=5, ws_url=server.url) as tv:
+                return await tv.get_hist_many([f"SYM{i}" for i in range(20)], exchange="NASDAQ", n_bars=8)
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(results["NASDAQ:SYM19"]), 8)
+        self.assertLessEqual(server.stats["connections"], 2)
+
+
+@unittest.skipUnless(async_datafeed.WEBSOCKETS_AVAILABLE, "需要 websockets")
+class TestAsyncTvDatafeed(unittest.TestCase):
+    def test_concurrent_get_hist(self):
+        """测试并发请求分布在有限数量的连接上"""
+        connections = []
+
+        async def connect(*args, **kwargs):
+            ws = FakeAsyncWebSocket()
+            connections.append(ws)
+            return ws
+
+        async def run():
+            async with AsyncTvDatafeed(max_connections=3, max_concurrency=10, timeout=5) as tv:
+                return await tv.get_hist_many([f"SYM{i}" for i in range(50)], exchange="NASDAQ",
+                                              interval=Interval.in_daily, n_bars=4)
+
+        with mock.patch.object(async_datafeed.websockets, 'connect', side_effect=connect):
+            results = asyncio.run(run())
+
+        self.assertEqual(len(results), 50)
+        self.assertEqual(len(results["NASDAQ:SYM49"]), 4)
+        self.assertLessEqual(len(connections), 3)
+        self.assertTrue(all(ws.closed for ws in connections))
+
+    def test_timeout(self):
+        """测试单个请求超时返回 None"""
+        async def connect(*args, **kwargs):
+            ws = FakeAsyncWebSocket()
+            ws.respond = lambda message: None  # 不返回任何数据
+            return ws
+
+        async def run():
+            async with AsyncTvDatafeed(timeout=0.1) as tv:
+                return await tv.get_hist("AAPL", "NASDAQ")
+
+        with mock.patch.object(async_datafeed.websockets, 'connect', side_effect=connect):
+            self.assertIsNone(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()